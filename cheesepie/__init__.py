@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import logging
 import logging.handlers
+import multiprocessing
 from pathlib import Path
 from flask import Flask, redirect, request, url_for, jsonify
 
@@ -59,9 +60,20 @@ def create_app() -> Flask:
     from .config import inject_public_config, bp as config_bp
     from .version import get_app_version
     from .preproc import bp as preproc_bp
+    from .segvideo import bp as segvideo_bp
     from .browser import bp as browser_bp
+    from .search import bp as search_bp
+    from .manifest import bp as manifest_bp
     from .media import bp as media_bp
     from .analyze import bp as analyze_bp
+    from .metrics import bp as metrics_bp
+    from .social import bp as social_bp
+    from .batch import bp as batch_bp
+    from .heatmap import bp as heatmap_bp
+    from .thumbs import bp as thumbs_bp
+    from .frames import bp as frames_bp
+    from .proxy import bp as proxy_bp
+    from .frameindex import bp as frameindex_bp
     from .track import bp as track_bp
     from .importer import bp as importer_bp
     from .tasks import bp as tasks_bp, resume_pending_tasks
@@ -85,9 +97,20 @@ def create_app() -> Flask:
 
     # Blueprints
     app.register_blueprint(preproc_bp, url_prefix='/api/preproc')
+    app.register_blueprint(segvideo_bp)
     app.register_blueprint(browser_bp, url_prefix='/api')
+    app.register_blueprint(search_bp)
+    app.register_blueprint(manifest_bp)
     app.register_blueprint(media_bp)
+    app.register_blueprint(thumbs_bp)
+    app.register_blueprint(frames_bp)
+    app.register_blueprint(proxy_bp)
+    app.register_blueprint(frameindex_bp)
     app.register_blueprint(analyze_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(social_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(heatmap_bp)
     app.register_blueprint(track_bp)
     app.register_blueprint(config_bp, url_prefix='/api/config')
     app.register_blueprint(importer_bp, url_prefix='/api/import')
@@ -100,30 +123,41 @@ def create_app() -> Flask:
 
     # Module-specific initialization (MATLAB removed)
 
-    # Reap orphan subprocesses from a previous server instance
-    try:
-        from .importer import reap_orphan_ffmpeg
-        reap_orphan_ffmpeg()
-    except Exception:
-        pass
-    try:
-        from .track import reap_orphan_track
-        reap_orphan_track()
-    except Exception:
-        pass
+    # Worker processes (e.g. the analyze.batch pool re-importing app.py under
+    # spawn) must not reap subprocesses or resume the server's tasks.  The
+    # process name is already set while spawn imports the main module.
+    if multiprocessing.current_process().name == 'MainProcess':
+        # Reap orphan subprocesses from a previous server instance
+        try:
+            from .importer import reap_orphan_ffmpeg
+            reap_orphan_ffmpeg()
+        except Exception:
+            pass
+        try:
+            from .track import reap_orphan_track
+            reap_orphan_track()
+        except Exception:
+            pass
 
-    # Resume task-queue jobs (encode, scan, …)
-    try:
-        resume_pending_tasks()
-    except Exception:
-        pass
+        # Resume task-queue jobs (encode, scan, …)
+        try:
+            resume_pending_tasks()
+        except Exception:
+            pass
 
-    # Resume background tracking jobs
-    try:
-        from .track import resume_track_jobs
-        resume_track_jobs()
-    except Exception:
-        pass
+        # Resume background tracking jobs
+        try:
+            from .track import resume_track_jobs
+            resume_track_jobs()
+        except Exception:
+            pass
+
+        # Keep the facility filename search index current
+        try:
+            from .search import start_search_indexer
+            start_search_indexer()
+        except Exception:
+            pass
 
     # Auth gate: require valid token for all non-auth, non-static endpoints
     @app.before_request
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
+import base64
+import gzip
+import json
+import logging
 import os
+import threading
+import time
 import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+try:
+    import h5py  # type: ignore
+except Exception:
+    h5py = None  # type: ignore
 
+from .config import cfg_analyze_track_cache_mb, cfg_analyze_track_sidecar
 from .pathguard import assert_within_allowed_roots
 
 bp = Blueprint('analyze_api', __name__)
+_log = logging.getLogger(__name__)
 
 
 @dataclass
@@ -20,6 +34,20 @@ class TrackData:
     y: np.ndarray
     colors: List[str]
 
+    @property
+    def mice(self) -> int:
+        return int(self.x.shape[0])
+
+    @property
+    def frames(self) -> int:
+        return int(self.x.shape[1])
+
+    def read(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.x[:, start:end], self.y[:, start:end]
+
+    def window(self, start: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        return _slice_tracks(self.x, self.y, start, count)
+
 
 def _track_path_for_video(video: Path) -> Path:
     # Append .obj.mat to the video filename (keeping original extension)
@@ -99,6 +127,134 @@ def _load_mat_tracks(mat_path: Path) -> Optional[TrackData]:
     return _load_mat_tracks_matlab(mat_path)
 
 
+class _MatReader:
+    """Navigate MATLAB v7.3 (HDF5) files, following object references."""
+
+    def __init__(self, hf):
+        self._f = hf
+
+    @staticmethod
+    def _is_ref(ds: h5py.Dataset) -> bool:
+        try:
+            return ds.dtype == h5py.ref_dtype or ds.dtype.kind == 'O'
+        except Exception:
+            return False
+
+    def _first_ref(self, ds: h5py.Dataset) -> Optional[h5py.Reference]:
+        try:
+            data = ds[()]
+        except Exception:
+            return None
+        if isinstance(data, h5py.Reference):
+            return data
+        if isinstance(data, np.ndarray) and data.dtype in (h5py.ref_dtype, object):
+            for ref in data.flatten():
+                if isinstance(ref, h5py.Reference):
+                    return ref
+        return None
+
+    def _deref(self, obj: Any) -> Any:
+        if isinstance(obj, h5py.Dataset) and self._is_ref(obj):
+            ref = self._first_ref(obj)
+            if ref:
+                try:
+                    return self._f[ref]
+                except Exception:
+                    return obj
+        return obj
+
+    def resolve(self, path: str, deref_last: bool = True) -> Optional[Any]:
+        parts = [p for p in path.split('/') if p]
+        obj: Any = self._f
+        for idx, part in enumerate(parts):
+            if not isinstance(obj, (h5py.File, h5py.Group)):
+                return None
+            if part not in obj:
+                return None
+            obj = obj[part]
+            if deref_last or idx < len(parts) - 1:
+                obj = self._deref(obj)
+        return obj
+
+    def read_array(self, path: str) -> Optional[np.ndarray]:
+        return self._read_numeric(self.resolve(path))
+
+    def resolve_dataset(self, path: str) -> Optional[Any]:
+        """Return the numeric dataset at *path* without reading its data."""
+        return self._numeric_dataset(self.resolve(path))
+
+    def _numeric_dataset(self, obj: Any) -> Optional[Any]:
+        if obj is None:
+            return None
+        obj = self._deref(obj)
+        if isinstance(obj, h5py.Dataset) and self._is_ref(obj):
+            ref = self._first_ref(obj)
+            if ref:
+                return self._numeric_dataset(self._f[ref])
+        if not isinstance(obj, h5py.Dataset):
+            return None
+        if self._is_ref(obj):
+            return None
+        return obj
+
+    def _read_numeric(self, obj: Any) -> Optional[np.ndarray]:
+        obj = self._numeric_dataset(obj)
+        if obj is None:
+            return None
+        try:
+            arr = np.array(obj)
+        except Exception:
+            return None
+        if arr.dtype == object or arr.dtype == h5py.ref_dtype:
+            return None
+        arr = np.squeeze(arr)
+        if arr.ndim == 0:
+            return None
+        if arr.ndim == 1:
+            arr = arr.reshape(1, -1)
+        if arr.ndim != 2:
+            return None
+        return arr
+
+    def read_strings(self, path: str) -> List[str]:
+        return self._read_strings(self.resolve(path, deref_last=False))
+
+    def _read_strings(self, obj: Any) -> List[str]:
+        if obj is None:
+            return []
+        obj = self._deref(obj)
+        if isinstance(obj, h5py.Dataset) and self._is_ref(obj):
+            refs: List[h5py.Reference] = []
+            try:
+                data = obj[()]
+            except Exception:
+                data = None
+            if isinstance(data, h5py.Reference):
+                refs = [data]
+            elif isinstance(data, np.ndarray) and data.dtype in (h5py.ref_dtype, object):
+                refs = [ref for ref in data.flatten() if isinstance(ref, h5py.Reference)]
+            items: List[str] = []
+            for ref in refs:
+                sub = self._read_strings(self._f[ref])
+                items.extend([s for s in sub if s])
+            return items
+        if isinstance(obj, h5py.Dataset):
+            try:
+                data = obj[()]
+            except Exception:
+                return []
+            s = _decode_mat_string(data)
+            return [s] if s else []
+        return []
+
+
+# (x dataset paths, y dataset paths, colors path) tried in order for v7.3 files
+_HDF5_TRACK_SPECS: List[Tuple[List[str], List[str], str]] = [
+    (['self/tracking/x', 'self/tracking/X'], ['self/tracking/y', 'self/tracking/Y', 'self/tracking/t'], 'self/colors/mice'),
+    (['Tracking/x', 'Tracking/X'], ['Tracking/y', 'Tracking/Y', 'Tracking/t'], 'Meta/Colors'),
+]
+
+
 def _load_mat_tracks_hdf5(mat_path: Path) -> Optional[TrackData]:
     try:
         with mat_path.open('rb') as fh:
@@ -107,119 +263,11 @@ def _load_mat_tracks_hdf5(mat_path: Path) -> Optional[TrackData]:
             return None
     except Exception:
         return None
-    try:
-        import h5py  # type: ignore
-    except Exception:
+    if h5py is None:
         return None
     try:
         with h5py.File(str(mat_path), 'r') as f:
-            class MatReader:
-                def __init__(self, hf):
-                    self._f = hf
-
-                @staticmethod
-                def _is_ref(ds: h5py.Dataset) -> bool:
-                    try:
-                        return ds.dtype == h5py.ref_dtype or ds.dtype.kind == 'O'
-                    except Exception:
-                        return False
-
-                def _first_ref(self, ds: h5py.Dataset) -> Optional[h5py.Reference]:
-                    try:
-                        data = ds[()]
-                    except Exception:
-                        return None
-                    if isinstance(data, h5py.Reference):
-                        return data
-                    if isinstance(data, np.ndarray) and data.dtype in (h5py.ref_dtype, object):
-                        for ref in data.flatten():
-                            if isinstance(ref, h5py.Reference):
-                                return ref
-                    return None
-
-                def _deref(self, obj: Any) -> Any:
-                    if isinstance(obj, h5py.Dataset) and self._is_ref(obj):
-                        ref = self._first_ref(obj)
-                        if ref:
-                            try:
-                                return self._f[ref]
-                            except Exception:
-                                return obj
-                    return obj
-
-                def resolve(self, path: str, deref_last: bool = True) -> Optional[Any]:
-                    parts = [p for p in path.split('/') if p]
-                    obj: Any = self._f
-                    for idx, part in enumerate(parts):
-                        if not isinstance(obj, (h5py.File, h5py.Group)):
-                            return None
-                        if part not in obj:
-                            return None
-                        obj = obj[part]
-                        if deref_last or idx < len(parts) - 1:
-                            obj = self._deref(obj)
-                    return obj
-
-                def read_array(self, path: str) -> Optional[np.ndarray]:
-                    return self._read_numeric(self.resolve(path))
-
-                def _read_numeric(self, obj: Any) -> Optional[np.ndarray]:
-                    if obj is None:
-                        return None
-                    obj = self._deref(obj)
-                    if isinstance(obj, h5py.Dataset) and self._is_ref(obj):
-                        ref = self._first_ref(obj)
-                        if ref:
-                            return self._read_numeric(self._f[ref])
-                    if not isinstance(obj, h5py.Dataset):
-                        return None
-                    try:
-                        arr = np.array(obj)
-                    except Exception:
-                        return None
-                    if arr.dtype == object or arr.dtype == h5py.ref_dtype:
-                        return None
-                    arr = np.squeeze(arr)
-                    if arr.ndim == 0:
-                        return None
-                    if arr.ndim == 1:
-                        arr = arr.reshape(1, -1)
-                    if arr.ndim != 2:
-                        return None
-                    return arr
-
-                def read_strings(self, path: str) -> List[str]:
-                    return self._read_strings(self.resolve(path, deref_last=False))
-
-                def _read_strings(self, obj: Any) -> List[str]:
-                    if obj is None:
-                        return []
-                    obj = self._deref(obj)
-                    if isinstance(obj, h5py.Dataset) and self._is_ref(obj):
-                        refs: List[h5py.Reference] = []
-                        try:
-                            data = obj[()]
-                        except Exception:
-                            data = None
-                        if isinstance(data, h5py.Reference):
-                            refs = [data]
-                        elif isinstance(data, np.ndarray) and data.dtype in (h5py.ref_dtype, object):
-                            refs = [ref for ref in data.flatten() if isinstance(ref, h5py.Reference)]
-                        items: List[str] = []
-                        for ref in refs:
-                            sub = self._read_strings(self._f[ref])
-                            items.extend([s for s in sub if s])
-                        return items
-                    if isinstance(obj, h5py.Dataset):
-                        try:
-                            data = obj[()]
-                        except Exception:
-                            return []
-                        s = _decode_mat_string(data)
-                        return [s] if s else []
-                    return []
-
-            reader = MatReader(f)
+            reader = _MatReader(f)
 
             def read_first(paths: List[str]) -> Optional[np.ndarray]:
                 for path in paths:
@@ -228,11 +276,7 @@ def _load_mat_tracks_hdf5(mat_path: Path) -> Optional[TrackData]:
                         return arr
                 return None
 
-            track_specs = [
-                (['self/tracking/x', 'self/tracking/X'], ['self/tracking/y', 'self/tracking/Y', 'self/tracking/t'], 'self/colors/mice'),
-                (['Tracking/x', 'Tracking/X'], ['Tracking/y', 'Tracking/Y', 'Tracking/t'], 'Meta/Colors'),
-            ]
-            for x_paths, y_paths, color_path in track_specs:
+            for x_paths, y_paths, color_path in _HDF5_TRACK_SPECS:
                 x = read_first(x_paths)
                 y = read_first(y_paths)
                 if x is None or y is None:
@@ -414,15 +458,751 @@ def _load_mat_tracks_matlab(mat_path: Path) -> Optional[TrackData]:
     return TrackData(oriented[0], oriented[1], colors)
 
 
-def _slice_tracks(x: np.ndarray, y: np.ndarray, start: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+# ── Decoded track cache ──────────────────────────────────────────────────────
+#
+# Decoding an .obj.mat (HDF5 → scipy → MATLAB fallbacks) costs far more than
+# serving a window from it, and the annotator requests a new window every few
+# hundred frames.  Decoded tracks are therefore kept in a process-wide LRU
+# keyed by (path, mtime, size) and bounded by cfg_analyze_track_cache_mb().
+
+TrackInvalidationHook = Callable[[Path], None]
+
+_TRACK_INVALIDATION_HOOKS: List[TrackInvalidationHook] = []
+
+
+def register_track_invalidation_hook(hook: TrackInvalidationHook) -> None:
+    """Call *hook(mat_path)* whenever a cached track is found stale on disk."""
+    if hook is None:
+        return
+    with _TRACK_CACHE_LOCK:
+        if hook not in _TRACK_INVALIDATION_HOOKS:
+            _TRACK_INVALIDATION_HOOKS.append(hook)
+
+
+def _fire_track_invalidation(mat_path: Path) -> None:
+    with _TRACK_CACHE_LOCK:
+        hooks = list(_TRACK_INVALIDATION_HOOKS)
+    for hook in hooks:
+        try:
+            hook(mat_path)
+        except Exception as e:
+            _log.warning("analyze: invalidation hook failed for %s: %s", mat_path, e)
+
+
+def _track_stat_key(mat_path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = mat_path.stat()
+    except OSError:
+        return None
+    return int(st.st_mtime_ns), int(st.st_size)
+
+
+def _track_nbytes(track: TrackData) -> int:
+    return int(track.x.nbytes) + int(track.y.nbytes)
+
+
+class _TrackCache:
+    """Thread-safe LRU of decoded TrackData bounded by total array bytes."""
+
+    def __init__(self) -> None:
+        self._entries: 'OrderedDict[str, Tuple[Tuple[int, int], TrackData, int]]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _budget() -> int:
+        return cfg_analyze_track_cache_mb() * 1024 * 1024
+
+    def get(self, mat_path: Path, key: Tuple[int, int], record: bool = True) -> Tuple[Optional[TrackData], bool]:
+        """Return (track, stale); *stale* is True if an outdated entry was dropped."""
+        name = str(mat_path)
+        with _TRACK_CACHE_LOCK:
+            entry = self._entries.get(name)
+            if entry is None:
+                self.misses += int(record)
+                return None, False
+            if entry[0] != key:
+                self._drop(name)
+                self.invalidations += 1
+                self.misses += int(record)
+                return None, True
+            self._entries.move_to_end(name)
+            self.hits += int(record)
+            return entry[1], False
+
+    def put(self, mat_path: Path, key: Tuple[int, int], track: TrackData) -> None:
+        name = str(mat_path)
+        nbytes = _track_nbytes(track)
+        budget = self._budget()
+        if nbytes > budget:
+            return
+        with _TRACK_CACHE_LOCK:
+            if name in self._entries:
+                self._drop(name)
+            self._entries[name] = (key, track, nbytes)
+            self._bytes += nbytes
+            while self._bytes > budget and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, mat_path: Optional[Path] = None) -> int:
+        with _TRACK_CACHE_LOCK:
+            if mat_path is None:
+                names = list(self._entries.keys())
+            else:
+                names = [str(mat_path)] if str(mat_path) in self._entries else []
+            for name in names:
+                self._drop(name)
+            self.invalidations += len(names)
+            return len(names)
+
+    def _drop(self, name: str) -> None:
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        with _TRACK_CACHE_LOCK:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'budget_bytes': self._budget(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_TRACK_CACHE_LOCK = threading.RLock()
+_TRACK_CACHE = _TrackCache()
+# Per-path locks so concurrent window requests for one file decode it once
+_TRACK_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+
+
+def _track_load_lock(mat_path: Path, purpose: str = 'decode') -> threading.Lock:
+    name = f'{purpose}:{mat_path}'
+    with _TRACK_CACHE_LOCK:
+        lock = _TRACK_LOAD_LOCKS.get(name)
+        if lock is None:
+            lock = _TRACK_LOAD_LOCKS[name] = threading.Lock()
+        return lock
+
+
+def load_tracks_cached(mat_path: Path) -> Optional[TrackData]:
+    """Return decoded tracks for *mat_path*, reusing the process-wide cache."""
+    key = _track_stat_key(mat_path)
+    if key is None or not mat_path.is_file():
+        return None
+    track, stale = _TRACK_CACHE.get(mat_path, key)
+    if stale:
+        _fire_track_invalidation(mat_path)
+    if track is not None:
+        return track
+    with _track_load_lock(mat_path):
+        # Another request may have decoded it while we waited
+        track, _ = _TRACK_CACHE.get(mat_path, key, record=False)
+        if track is not None:
+            return track
+        track = _load_mat_tracks(mat_path)
+        if track is None:
+            return None
+        # Only cache if the file did not change while we were decoding it
+        if _track_stat_key(mat_path) == key:
+            _TRACK_CACHE.put(mat_path, key, track)
+        return track
+
+
+def invalidate_track_cache(mat_path: Optional[Path] = None) -> int:
+    """Drop one cached track (or all of them) and notify invalidation hooks."""
+    dropped = _TRACK_CACHE.invalidate(mat_path)
+    if mat_path is not None:
+        _fire_track_invalidation(mat_path)
+    return dropped
+
+
+def track_cache_stats() -> Dict[str, Any]:
+    return _TRACK_CACHE.stats()
+
+
+# ── Lazy v7.3 track handles ─────────────────────────────────────────────────
+#
+# For HDF5-backed .obj.mat files a window request only needs a [:, start:end]
+# hyperslab, so the x/y datasets are left on disk and read per request.  Open
+# files are kept in a small LRU pool so consecutive windows reuse the handle.
+
+_HDF5_POOL_SIZE = 8
+
+
+class _Hdf5TrackHandle:
+    """Open v7.3 track file serving x/y windows straight from the datasets."""
+
+    def __init__(self, f: Any, x_ds: Any, y_ds: Any, colors: List[str]):
+        self._f = f
+        self._x = x_ds
+        self._y = y_ds
+        self._lock = threading.Lock()
+        self._closed = False
+        self.colors = colors
+        # MATLAB writes column-major, so (mice x frames) usually shows up
+        # transposed; orient the same way _orient_pair does for full loads.
+        rows, cols = (int(n) for n in x_ds.shape)
+        self._transposed = rows > cols
+        self.mice = cols if self._transposed else rows
+        self.frames = rows if self._transposed else cols
+
+    def read(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Read frames [start, end) for all mice as (mice x n) arrays."""
+        start = max(0, min(int(start), self.frames))
+        end = max(start, min(int(end), self.frames))
+        with self._lock:
+            if self._closed:
+                raise OSError('track handle closed')
+            if end <= start:
+                empty = np.empty((self.mice, 0), dtype=self._x.dtype)
+                return empty, empty.copy()
+            if self._transposed:
+                xs = self._x[start:end, :].T
+                ys = self._y[start:end, :].T
+            else:
+                xs = self._x[:, start:end]
+                ys = self._y[:, start:end]
+        return np.ascontiguousarray(xs), np.ascontiguousarray(ys)
+
+    def window(self, start: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.read(*_window_bounds(start, count, self.frames))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._f.close()
+            except Exception:
+                pass
+
+
+def _open_hdf5_track(mat_path: Path) -> Optional[_Hdf5TrackHandle]:
+    if h5py is None:
+        return None
+    try:
+        with mat_path.open('rb') as fh:
+            if fh.read(4) != b'\x89HDF':
+                return None
+        # No HDF5 file locking: the tracker may rewrite files we hold open
+        f = h5py.File(str(mat_path), 'r', locking=False)
+    except Exception:
+        return None
+    try:
+        reader = _MatReader(f)
+
+        def first_dataset(paths: List[str]) -> Optional[Any]:
+            for path in paths:
+                ds = reader.resolve_dataset(path)
+                if ds is not None:
+                    return ds
+            return None
+
+        for x_paths, y_paths, color_path in _HDF5_TRACK_SPECS:
+            x_ds = first_dataset(x_paths)
+            y_ds = first_dataset(y_paths)
+            if x_ds is None or y_ds is None:
+                continue
+            if x_ds.ndim != 2 or x_ds.shape != y_ds.shape:
+                continue
+            colors = _normalize_colors(reader.read_strings(color_path))
+            return _Hdf5TrackHandle(f, x_ds, y_ds, colors)
+    except Exception as e:
+        _log.warning("analyze: lazy HDF5 open failed for %s: %s", mat_path, e)
+    try:
+        f.close()
+    except Exception:
+        pass
+    return None
+
+
+_HDF5_POOL: 'OrderedDict[str, Tuple[Tuple[int, int], Optional[_Hdf5TrackHandle]]]' = OrderedDict()
+_HDF5_POOL_LOCK = threading.Lock()
+
+
+def _pooled_hdf5_track(mat_path: Path) -> Optional[_Hdf5TrackHandle]:
+    """Return a pooled lazy handle, or None if the file is not a usable v7.3 track.
+
+    Negative results are pooled as well so non-HDF5 files are sniffed once
+    per (mtime, size) rather than on every request.
+    """
+    key = _track_stat_key(mat_path)
+    if key is None:
+        return None
+    name = str(mat_path)
+    stale: Optional[_Hdf5TrackHandle] = None
+    with _HDF5_POOL_LOCK:
+        entry = _HDF5_POOL.get(name)
+        if entry is not None and entry[0] == key:
+            _HDF5_POOL.move_to_end(name)
+            return entry[1]
+        if entry is not None:
+            _HDF5_POOL.pop(name, None)
+            stale = entry[1]
+    if entry is not None:
+        if stale is not None:
+            stale.close()
+        _fire_track_invalidation(mat_path)
+    handle = _open_hdf5_track(mat_path)
+    evicted: List[_Hdf5TrackHandle] = []
+    with _HDF5_POOL_LOCK:
+        raced = _HDF5_POOL.get(name)
+        if raced is not None and raced[0] == key:
+            if handle is not None:
+                evicted.append(handle)
+            handle = raced[1]
+        else:
+            _HDF5_POOL[name] = (key, handle)
+            while len(_HDF5_POOL) > _HDF5_POOL_SIZE:
+                _, (_, old) = _HDF5_POOL.popitem(last=False)
+                if old is not None:
+                    evicted.append(old)
+    for old in evicted:
+        old.close()
+    return handle
+
+
+def _drop_pooled_hdf5_track(mat_path: Path) -> None:
+    with _HDF5_POOL_LOCK:
+        entry = _HDF5_POOL.pop(str(mat_path), None)
+    if entry is not None and entry[1] is not None:
+        entry[1].close()
+
+
+register_track_invalidation_hook(_drop_pooled_hdf5_track)
+
+
+# ── Memory-mapped track sidecars ────────────────────────────────────────────
+#
+# On first access an .obj.mat is converted into ``<video>.track.npy`` holding a
+# C-contiguous float32 array of shape (2, mice, frames) — x then y — plus a
+# ``<video>.track.json`` header.  Later requests np.load(mmap_mode='r') it, so
+# opening is O(1) and windows are views into the page cache.  The header
+# records the source (mtime, size); a mismatch triggers a rebuild.
+
+_SIDECAR_VERSION = 1
+_SIDECAR_BLOCK_FRAMES = 1 << 18
+_SIDECAR_OPEN_MAX = 32
+
+
+class _SidecarTrack:
+    """Read-only view over a memory-mapped .track.npy sidecar."""
+
+    def __init__(self, data: np.ndarray, header: Dict[str, Any]):
+        self._data = data
+        self.x = data[0]
+        self.y = data[1]
+        self.mice = int(data.shape[1])
+        self.frames = int(data.shape[2])
+        self.colors = [str(c) for c in (header.get('colors') or [])]
+
+    def read(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.x[:, start:end], self.y[:, start:end]
+
+    def window(self, start: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        return _slice_tracks(self.x, self.y, start, count)
+
+
+def _sidecar_base(mat_path: Path) -> str:
+    name = mat_path.name
+    return name[:-len('.obj.mat')] if name.endswith('.obj.mat') else name
+
+
+def _sidecar_paths(mat_path: Path) -> Tuple[Path, Path]:
+    base = _sidecar_base(mat_path)
+    return mat_path.with_name(base + '.track.npy'), mat_path.with_name(base + '.track.json')
+
+
+def _read_sidecar_header(path: Path) -> Dict[str, Any]:
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _sidecar_is_current(header: Dict[str, Any], key: Tuple[int, int]) -> bool:
+    try:
+        return (
+            int(header.get('version') or 0) == _SIDECAR_VERSION
+            and int(header.get('source_mtime_ns')) == key[0]
+            and int(header.get('source_size')) == key[1]
+        )
+    except Exception:
+        return False
+
+
+def build_track_sidecar(mat_path: Path) -> bool:
+    """Convert *mat_path* into a float32 .track.npy sidecar (+ JSON header).
+
+    Sources are copied in blocks, so v7.3 files never need to be fully
+    resident in memory.  Returns False if the track cannot be decoded or the
+    sidecar cannot be written.
+    """
+    key = _track_stat_key(mat_path)
+    if key is None:
+        return False
+    handle = _open_hdf5_track(mat_path)
+    try:
+        src: Any = handle or _load_mat_tracks(mat_path)
+        if src is None:
+            return False
+        return _write_track_sidecar(mat_path, key, src)
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+def _write_track_sidecar(mat_path: Path, key: Tuple[int, int], src: Any) -> bool:
+    npy_path, header_path = _sidecar_paths(mat_path)
+    tmp_npy = npy_path.with_name(npy_path.name + '.tmp')
+    tmp_header = header_path.with_name(header_path.name + '.tmp')
+    try:
+        out = np.lib.format.open_memmap(
+            str(tmp_npy), mode='w+', dtype='<f4', shape=(2, src.mice, src.frames),
+        )
+        for start in range(0, src.frames, _SIDECAR_BLOCK_FRAMES):
+            end = min(src.frames, start + _SIDECAR_BLOCK_FRAMES)
+            xs, ys = src.read(start, end)
+            out[0, :, start:end] = xs
+            out[1, :, start:end] = ys
+        out.flush()
+        del out
+        os.replace(tmp_npy, npy_path)
+        header = {
+            'version': _SIDECAR_VERSION,
+            'mice': int(src.mice),
+            'frames': int(src.frames),
+            'colors': list(src.colors or []),
+            'dtype': 'float32',
+            'layout': '[x|y, mice, frames]',
+            'source': mat_path.name,
+            'source_mtime_ns': key[0],
+            'source_size': key[1],
+        }
+        tmp_header.write_text(json.dumps(header, indent=2), encoding='utf-8')
+        os.replace(tmp_header, header_path)
+        return True
+    except Exception as e:
+        _log.warning("analyze: could not write track sidecar for %s: %s", mat_path, e)
+        for tmp in (tmp_npy, tmp_header):
+            try:
+                tmp.unlink(missing_ok=True)
+            except Exception:
+                pass
+        return False
+
+
+_SIDECAR_OPEN: 'OrderedDict[str, Tuple[Tuple[int, int], _SidecarTrack]]' = OrderedDict()
+# Source (mtime, size) for which conversion failed, so we do not retry per request
+_SIDECAR_FAILED: Dict[str, Tuple[int, int]] = {}
+_SIDECAR_LOCK = threading.Lock()
+
+
+def _sidecar_track(mat_path: Path) -> Optional[_SidecarTrack]:
+    """Return the memory-mapped sidecar for *mat_path*, building it if needed."""
+    if not cfg_analyze_track_sidecar():
+        return None
+    key = _track_stat_key(mat_path)
+    if key is None:
+        return None
+    name = str(mat_path)
+    with _SIDECAR_LOCK:
+        entry = _SIDECAR_OPEN.get(name)
+        if entry is not None and entry[0] == key:
+            _SIDECAR_OPEN.move_to_end(name)
+            return entry[1]
+        if _SIDECAR_FAILED.get(name) == key:
+            return None
+    npy_path, header_path = _sidecar_paths(mat_path)
+    header = _read_sidecar_header(header_path)
+    if not _sidecar_is_current(header, key) or not npy_path.is_file():
+        with _track_load_lock(mat_path, 'sidecar'):
+            header = _read_sidecar_header(header_path)
+            if not _sidecar_is_current(header, key) or not npy_path.is_file():
+                if header:
+                    _fire_track_invalidation(mat_path)
+                if not build_track_sidecar(mat_path):
+                    with _SIDECAR_LOCK:
+                        _SIDECAR_FAILED[name] = key
+                    return None
+                header = _read_sidecar_header(header_path)
+    try:
+        data = np.load(str(npy_path), mmap_mode='r')
+    except Exception as e:
+        _log.warning("analyze: could not map track sidecar %s: %s", npy_path, e)
+        return None
+    if data.ndim != 3 or data.shape[0] != 2:
+        return None
+    track = _SidecarTrack(data, header)
+    with _SIDECAR_LOCK:
+        _SIDECAR_FAILED.pop(name, None)
+        _SIDECAR_OPEN[name] = (key, track)
+        while len(_SIDECAR_OPEN) > _SIDECAR_OPEN_MAX:
+            _SIDECAR_OPEN.popitem(last=False)
+    return track
+
+
+def _drop_open_sidecar(mat_path: Path) -> None:
+    with _SIDECAR_LOCK:
+        _SIDECAR_OPEN.pop(str(mat_path), None)
+        _SIDECAR_FAILED.pop(str(mat_path), None)
+
+
+register_track_invalidation_hook(_drop_open_sidecar)
+
+
+def _open_track(mat_path: Path) -> Optional[Any]:
+    """Return a windowable track source.
+
+    Preference order: memory-mapped sidecar, lazy v7.3 handle, cached
+    TrackData.  All expose ``mice``, ``frames``, ``colors``,
+    ``read(start, end)`` and ``window(start, count)``.
+    """
+    if not mat_path.is_file():
+        return None
+    sidecar = _sidecar_track(mat_path)
+    if sidecar is not None:
+        return sidecar
+    handle = _pooled_hdf5_track(mat_path)
+    if handle is not None:
+        return handle
+    return load_tracks_cached(mat_path)
+
+
+def _read_track_window(mat_path: Path, start: int, count: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    track = _open_track(mat_path)
+    if track is None:
+        return None
+    try:
+        return track.window(start, count)
+    except OSError:
+        # Handle was evicted or closed under us; one fresh attempt is enough
+        track = _open_track(mat_path)
+        if track is None:
+            return None
+        return track.window(start, count)
+
+
+def _window_bounds(start: int, count: int, frames: int) -> Tuple[int, int]:
     start = max(0, int(start))
     count = max(1, min(2000, int(count)))
-    end = min(start + count, x.shape[1])
+    end = min(start + count, int(frames))
+    return min(start, end), end
+
+
+def _slice_tracks(x: np.ndarray, y: np.ndarray, start: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    start, end = _window_bounds(start, count, x.shape[1])
     xs = x[:, start:end]
     ys = y[:, start:end]
     return xs, ys
 
 
+# ── Level-of-detail pyramid ─────────────────────────────────────────────────
+#
+# Whole-recording overviews are served from a min/max/mean decimation pyramid
+# stored next to the track as ``<video>.track.lod.npy`` (+ ``.lod.json``).
+# Level 0 bins _LOD_BASE_BIN frames; each level above merges _LOD_FACTOR bins
+# until at most _LOD_TOP_BINS remain.  All levels are concatenated along the
+# bin axis of one float32 array shaped (stat, x|y, mice, bins) with stats
+# (min, max, mean, valid count); the header records each level's offset.
+
+_LOD_VERSION = 1
+_LOD_BASE_BIN = 16
+_LOD_FACTOR = 4
+_LOD_TOP_BINS = 64
+_LOD_STATS = ('min', 'max', 'mean', 'count')
+_LOD_OPEN_MAX = 32
+
+
+def _lod_paths(mat_path: Path) -> Tuple[Path, Path]:
+    base = _sidecar_base(mat_path)
+    return mat_path.with_name(base + '.track.lod.npy'), mat_path.with_name(base + '.track.lod.json')
+
+
+def _lod_reduce(v: np.ndarray, valid: np.ndarray, axis: int) -> Tuple[np.ndarray, ...]:
+    """Return (min, max, sum, count) of *v* over *axis*, ignoring invalid samples."""
+    vmin = np.where(valid, v, np.inf).min(axis=axis)
+    vmax = np.where(valid, v, -np.inf).max(axis=axis)
+    vsum = np.where(valid, v, 0.0).sum(axis=axis, dtype=np.float64)
+    cnt = valid.sum(axis=axis, dtype=np.int64)
+    return vmin, vmax, vsum, cnt
+
+
+def _lod_base_level(src: Any) -> Tuple[np.ndarray, ...]:
+    """Bin raw frames into level 0; arrays are shaped (x|y, mice, bins)."""
+    nbins = -(-src.frames // _LOD_BASE_BIN)
+    shape = (2, src.mice, nbins)
+    vmin = np.empty(shape, dtype=np.float64)
+    vmax = np.empty(shape, dtype=np.float64)
+    vsum = np.empty(shape, dtype=np.float64)
+    cnt = np.empty(shape, dtype=np.int64)
+    block = _SIDECAR_BLOCK_FRAMES - (_SIDECAR_BLOCK_FRAMES % _LOD_BASE_BIN)
+    for start in range(0, src.frames, block):
+        end = min(src.frames, start + block)
+        xs, ys = src.read(start, end)
+        v = np.stack((np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)))
+        n = end - start
+        nb = -(-n // _LOD_BASE_BIN)
+        pad = nb * _LOD_BASE_BIN - n
+        if pad:
+            v = np.concatenate((v, np.full((2, src.mice, pad), np.nan)), axis=2)
+        v = v.reshape(2, src.mice, nb, _LOD_BASE_BIN)
+        b0 = start // _LOD_BASE_BIN
+        parts = _lod_reduce(v, np.isfinite(v), axis=3)
+        for out, part in zip((vmin, vmax, vsum, cnt), parts):
+            out[:, :, b0:b0 + nb] = part
+    return vmin, vmax, vsum, cnt
+
+
+def _lod_merge_level(level: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray, ...]:
+    vmin, vmax, vsum, cnt = level
+    nbins = vmin.shape[2]
+    nb = -(-nbins // _LOD_FACTOR)
+    pad = nb * _LOD_FACTOR - nbins
+
+    def grouped(a: np.ndarray, fill: float) -> np.ndarray:
+        if pad:
+            a = np.concatenate((a, np.full(a.shape[:2] + (pad,), fill, dtype=a.dtype)), axis=2)
+        return a.reshape(a.shape[0], a.shape[1], nb, _LOD_FACTOR)
+
+    return (
+        grouped(vmin, np.inf).min(axis=3),
+        grouped(vmax, -np.inf).max(axis=3),
+        grouped(vsum, 0.0).sum(axis=3),
+        grouped(cnt, 0).sum(axis=3),
+    )
+
+
+def _lod_pack(level: Tuple[np.ndarray, ...]) -> np.ndarray:
+    vmin, vmax, vsum, cnt = level
+    empty = cnt == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = vsum / cnt
+    out = np.stack((vmin, vmax, mean, cnt.astype(np.float64)))
+    out[0:3][:, empty] = np.nan
+    return out.astype('<f4')
+
+
+def build_track_lod(mat_path: Path) -> bool:
+    """Build the decimation pyramid for *mat_path*; returns False on failure."""
+    key = _track_stat_key(mat_path)
+    src = _open_track(mat_path)
+    if key is None or src is None:
+        return False
+    levels: List[np.ndarray] = []
+    meta: List[Dict[str, int]] = []
+    current = _lod_base_level(src)
+    bin_frames = _LOD_BASE_BIN
+    offset = 0
+    while True:
+        packed = _lod_pack(current)
+        nbins = int(packed.shape[3])
+        levels.append(packed)
+        meta.append({'level': len(meta), 'bin_frames': bin_frames, 'bins': nbins, 'offset': offset})
+        offset += nbins
+        if nbins <= _LOD_TOP_BINS:
+            break
+        current = _lod_merge_level(current)
+        bin_frames *= _LOD_FACTOR
+    npy_path, header_path = _lod_paths(mat_path)
+    tmp_npy = npy_path.with_name(npy_path.name + '.tmp')
+    tmp_header = header_path.with_name(header_path.name + '.tmp')
+    try:
+        with tmp_npy.open('wb') as fh:
+            np.save(fh, np.ascontiguousarray(np.concatenate(levels, axis=3)))
+        os.replace(tmp_npy, npy_path)
+        header = {
+            'version': _LOD_VERSION,
+            'mice': int(src.mice),
+            'frames': int(src.frames),
+            'colors': list(src.colors or []),
+            'stats': list(_LOD_STATS),
+            'layout': '[stat, x|y, mice, bins]',
+            'levels': meta,
+            'source': mat_path.name,
+            'source_mtime_ns': key[0],
+            'source_size': key[1],
+        }
+        tmp_header.write_text(json.dumps(header, indent=2), encoding='utf-8')
+        os.replace(tmp_header, header_path)
+        return True
+    except Exception as e:
+        _log.warning("analyze: could not write track pyramid for %s: %s", mat_path, e)
+        for tmp in (tmp_npy, tmp_header):
+            try:
+                tmp.unlink(missing_ok=True)
+            except Exception:
+                pass
+        return False
+
+
+_LOD_OPEN: 'OrderedDict[str, Tuple[Tuple[int, int], np.ndarray, Dict[str, Any]]]' = OrderedDict()
+_LOD_LOCK = threading.Lock()
+
+
+def _lod_is_current(header: Dict[str, Any], key: Tuple[int, int]) -> bool:
+    try:
+        return (
+            int(header.get('version') or 0) == _LOD_VERSION
+            and int(header.get('source_mtime_ns')) == key[0]
+            and int(header.get('source_size')) == key[1]
+            and isinstance(header.get('levels'), list)
+        )
+    except Exception:
+        return False
+
+
+def _open_track_lod(mat_path: Path) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+    """Return (pyramid, header) for *mat_path*, building the pyramid if needed."""
+    key = _track_stat_key(mat_path)
+    if key is None:
+        return None
+    name = str(mat_path)
+    with _LOD_LOCK:
+        entry = _LOD_OPEN.get(name)
+        if entry is not None and entry[0] == key:
+            _LOD_OPEN.move_to_end(name)
+            return entry[1], entry[2]
+    npy_path, header_path = _lod_paths(mat_path)
+    header = _read_sidecar_header(header_path)
+    if not _lod_is_current(header, key) or not npy_path.is_file():
+        with _track_load_lock(mat_path, 'lod'):
+            header = _read_sidecar_header(header_path)
+            if not _lod_is_current(header, key) or not npy_path.is_file():
+                if not build_track_lod(mat_path):
+                    return None
+                header = _read_sidecar_header(header_path)
+    try:
+        data = np.load(str(npy_path), mmap_mode='r')
+    except Exception as e:
+        _log.warning("analyze: could not map track pyramid %s: %s", npy_path, e)
+        return None
+    with _LOD_LOCK:
+        _LOD_OPEN[name] = (key, data, header)
+        while len(_LOD_OPEN) > _LOD_OPEN_MAX:
+            _LOD_OPEN.popitem(last=False)
+    return data, header
+
+
+def _drop_open_lod(mat_path: Path) -> None:
+    with _LOD_LOCK:
+        _LOD_OPEN.pop(str(mat_path), None)
+
+
+register_track_invalidation_hook(_drop_open_lod)
+
+
 @bp.route('/api/analyze/info')
 def api_analyze_info():
     video = assert_within_allowed_roots((request.args.get('video') or '').strip())
@@ -435,7 +1215,7 @@ def api_analyze_info():
             'frames': 0,
             'reason': 'missing_file',
         })
-    track = _load_mat_tracks(mat)
+    track = _open_track(mat)
     if not track:
         return jsonify({
             'ok': False,
@@ -447,12 +1227,48 @@ def api_analyze_info():
     return jsonify({
         'ok': True,
         'track': str(mat),
-        'mice': int(track.x.shape[0]),
-        'frames': int(track.x.shape[1]),
+        'mice': int(track.mice),
+        'frames': int(track.frames),
         'colors': track.colors,
     })
 
 
+_POSITIONS_FORMATS = {'json', 'f32'}
+_F32_GZIP_LEVEL = 1
+
+
+def _f32_response(arr: np.ndarray, headers: Dict[str, Any]) -> Response:
+    """Send *arr* as raw C-order little-endian float32, gzipped if accepted."""
+    body = np.ascontiguousarray(arr, dtype='<f4').tobytes(order='C')
+    gzipped = request.accept_encodings['gzip'] > 0
+    if gzipped:
+        body = gzip.compress(body, compresslevel=_F32_GZIP_LEVEL)
+    rv = Response(body, mimetype='application/octet-stream')
+    for k, v in headers.items():
+        rv.headers[k] = str(v)
+    rv.headers['X-Track-Shape'] = ','.join(str(int(n)) for n in arr.shape)
+    rv.headers['X-Track-Dtype'] = 'float32-le'
+    rv.headers['X-Track-Missing'] = 'NaN'
+    rv.headers['Vary'] = 'Accept-Encoding'
+    if gzipped:
+        rv.headers['Content-Encoding'] = 'gzip'
+    return rv
+
+
+def _positions_f32_response(start: int, xs: np.ndarray, ys: np.ndarray) -> Response:
+    """Pack a window as raw little-endian float32: all x rows, then all y rows.
+
+    The body is a C-order (2, mice, count) array; missing samples are NaN.
+    Clients can wrap it directly, e.g. ``new Float32Array(buf)`` and take
+    row ``m`` of x as ``subarray(m * count, (m + 1) * count)``.
+    """
+    return _f32_response(np.stack((xs, ys)), {
+        'X-Track-Start': start,
+        'X-Track-Count': int(xs.shape[1]),
+        'X-Track-Mice': int(xs.shape[0]),
+    })
+
+
 @bp.route('/api/analyze/positions')
 def api_analyze_positions():
     video = assert_within_allowed_roots((request.args.get('video') or '').strip())
@@ -461,11 +1277,16 @@ def api_analyze_positions():
         count = int(request.args.get('count') or '240')
     except Exception:
         return jsonify({'error': 'Invalid start/count'}), 400
+    fmt = (request.args.get('format') or 'json').strip().lower()
+    if fmt not in _POSITIONS_FORMATS:
+        return jsonify({'error': 'Invalid format'}), 400
     mat = _track_path_for_video(video)
-    track = _load_mat_tracks(mat)
-    if not track:
+    window = _read_track_window(mat, start, count)
+    if window is None:
         return jsonify({'error': 'Tracking not found'}), 404
-    xs, ys = _slice_tracks(track.x, track.y, start, count)
+    xs, ys = window
+    if fmt == 'f32':
+        return _positions_f32_response(start, xs, ys)
     # Convert to mice-major arrays of arrays per frame index within chunk
     return jsonify({
         'ok': True,
@@ -476,4 +1297,181 @@ def api_analyze_positions():
     })
 
 
-__all__ = ['bp']
+_STREAM_WINDOW_DEFAULT = 250
+_STREAM_AHEAD_DEFAULT_S = 2.0
+_STREAM_AHEAD_MAX_S = 30.0
+# Longest single sleep between events, so a closed client is noticed quickly
+_STREAM_SLEEP_MAX_S = 0.5
+_STREAM_PREFETCH = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analyze-stream')
+
+
+def _stream_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _nan_to_none(arr: np.ndarray) -> List[Any]:
+    """Nested lists of *arr* with NaN as None (JSON has no NaN)."""
+    if arr.ndim > 1:
+        return [_nan_to_none(a) for a in arr]
+    return [None if v != v else v for v in np.asarray(arr, dtype=np.float64).tolist()]
+
+
+def _stream_window_payload(start: int, xs: np.ndarray, ys: np.ndarray, fmt: str) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {'start': start, 'count': int(xs.shape[1]), 'mice': int(xs.shape[0])}
+    if fmt == 'f32':
+        # Same (2, mice, count) little-endian float32 layout as format=f32
+        raw = np.ascontiguousarray(np.stack((xs, ys)), dtype='<f4').tobytes(order='C')
+        payload['f32'] = base64.b64encode(raw).decode('ascii')
+    else:
+        # JSON has no NaN; missing samples become null
+        payload['x'] = _nan_to_none(np.asarray(xs))
+        payload['y'] = _nan_to_none(np.asarray(ys))
+    return payload
+
+
+@bp.route('/api/analyze/positions/stream')
+def api_analyze_positions_stream():
+    """Push consecutive position windows as server-sent events.
+
+    Windows of ``window`` frames are sent from ``start`` and paced so the
+    stream stays ``ahead`` seconds in front of a playback clock advancing at
+    ``rate`` frames per second; the next window is read while the current
+    one is written.  Each event's id is the next frame, so an EventSource
+    reconnect resumes where it left off; seeking is a new request.
+    """
+    video = assert_within_allowed_roots((request.args.get('video') or '').strip())
+    try:
+        last_id = request.headers.get('Last-Event-ID')
+        start = int(last_id if last_id not in (None, '') else (request.args.get('start') or '0'))
+        rate = float(request.args.get('rate') or '30')
+        window = int(request.args.get('window') or _STREAM_WINDOW_DEFAULT)
+        ahead_s = float(request.args.get('ahead') or _STREAM_AHEAD_DEFAULT_S)
+    except Exception:
+        return jsonify({'error': 'Invalid start/rate/window/ahead'}), 400
+    if not (rate > 0):
+        return jsonify({'error': 'rate must be positive'}), 400
+    fmt = (request.args.get('format') or 'json').strip().lower()
+    if fmt not in _POSITIONS_FORMATS:
+        return jsonify({'error': 'Invalid format'}), 400
+    mat = _track_path_for_video(video)
+    track = _open_track(mat)
+    if track is None:
+        return jsonify({'error': 'Tracking not found'}), 404
+    start = max(0, min(start, int(track.frames)))
+    window = max(1, min(2000, window))
+    ahead = max(0.0, min(_STREAM_AHEAD_MAX_S, ahead_s)) * rate
+
+    def generate():
+        yield _stream_event('info', {
+            'start': start,
+            'frames': int(track.frames),
+            'mice': int(track.mice),
+            'colors': track.colors,
+            'rate': rate,
+            'window': window,
+            'format': fmt,
+        })
+        t0 = time.monotonic()
+        pos = start
+        pending = _STREAM_PREFETCH.submit(_read_track_window, mat, pos, window)
+        try:
+            while pos < track.frames:
+                block = pending.result()
+                if block is None or block[0].shape[1] == 0:
+                    break
+                xs, ys = block
+                nxt = pos + int(xs.shape[1])
+                pending = _STREAM_PREFETCH.submit(_read_track_window, mat, nxt, window)
+                yield _stream_event('window', _stream_window_payload(pos, xs, ys, fmt), event_id=nxt)
+                pos = nxt
+                while True:
+                    played = start + (time.monotonic() - t0) * rate
+                    lead = pos - played - ahead
+                    if lead <= 0:
+                        break
+                    time.sleep(min(_STREAM_SLEEP_MAX_S, lead / rate))
+            yield _stream_event('end', {'frame': pos})
+        finally:
+            pending.cancel()
+
+    rv = Response(generate(), mimetype='text/event-stream')
+    rv.headers['Cache-Control'] = 'no-cache'
+    rv.headers['X-Accel-Buffering'] = 'no'
+    return rv
+
+
+@bp.route('/api/analyze/overview')
+def api_analyze_overview():
+    """Serve one level of the track's min/max/mean pyramid.
+
+    ``level`` selects a pyramid level directly; otherwise ``width`` (e.g. the
+    canvas width in pixels) picks the coarsest level with at least that many
+    bins.  ``format=f32`` returns the (stat, x|y, mice, bins) array as raw
+    float32 like /api/analyze/positions.
+    """
+    video = assert_within_allowed_roots((request.args.get('video') or '').strip())
+    fmt = (request.args.get('format') or 'json').strip().lower()
+    if fmt not in _POSITIONS_FORMATS:
+        return jsonify({'error': 'Invalid format'}), 400
+    mat = _track_path_for_video(video)
+    opened = _open_track_lod(mat)
+    if opened is None:
+        return jsonify({'error': 'Tracking not found'}), 404
+    data, header = opened
+    levels = header.get('levels') or []
+    if not levels:
+        return jsonify({'error': 'Tracking not found'}), 404
+    try:
+        raw_level = request.args.get('level')
+        raw_width = request.args.get('width')
+        if raw_level not in (None, ''):
+            level = max(0, min(len(levels) - 1, int(raw_level)))
+        elif raw_width not in (None, ''):
+            width = max(1, int(raw_width))
+            fits = [lv['level'] for lv in levels if int(lv['bins']) >= width]
+            level = fits[-1] if fits else 0
+        else:
+            level = len(levels) - 1
+    except Exception:
+        return jsonify({'error': 'Invalid level/width'}), 400
+    meta = levels[level]
+    off, nbins = int(meta['offset']), int(meta['bins'])
+    arr = data[:, :, :, off:off + nbins]
+    if fmt == 'f32':
+        return _f32_response(arr, {
+            'X-Track-Level': level,
+            'X-Track-Bin-Frames': int(meta['bin_frames']),
+            'X-Track-Mice': int(header.get('mice') or arr.shape[2]),
+            'X-Track-Frames': int(header.get('frames') or 0),
+            'X-Track-Stats': ','.join(_LOD_STATS),
+        })
+    out: Dict[str, Any] = {
+        'ok': True,
+        'level': level,
+        'bin_frames': int(meta['bin_frames']),
+        'bins': nbins,
+        'frames': int(header.get('frames') or 0),
+        'mice': int(header.get('mice') or arr.shape[2]),
+        'colors': header.get('colors') or [],
+        'levels': [{'level': int(lv['level']), 'bin_frames': int(lv['bin_frames']), 'bins': int(lv['bins'])} for lv in levels],
+    }
+    for ci, coord in enumerate(('x', 'y')):
+        # Empty bins (tracking gaps, tail padding) are NaN; send them as null
+        out[coord] = {stat: _nan_to_none(arr[si, ci]) for si, stat in enumerate(_LOD_STATS)}
+    return jsonify(out)
+
+
+@bp.route('/api/analyze/cache')
+def api_analyze_cache():
+    return jsonify({'ok': True, **track_cache_stats()})
+
+
+__all__ = [
+    'bp',
+    'TrackData',
+    'load_tracks_cached',
+    'invalidate_track_cache',
+    'register_track_invalidation_hook',
+    'track_cache_stats',
+]
@@ -0,0 +1,254 @@
+"""Experiment-wide metrics as a background task (``analyze.batch``).
+
+Every ``*.obj.mat`` under a directory is analysed in a process pool; each
+video still goes through :func:`metrics_for_video`, so recordings whose
+track and preproc sidecar are unchanged come straight from their cached
+``.track.metrics.json``.  One row per (video, mouse) is written to
+``metrics_summary.csv`` and, column by column, to ``metrics_summary.npz``.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import csv
+import logging
+import multiprocessing
+import os
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+from .analyze import _track_path_for_video
+from .config import cfg_analyze_batch_workers
+from .metrics import MetricsParams, metrics_for_video
+from .pathguard import assert_within_allowed_roots
+from .tasks import TaskContext, enqueue_task, register_task_resumer, update_task
+
+bp = Blueprint('batch_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_SUMMARY_NAME = 'metrics_summary'
+_TRACK_SUFFIX = '.obj.mat'
+# How often the runner wakes up to check for cancellation
+_POLL_SECONDS = 1.0
+
+_SUMMARY_COLUMNS: List[Tuple[str, str]] = [
+    ('video', 'str'),
+    ('mouse', 'int'),
+    ('color', 'str'),
+    ('frames', 'int'),
+    ('fps', 'float'),
+    ('duration_s', 'float'),
+    ('units', 'str'),
+    ('valid_frames', 'int'),
+    ('distance', 'float'),
+    ('speed_mean', 'float'),
+    ('speed_max', 'float'),
+    ('moving_s', 'float'),
+    ('immobile_bouts', 'int'),
+    ('immobile_s', 'float'),
+    ('immobile_longest_s', 'float'),
+    ('arena_s', 'float'),
+]
+
+
+def find_track_videos(root: Path) -> List[Path]:
+    """Return videos under *root* that have a ``.obj.mat`` track next to them."""
+    videos: List[Path] = []
+    for mat in root.rglob('*' + _TRACK_SUFFIX):
+        if not mat.is_file():
+            continue
+        video = mat.with_name(mat.name[:-len(_TRACK_SUFFIX)])
+        if _track_path_for_video(video) == mat:
+            videos.append(video)
+    videos.sort()
+    return videos
+
+
+def _metrics_worker(video: str, params: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]], str]:
+    """Process-pool entry point: (video, metrics or None, error message)."""
+    try:
+        result, _cached = metrics_for_video(Path(video), MetricsParams(**params))
+        if result is None:
+            return video, None, 'track could not be decoded'
+        return video, result, ''
+    except Exception as e:
+        return video, None, str(e)
+
+
+def _summary_rows(root: Path, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    try:
+        video = str(Path(result['video']).relative_to(root))
+    except Exception:
+        video = str(result.get('video'))
+    rows = []
+    for m in result.get('mice') or []:
+        immobile = m.get('immobile') or {}
+        row: Dict[str, Any] = {
+            'video': video,
+            'mouse': m.get('index'),
+            'color': m.get('color') or '',
+            'frames': result.get('frames'),
+            'fps': result.get('fps'),
+            'duration_s': result.get('duration_s'),
+            'units': result.get('units') or '',
+            'valid_frames': m.get('valid_frames'),
+            'distance': m.get('distance'),
+            'speed_mean': m.get('speed_mean'),
+            'speed_max': m.get('speed_max'),
+            'moving_s': m.get('moving_s'),
+            'immobile_bouts': immobile.get('bouts'),
+            'immobile_s': immobile.get('total_s'),
+            'immobile_longest_s': immobile.get('longest_s'),
+            'arena_s': m.get('arena_s'),
+        }
+        for name, secs in (m.get('roi_s') or {}).items():
+            row['roi:' + name] = secs
+        rows.append(row)
+    return rows
+
+
+def _write_summary(out_dir: Path, rows: List[Dict[str, Any]]) -> Tuple[Path, Path]:
+    """Write *rows* as CSV and as a column-per-array .npz; returns both paths."""
+    roi_cols = sorted({k for r in rows for k in r if k.startswith('roi:')})
+    columns = _SUMMARY_COLUMNS + [(c, 'float') for c in roi_cols]
+    csv_path = out_dir / (_SUMMARY_NAME + '.csv')
+    npz_path = out_dir / (_SUMMARY_NAME + '.npz')
+
+    tmp_csv = csv_path.with_name(csv_path.name + '.tmp')
+    with tmp_csv.open('w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for r in rows:
+            writer.writerow(['' if r.get(name) is None else r.get(name) for name, _ in columns])
+    os.replace(tmp_csv, csv_path)
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, kind in columns:
+        values = [r.get(name) for r in rows]
+        if kind == 'str':
+            arrays[name] = np.array([str(v or '') for v in values], dtype=str)
+        elif kind == 'int':
+            arrays[name] = np.array([-1 if v is None else int(v) for v in values], dtype=np.int64)
+        else:
+            arrays[name] = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    tmp_npz = npz_path.with_name(npz_path.name + '.tmp')
+    with tmp_npz.open('wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_npz, npz_path)
+    return csv_path, npz_path
+
+
+def _run_batch(ctx: TaskContext, payload: Dict[str, Any]) -> None:
+    root = Path(str(payload.get('root') or ''))
+    if not root.is_dir():
+        update_task(ctx.task_id, status='FAILED', message=f'Directory not found: {root}')
+        return
+    params = dict(payload.get('params') or {})
+    videos = find_track_videos(root)
+    total = len(videos)
+    ctx.set_progress(0, total=total)
+    if not videos:
+        update_task(ctx.task_id, status='DONE', message='No tracks found')
+        return
+
+    workers = min(cfg_analyze_batch_workers(), total)
+    ctx.update(message=f'Analysing {total} recordings on {workers} processes')
+    results: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+    cancelled = False
+    # spawn: the server process is multi-threaded, which makes fork unsafe
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+    )
+    try:
+        pending = {pool.submit(_metrics_worker, str(v), params) for v in videos}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=_POLL_SECONDS, return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for fut in done:
+                try:
+                    video, result, error = fut.result()
+                except Exception as e:
+                    _log.warning("batch: worker failed: %s", e)
+                    continue
+                if result is not None:
+                    results[video] = result
+                else:
+                    errors[video] = error
+            if done:
+                ctx.set_progress(len(results) + len(errors), total=total)
+            if ctx.cancelled():
+                cancelled = True
+                break
+    finally:
+        pool.shutdown(wait=not cancelled, cancel_futures=True)
+
+    if cancelled:
+        update_task(ctx.task_id, status='CANCELLED', message=f'Cancelled after {len(results) + len(errors)}/{total}')
+        return
+    rows: List[Dict[str, Any]] = []
+    for video in sorted(results):
+        rows.extend(_summary_rows(root, results[video]))
+    try:
+        csv_path, npz_path = _write_summary(root, rows)
+    except Exception as e:
+        update_task(ctx.task_id, status='FAILED', message=f'Could not write summary: {e}')
+        return
+    update_task(
+        ctx.task_id,
+        status='DONE',
+        message=f'{len(results)} analysed, {len(errors)} failed',
+        meta={'csv': str(csv_path), 'npz': str(npz_path), 'errors': errors},
+    )
+
+
+def start_batch(root: Path, params: Optional[MetricsParams] = None) -> Dict[str, Any]:
+    payload = {'root': str(root), 'params': asdict(params or MetricsParams())}
+    return enqueue_task(
+        title=f'Analyze {root.name or root}',
+        kind='analyze.batch',
+        runner=lambda ctx, p=payload: _run_batch(ctx, p),
+        meta={'root': str(root)},
+        payload=payload,
+    )
+
+
+@bp.route('/api/analyze/batch', methods=['POST'])
+def api_analyze_batch():
+    payload = request.json or {}
+    directory = str(payload.get('dir') or '').strip()
+    if not directory:
+        facility = str(payload.get('facility') or '').strip().lower()
+        experiment = str(payload.get('experiment') or '').strip()
+        treatment = str(payload.get('treatment') or '').strip()
+        if not facility or not experiment:
+            return jsonify({'error': 'Provide dir, or facility and experiment'}), 400
+        from .importer import _resolve_import_output_dir
+        resolved = _resolve_import_output_dir(facility, experiment, treatment)
+        if resolved is None:
+            return jsonify({'error': 'Could not resolve output directory'}), 400
+        directory = str(resolved)
+    root = assert_within_allowed_roots(directory)
+    if not root.is_dir():
+        return jsonify({'error': 'Directory not found'}), 404
+    params = MetricsParams()
+    try:
+        if payload.get('immobile_speed') not in (None, ''):
+            params.immobile_speed = max(0.0, float(payload['immobile_speed']))
+        if payload.get('immobile_min_s') not in (None, ''):
+            params.immobile_min_s = max(0.0, float(payload['immobile_min_s']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid parameters'}), 400
+    task = start_batch(root, params)
+    return jsonify({'ok': True, 'task_id': task['id'], 'dir': str(root)})
+
+
+register_task_resumer('analyze.batch', _run_batch)
+
+
+__all__ = ['bp', 'find_track_videos', 'start_batch']
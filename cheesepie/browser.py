@@ -1,21 +1,214 @@
 from __future__ import annotations
 
+import json
 import logging
 import mimetypes
+import os
 import re
+import stat as stat_mod
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from .config import cfg_importer_facilities
 
 from .config import cfg_browser_visible_extensions, cfg_browser_required_filename_regex
+from .manifest import video_artifacts
+from .thumbs import schedule_thumbnails
 
 
 bp = Blueprint('browser_api', __name__)
 _log = logging.getLogger(__name__)
 
 _SORT_KEYS = {'name', 'date', 'size'}
+# Listings are reused while the directory's mtime is unchanged; the age cap
+# bounds how stale sizes of files still being written can get
+_LIST_CACHE_MAX = 64
+_LIST_CACHE_MAX_AGE = 30.0
+# Filtered/sorted orderings kept per cached directory
+_LIST_VIEWS_MAX = 8
+_LIST_PAGE_MAX = 5000
+# Items per NDJSON flush
+_LIST_STREAM_BATCH = 500
+# While scanning an uncached directory, found entries are flushed at least this often
+_LIST_SCAN_FLUSH_SECONDS = 0.1
+
+
+class _DirListing:
+    """One scandir pass over a directory: every non-hidden entry plus all names.
+
+    ``views`` caches filtered, sorted orderings of ``entries`` (as positions)
+    keyed by query, filters and sort, so paging through a listing only
+    slices a list.
+    """
+
+    __slots__ = ('mtime_ns', 'scanned_at', 'entries', 'names', 'views', 'lock')
+
+    def __init__(self, mtime_ns: int, entries: List[Dict[str, Any]], names: Set[str]):
+        self.mtime_ns = mtime_ns
+        self.scanned_at = time.monotonic()
+        self.entries = entries
+        self.names = names
+        self.views: 'OrderedDict[Tuple[Any, ...], Tuple[List[int], int]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+
+_list_cache: 'OrderedDict[str, _DirListing]' = OrderedDict()
+_list_cache_lock = threading.Lock()
+
+
+def _iter_scan(base: Path, names: Set[str]) -> Iterator[Dict[str, Any]]:
+    """Non-hidden entries of *base* in scandir order, without sidecar flags; fills *names*."""
+    with os.scandir(base) as it:
+        for entry in it:
+            names.add(entry.name)
+            if entry.name.startswith('.'):
+                continue
+            try:
+                is_dir = entry.is_dir()
+                stat = entry.stat()
+            except OSError as e:
+                _log.warning("browser: skipping %s — stat failed: %s", entry.path, e)
+                continue
+            path = Path(entry.path)
+            if entry.is_symlink():
+                path = path.resolve()
+            yield {
+                "name": entry.name,
+                "path": str(path),
+                "is_dir": is_dir,
+                "size": stat.st_size,
+                "modified": stat.st_mtime,
+                "ext": os.path.splitext(entry.name)[1].lower(),
+            }
+
+
+def _classify(entries: List[Dict[str, Any]]) -> None:
+    # Sidecars come from the same pass: no per-file exists() probes
+    stats = {e['name']: (e['size'], e['modified']) for e in entries if not e['is_dir']}
+    for item in entries:
+        if item['is_dir']:
+            continue
+        artifacts = video_artifacts(item['name'], stats)
+        item["has_preproc"] = 'preproc' in artifacts
+        item["has_annotations"] = 'annotations' in artifacts
+        item["has_track"] = 'track' in artifacts
+        item["artifacts"] = artifacts
+
+
+def _scan_dir(directory: Path, mtime_ns: int) -> _DirListing:
+    names: Set[str] = set()
+    entries = list(_iter_scan(directory.resolve(), names))
+    _classify(entries)
+    return _DirListing(mtime_ns, entries, names)
+
+
+def _cached_listing(key: str, mtime_ns: int) -> Optional[_DirListing]:
+    with _list_cache_lock:
+        cached = _list_cache.get(key)
+        if (
+            cached is not None
+            and cached.mtime_ns == mtime_ns
+            and time.monotonic() - cached.scanned_at < _LIST_CACHE_MAX_AGE
+        ):
+            _list_cache.move_to_end(key)
+            return cached
+    return None
+
+
+def _remember_listing(key: str, listing: _DirListing) -> None:
+    with _list_cache_lock:
+        _list_cache[key] = listing
+        _list_cache.move_to_end(key)
+        while len(_list_cache) > _LIST_CACHE_MAX:
+            _list_cache.popitem(last=False)
+
+
+def _dir_listing(directory: Path) -> Optional[_DirListing]:
+    """Cached scan of *directory*, rescanned when its mtime changes."""
+    try:
+        st = directory.stat()
+    except OSError:
+        return None
+    if not stat_mod.S_ISDIR(st.st_mode):
+        return None
+    key = str(directory)
+    cached = _cached_listing(key, st.st_mtime_ns)
+    if cached is not None:
+        return cached
+    try:
+        listing = _scan_dir(directory, st.st_mtime_ns)
+    except OSError as e:
+        _log.warning("browser: could not list %s: %s", directory, e)
+        return None
+    _remember_listing(key, listing)
+    return listing
+
+
+def _sort_key(sort_by: str):
+    if sort_by == 'date':
+        return lambda x: x['modified']
+    if sort_by == 'size':
+        return lambda x: x['size']
+    return lambda x: x['name'].lower()
+
+
+def _entry_filter(q_lower: str) -> Callable[[Dict[str, Any]], bool]:
+    """Predicate for entries shown in listings: all matching directories, visible video files."""
+    allowed_exts = set(cfg_browser_visible_extensions())
+    name_re = cfg_browser_required_filename_regex()
+
+    def visible(entry: Dict[str, Any]) -> bool:
+        if q_lower and (q_lower not in entry['name'].lower()):
+            return False
+        if entry['is_dir']:
+            return True
+        if entry['ext'] not in allowed_exts:
+            return False
+        return name_re is None or name_re.match(entry['name']) is not None
+
+    return visible
+
+
+def _listing_view(
+    listing: _DirListing, query: str | None, sort_by: str, sort_order: str,
+) -> Tuple[List[int], int]:
+    """Positions of the visible entries in display order, and how many are directories."""
+    q_lower = (query or "").strip().lower()
+    allowed_exts = set(cfg_browser_visible_extensions())
+    name_re = cfg_browser_required_filename_regex()
+    descending = sort_order == 'desc'
+    view_key = (
+        sort_by, descending, q_lower, tuple(sorted(allowed_exts)),
+        name_re.pattern if name_re is not None else None,
+    )
+    with listing.lock:
+        view = listing.views.get(view_key)
+        if view is not None:
+            listing.views.move_to_end(view_key)
+            return view
+
+    entries = listing.entries
+    visible = _entry_filter(q_lower)
+    dirs: List[int] = []
+    files: List[int] = []
+    for i, entry in enumerate(entries):
+        if visible(entry):
+            (dirs if entry['is_dir'] else files).append(i)
+
+    # Sort: directories always first, then apply sort_by within each group
+    key = _sort_key(sort_by)
+    dirs.sort(key=lambda i: key(entries[i]), reverse=descending)
+    files.sort(key=lambda i: key(entries[i]), reverse=descending)
+    view = (dirs + files, len(dirs))
+    with listing.lock:
+        listing.views[view_key] = view
+        while len(listing.views) > _LIST_VIEWS_MAX:
+            listing.views.popitem(last=False)
+    return view
 
 
 def list_dir_contents(
@@ -24,63 +217,62 @@ def list_dir_contents(
     sort_by: str = 'name',
     sort_order: str = 'asc',
 ) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    if not directory.exists() or not directory.is_dir():
-        return items
+    listing = _dir_listing(directory)
+    if listing is None:
+        return []
+    sort_by = sort_by if sort_by in _SORT_KEYS else 'name'
+    order, _dirs = _listing_view(listing, query, sort_by, sort_order.lower())
+    return [dict(listing.entries[i]) for i in order]
 
-    q = (query or "").strip()
-    q_lower = q.lower()
-    allowed_exts = set(cfg_browser_visible_extensions())
-    name_re = cfg_browser_required_filename_regex()
-    descending = sort_order.lower() == 'desc'
 
-    for entry in directory.iterdir():
-        if entry.name.startswith('.'):
-            continue
-        name_lower = entry.name.lower()
-        if q and (q_lower not in name_lower):
-            continue
-        if entry.is_file():
-            if entry.suffix.lower() not in allowed_exts:
-                continue
-            if name_re is not None and not name_re.match(entry.name):
-                continue
-        try:
-            stat = entry.stat()
-        except OSError as e:
-            _log.warning("browser: skipping %s — stat failed: %s", entry, e)
-            continue
-        item: Dict[str, Any] = {
-            "name": entry.name,
-            "path": str(entry.resolve()),
-            "is_dir": entry.is_dir(),
-            "size": stat.st_size,
-            "modified": stat.st_mtime,
-            "ext": entry.suffix.lower(),
-        }
-        if entry.is_file():
-            item["has_preproc"] = (
-                (entry.parent / f"{entry.name}.preproc.json").exists()
-                or entry.with_suffix(".preproc.json").exists()
-            )
-            item["has_annotations"] = entry.with_suffix(".json").exists()
-        items.append(item)
+def _encode_cursor(mtime_ns: int, offset: int) -> str:
+    return f'{mtime_ns:x}.{offset:x}'
 
-    # Sort: directories always first, then apply sort_by within each group
-    sort_by = sort_by if sort_by in _SORT_KEYS else 'name'
-    dirs = [x for x in items if x['is_dir']]
-    files = [x for x in items if not x['is_dir']]
 
-    if sort_by == 'date':
-        sort_key = lambda x: x['modified']
-    elif sort_by == 'size':
-        sort_key = lambda x: x['size']
-    else:
-        sort_key = lambda x: x['name'].lower()
+def _decode_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    mtime, _, offset = cursor.partition('.')
+    try:
+        return int(mtime, 16), int(offset, 16)
+    except ValueError:
+        return None
+
 
-    dirs.sort(key=sort_key, reverse=descending)
-    files.sort(key=sort_key, reverse=descending)
-    return dirs + files
+def list_dir_page(
+    directory: Path,
+    query: str | None = None,
+    sort_by: str = 'name',
+    sort_order: str = 'asc',
+    cursor: str | None = None,
+    limit: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """One page of a directory listing, or None when it cannot be listed.
+
+    The result has ``items``, ``total`` (visible entries), ``dirs``,
+    ``offset`` and ``next_cursor`` (None on the last page).  A cursor is
+    tied to the directory's mtime; a ``ValueError`` is raised when it is
+    malformed or the directory has changed since it was issued.
+    """
+    listing = _dir_listing(directory)
+    if listing is None:
+        return None
+    offset = 0
+    if cursor:
+        decoded = _decode_cursor(cursor)
+        if decoded is None:
+            raise ValueError('Invalid cursor')
+        if decoded[0] != listing.mtime_ns:
+            raise ValueError('Directory changed since the cursor was issued')
+        offset = max(0, decoded[1])
+    sort_by = sort_by if sort_by in _SORT_KEYS else 'name'
+    order, dirs = _listing_view(listing, query, sort_by, sort_order.lower())
+    end = len(order) if limit is None else min(len(order), offset + max(1, limit))
+    return {
+        'items': [dict(listing.entries[i]) for i in order[offset:end]],
+        'total': len(order),
+        'dirs': dirs,
+        'offset': offset,
+        'next_cursor': _encode_cursor(listing.mtime_ns, end) if end < len(order) else None,
+    }
 
 
 def file_info(path: Path) -> Dict[str, Any]:
@@ -120,8 +312,119 @@ def api_list():
         path.relative_to(base)
     except Exception:
         return jsonify({"items": [], "error": "Path outside facility scope"}), 403
-    items = list_dir_contents(path, query, sort_by=sort_by, sort_order=sort_order)
-    return jsonify({"items": items, "sort": sort_by, "order": sort_order})
+    fmt = request.args.get('format', '').strip().lower()
+    cursor = request.args.get('cursor', '').strip() or None
+    limit: Optional[int] = None
+    if request.args.get('limit'):
+        try:
+            limit = max(1, min(_LIST_PAGE_MAX, int(request.args['limit'])))
+        except ValueError:
+            return jsonify({"items": [], "error": "Invalid limit"}), 400
+    if fmt != 'ndjson' and limit is None and cursor is None:
+        items = list_dir_contents(path, query, sort_by=sort_by, sort_order=sort_order)
+        _queue_thumbnails(path, items)
+        return jsonify({"items": items, "sort": sort_by, "order": sort_order})
+
+    if fmt == 'ndjson' and cursor is None:
+        try:
+            st = path.stat()
+        except OSError:
+            st = None
+        if st is not None and stat_mod.S_ISDIR(st.st_mode) and _cached_listing(str(path), st.st_mtime_ns) is None:
+            return _stream_scan(path, st.st_mtime_ns, query, sort_by, sort_order, limit)
+
+    try:
+        page = list_dir_page(path, query, sort_by, sort_order, cursor=cursor, limit=limit)
+    except ValueError as e:
+        return jsonify({"items": [], "error": str(e)}), 409
+    if page is None:
+        page = {'items': [], 'total': 0, 'dirs': 0, 'offset': 0, 'next_cursor': None}
+    if fmt == 'ndjson':
+        return _stream_page(path, page, sort_by, sort_order)
+    _queue_thumbnails(path, page['items'])
+    return jsonify({**page, "sort": sort_by, "order": sort_order})
+
+
+def _queue_thumbnails(directory: Path, items: List[Dict[str, Any]]) -> None:
+    try:
+        schedule_thumbnails(Path(x['path']) for x in items if not x['is_dir'])
+    except Exception as e:
+        _log.warning("browser: could not queue thumbnails for %s: %s", directory, e)
+
+
+def _stream_page(directory: Path, page: Dict[str, Any], sort_by: str, sort_order: str) -> Response:
+    """NDJSON: a header line with counts, one line per item, then ``{done, count, next_cursor}``."""
+    items = page['items']
+
+    def generate() -> Iterator[str]:
+        header = {k: page[k] for k in ('total', 'dirs', 'offset')}
+        yield json.dumps({**header, 'sort': sort_by, 'order': sort_order}) + '\n'
+        for start in range(0, len(items), _LIST_STREAM_BATCH):
+            batch = items[start:start + _LIST_STREAM_BATCH]
+            yield ''.join(json.dumps(item) + '\n' for item in batch)
+            if start == 0:
+                # Once per response; schedule_thumbnails caps what it takes anyway
+                _queue_thumbnails(directory, items)
+        yield json.dumps({'done': True, 'count': len(items), 'next_cursor': page['next_cursor']}) + '\n'
+
+    rv = Response(generate(), mimetype='application/x-ndjson')
+    rv.headers['Cache-Control'] = 'no-cache'
+    rv.headers['X-Accel-Buffering'] = 'no'
+    return rv
+
+
+def _stream_scan(
+    directory: Path, mtime_ns: int, query: str, sort_by: str, sort_order: str, limit: Optional[int],
+) -> Response:
+    """NDJSON for an uncached directory, sent while it is being scanned.
+
+    Lines: ``{scanning: true, sort, order}``; then up to *limit* visible
+    entries in scandir order as they are found (without sidecar flags),
+    interleaved with ``{scanned: n}`` progress; finally, once the listing is
+    cached, ``{done, count, total, dirs, next_cursor: null, resort: true}``.
+    Clients then request the first sorted page, which is served from the cache.
+    """
+    visible = _entry_filter(query.lower())
+    shown_max = limit or _LIST_PAGE_MAX
+
+    def generate() -> Iterator[str]:
+        yield json.dumps({'scanning': True, 'sort': sort_by, 'order': sort_order}) + '\n'
+        names: Set[str] = set()
+        entries: List[Dict[str, Any]] = []
+        lines: List[str] = []
+        shown = 0
+        flushed_at = time.monotonic()
+        try:
+            for entry in _iter_scan(directory.resolve(), names):
+                entries.append(entry)
+                if shown < shown_max and visible(entry):
+                    lines.append(json.dumps(entry))
+                    shown += 1
+                now = time.monotonic()
+                if len(lines) >= _LIST_STREAM_BATCH or now - flushed_at >= _LIST_SCAN_FLUSH_SECONDS:
+                    lines.append(json.dumps({'scanned': len(entries)}))
+                    yield '\n'.join(lines) + '\n'
+                    lines = []
+                    flushed_at = now
+        except OSError as e:
+            _log.warning("browser: could not list %s: %s", directory, e)
+            yield json.dumps({'done': True, 'count': shown, 'error': 'Could not list directory'}) + '\n'
+            return
+        if lines:
+            yield '\n'.join(lines) + '\n'
+        _classify(entries)
+        listing = _DirListing(mtime_ns, entries, names)
+        _remember_listing(str(directory), listing)
+        order, dirs = _listing_view(listing, query, sort_by if sort_by in _SORT_KEYS else 'name', sort_order)
+        yield json.dumps({
+            'done': True, 'count': shown, 'total': len(order), 'dirs': dirs,
+            'next_cursor': None, 'resort': True,
+        }) + '\n'
+
+    rv = Response(generate(), mimetype='application/x-ndjson')
+    rv.headers['Cache-Control'] = 'no-cache'
+    rv.headers['X-Accel-Buffering'] = 'no'
+    return rv
 
 
 @bp.route('/fileinfo')
@@ -145,4 +448,4 @@ def api_fileinfo():
     return jsonify(info)
 
 
-__all__ = ['bp', 'list_dir_contents', 'file_info']
+__all__ = ['bp', 'list_dir_contents', 'list_dir_page', 'file_info']
@@ -163,6 +163,15 @@ def cfg_browser_visible_extensions() -> List[str]:
     return exts
 
 
+def cfg_media_probe_concurrency() -> int:
+    """Concurrent ffprobe runs used by probe_many."""
+    try:
+        v = int(CONFIG.get('browser', {}).get('probe_concurrency', 8))
+        return max(1, min(64, v))
+    except Exception:
+        return 8
+
+
 def cfg_importer_facilities() -> Dict[str, Any]:
     raw = CONFIG.get('facilities') or CONFIG.get('importer', {}).get('facilities', {})
     out: Dict[str, Any] = {}
@@ -353,6 +362,75 @@ def cfg_importer_health_tolerance_seconds() -> float:
         return 300.0
 
 
+def cfg_analyze_track_cache_mb() -> int:
+    try:
+        v = int(CONFIG.get('analyze', {}).get('track_cache_mb', 512))
+        return max(0, min(65536, v))
+    except Exception:
+        return 512
+
+
+def cfg_analyze_track_sidecar() -> bool:
+    try:
+        return bool(CONFIG.get('analyze', {}).get('track_sidecar', True))
+    except Exception:
+        return True
+
+
+def cfg_analyze_batch_workers() -> int:
+    """Process count for analyze.batch; 0 means one per CPU."""
+    try:
+        v = int(CONFIG.get('analyze', {}).get('batch_workers', 0))
+        if v <= 0:
+            v = os.cpu_count() or 1
+        return max(1, min(64, v))
+    except Exception:
+        return 1
+
+
+def cfg_media_proxy_quota_bytes() -> int:
+    """Disk budget for scrubbing proxies; least recently used are evicted beyond it."""
+    try:
+        gb = float(CONFIG.get('media', {}).get('proxy_quota_gb', 20))
+        return max(0, int(gb * 1024 ** 3))
+    except Exception:
+        return 20 * 1024 ** 3
+
+
+def cfg_media_hls_quota_bytes() -> int:
+    """Disk budget for cached HLS segments; least recently used videos are evicted beyond it."""
+    try:
+        gb = float(CONFIG.get('media', {}).get('hls_quota_gb', 20))
+        return max(0, int(gb * 1024 ** 3))
+    except Exception:
+        return 20 * 1024 ** 3
+
+
+def cfg_media_preview_tmp_quota_bytes() -> int:
+    """Budget for uploaded preview files in the app temp dir (LRU-cleaned)."""
+    try:
+        gb = float(CONFIG.get('media', {}).get('preview_tmp_quota_gb', 20))
+        return max(0, int(gb * 1024 ** 3))
+    except Exception:
+        return 20 * 1024 ** 3
+
+
+def cfg_search_refresh_seconds() -> float:
+    """Interval of the background search-index refresh; 0 = only when searched."""
+    try:
+        return max(0.0, float(CONFIG.get('search', {}).get('refresh_seconds', 300)))
+    except Exception:
+        return 300.0
+
+
+def cfg_media_proxy_height() -> int:
+    try:
+        v = int(CONFIG.get('media', {}).get('proxy_height', 480))
+        return max(64, min(2160, v - v % 2))
+    except Exception:
+        return 480
+
+
 def cfg_browser_required_filename_regex():
     pat = CONFIG.get('browser', {}).get(
         'required_filename_regex',
@@ -428,7 +506,12 @@ __all__ = [
     'CONFIG', 'load_config', '_config_path',
     'cfg_default_animals', 'cfg_default_fps', 'cfg_default_types', 'cfg_keyboard',
     'cfg_preview_thumbnails', 'cfg_browser_visible_extensions', 'cfg_browser_required_filename_regex',
+    'cfg_media_probe_concurrency',
     'cfg_importer_facilities', 'cfg_default_facility', 'cfg_importer_working_dir', 'cfg_importer_source_exts', 'cfg_importer_ignore_dir_regex', 'cfg_importer_health_tolerance_seconds',
+    'cfg_analyze_track_cache_mb', 'cfg_analyze_track_sidecar', 'cfg_analyze_batch_workers',
+    'cfg_media_proxy_quota_bytes', 'cfg_media_proxy_height', 'cfg_media_hls_quota_bytes',
+    'cfg_media_preview_tmp_quota_bytes',
+    'cfg_search_refresh_seconds',
     'inject_public_config',
 ]
 bp = Blueprint('config_api', __name__)
@@ -0,0 +1,349 @@
+"""Keyframe / frame-timestamp index for videos.
+
+A one-time demux pass (``ffprobe -show_entries packet``) records, for every
+video packet, its presentation timestamp, keyframe flag and byte offset.
+Sorted into presentation order this is the frame -> pts table, stored next
+to the video as ``<video>.frameindex.npz``.  Frame extraction uses it to map
+times to exact frame numbers and to decide between decoding forward and
+seeking to the previous keyframe.  Requests never scan in the handler:
+``request_index()`` queues the scan on a small background pool and callers
+report ``building`` until the sidecar exists.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request
+
+from .media import _ffprobe_exists
+from .pathguard import assert_within_allowed_roots
+
+bp = Blueprint('frameindex_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_INDEX_VERSION = 1
+_INDEX_SUFFIX = '.frameindex.npz'
+_INDEX_MEM_MAX = 16
+_INDEX_TIMEOUT = 2 * 3600.0
+_INDEX_BUILD_WORKERS = 2
+# A failed scan is not retried for the same file contents this soon
+_INDEX_RETRY_AFTER = 600.0
+# Constant-rate runs sent inline; more variable streams point at the binary table
+_TIMING_MAX_RUNS = 1024
+_TIMES_GZIP_LEVEL = 1
+
+_loaded: 'OrderedDict[str, FrameIndex]' = OrderedDict()
+_loaded_lock = threading.Lock()
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_guard = threading.Lock()
+_builder = ThreadPoolExecutor(max_workers=_INDEX_BUILD_WORKERS, thread_name_prefix='frameindex')
+_building: Dict[str, Future] = {}
+_failed: Dict[str, Tuple[float, Optional[List[int]]]] = {}  # path -> (time, video key)
+_building_lock = threading.Lock()
+
+
+class FrameIndex:
+    """Presentation-ordered frame table of one video stream."""
+
+    def __init__(self, pts: np.ndarray, key: np.ndarray, pos: np.ndarray, header: Dict[str, Any]):
+        self.pts = pts
+        self.key = key
+        self.pos = pos
+        self.header = header
+        num, den = header['time_base']
+        self.time_base = float(Fraction(int(num), int(den)))
+        start = int(header.get('start_pts') or (pts[0] if len(pts) else 0))
+        # Seconds from the first frame, as the browser's currentTime counts
+        self.times = (pts - start).astype(np.float64) * self.time_base
+        self.keyframes = np.flatnonzero(key)
+
+    @property
+    def frames(self) -> int:
+        return int(len(self.pts))
+
+    def frame_at(self, t: float) -> int:
+        """Index of the frame shown at time *t* (last frame starting at or before it)."""
+        if not self.frames:
+            return 0
+        i = int(np.searchsorted(self.times, float(t) + 1e-6, side='right')) - 1
+        return max(0, min(self.frames - 1, i))
+
+    def timing_runs(self, max_runs: int) -> Optional[List[List[int]]]:
+        """Frame durations as ``[[ticks, count], ...]`` runs, or None beyond *max_runs* runs."""
+        if self.frames < 2:
+            return []
+        deltas = np.diff(self.pts)
+        bounds = np.flatnonzero(deltas[1:] != deltas[:-1]) + 1
+        if len(bounds) + 1 > max_runs:
+            return None
+        starts = np.concatenate(([0], bounds))
+        counts = np.diff(np.concatenate((starts, [len(deltas)])))
+        return [[int(deltas[s]), int(n)] for s, n in zip(starts, counts)]
+
+    def keyframe_before(self, frame: int) -> int:
+        """Last keyframe at or before *frame* (0 if none)."""
+        if not len(self.keyframes):
+            return 0
+        i = int(np.searchsorted(self.keyframes, int(frame), side='right')) - 1
+        return int(self.keyframes[max(0, i)])
+
+
+def _index_path(video: Path) -> Path:
+    return video.with_name(video.name + _INDEX_SUFFIX)
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [int(st.st_mtime_ns), int(st.st_size)]
+
+
+def _int_or_none(value: str) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _scan_packets(video: Path) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, Tuple[int, int]]]:
+    """Demux the first video stream; returns (pts, key, pos, time_base) in decode order."""
+    if not _ffprobe_exists():
+        return None
+    try:
+        tb = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=time_base', '-of', 'csv=p=0', str(video)],
+            capture_output=True, text=True, timeout=30,
+        )
+        num, _, den = tb.stdout.strip().partition('/')
+        time_base = (int(num), int(den))
+    except Exception as e:
+        _log.warning("frameindex: could not read time base of %s: %s", video, e)
+        return None
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts,dts,pos,flags', '-of', 'compact=p=0', str(video),
+    ]
+    pts: List[int] = []
+    key: List[bool] = []
+    pos: List[int] = []
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        timer = threading.Timer(_INDEX_TIMEOUT, proc.kill)
+        timer.start()
+        try:
+            for line in proc.stdout:  # type: ignore[union-attr]
+                fields = dict(part.partition('=')[::2] for part in line.strip().split('|'))
+                ts = _int_or_none(fields.get('pts', ''))
+                if ts is None:
+                    ts = _int_or_none(fields.get('dts', ''))
+                if ts is None:
+                    continue
+                pts.append(ts)
+                key.append('K' in fields.get('flags', ''))
+                p = _int_or_none(fields.get('pos', ''))
+                pos.append(-1 if p is None else p)
+            rc = proc.wait()
+        finally:
+            timer.cancel()
+    except Exception as e:
+        _log.warning("frameindex: packet scan failed for %s: %s", video, e)
+        return None
+    if rc != 0 or not pts:
+        return None
+    return (
+        np.asarray(pts, dtype=np.int64),
+        np.asarray(key, dtype=bool),
+        np.asarray(pos, dtype=np.int64),
+        time_base,
+    )
+
+
+def build_index(video: Path) -> bool:
+    """Scan *video* and write its ``.frameindex.npz`` sidecar."""
+    key = _stat_key(video)
+    scanned = _scan_packets(video) if key is not None else None
+    if scanned is None:
+        return False
+    pts, keyflags, pos, time_base = scanned
+    order = np.argsort(pts, kind='stable')
+    pts, keyflags, pos = pts[order], keyflags[order], pos[order]
+    header = {
+        'version': _INDEX_VERSION,
+        'key': key,
+        'time_base': list(time_base),
+        'start_pts': int(pts[0]),
+        'frames': int(len(pts)),
+        'keyframes': int(keyflags.sum()),
+    }
+    out = _index_path(video)
+    tmp = out.with_name(out.name + '.tmp')
+    try:
+        with tmp.open('wb') as f:
+            np.savez_compressed(f, pts=pts, key=keyflags, pos=pos, header=np.array(json.dumps(header)))
+        os.replace(tmp, out)
+        return True
+    except Exception as e:
+        _log.warning("frameindex: could not write %s: %s", out, e)
+        try:
+            tmp.unlink(missing_ok=True)
+        except Exception:
+            pass
+        return False
+
+
+def _read_index(video: Path) -> Optional[FrameIndex]:
+    try:
+        with np.load(str(_index_path(video))) as data:
+            header = json.loads(str(data['header']))
+            if int(header.get('version') or 0) != _INDEX_VERSION or header.get('key') != _stat_key(video):
+                return None
+            return FrameIndex(data['pts'], data['key'], data['pos'], header)
+    except Exception:
+        return None
+
+
+def load_index(video: Path, build: bool = False) -> Optional[FrameIndex]:
+    """Return the frame index for *video*; with *build*, scan it first if missing or stale."""
+    name = str(video)
+    key = _stat_key(video)
+    with _loaded_lock:
+        idx = _loaded.get(name)
+        if idx is not None and idx.header.get('key') == key:
+            _loaded.move_to_end(name)
+            return idx
+    idx = _read_index(video)
+    if idx is None and build:
+        with _build_locks_guard:
+            lock = _build_locks.setdefault(name, threading.Lock())
+        with lock:
+            idx = _read_index(video)
+            if idx is None and build_index(video):
+                idx = _read_index(video)
+    if idx is not None:
+        with _loaded_lock:
+            _loaded[name] = idx
+            _loaded.move_to_end(name)
+            while len(_loaded) > _INDEX_MEM_MAX:
+                _loaded.popitem(last=False)
+    return idx
+
+
+def _build_in_background(video: Path) -> None:
+    try:
+        ok = load_index(video, build=True) is not None
+    except Exception as e:
+        _log.warning("frameindex: build failed for %s: %s", video, e)
+        ok = False
+    with _building_lock:
+        _building.pop(str(video), None)
+        if ok:
+            _failed.pop(str(video), None)
+        else:
+            _failed[str(video)] = (time.time(), _stat_key(video))
+
+
+def request_index(video: Path) -> Tuple[Optional[FrameIndex], str]:
+    """Return ``(index, 'ready')``, or ``(None, 'building' | 'failed')``.
+
+    A missing or stale index is scanned on the background pool; a scan that
+    failed for the video's current contents is retried after
+    ``_INDEX_RETRY_AFTER`` seconds.
+    """
+    idx = load_index(video)
+    if idx is not None:
+        return idx, 'ready'
+    name = str(video)
+    with _building_lock:
+        if name in _building:
+            return None, 'building'
+        failed = _failed.get(name)
+        if failed is not None and failed[1] == _stat_key(video) and time.time() - failed[0] < _INDEX_RETRY_AFTER:
+            return None, 'failed'
+        if not _ffprobe_exists():
+            return None, 'failed'
+        _building[name] = _builder.submit(_build_in_background, video)
+    return None, 'building'
+
+
+def _building_response() -> Response:
+    rv = jsonify({'ok': False, 'building': True})
+    rv.status_code = 202
+    rv.headers['Retry-After'] = '5'
+    return rv
+
+
+@bp.route('/api/media/index')
+def api_media_index():
+    """Keyframe table of a video, building the sidecar in the background on first use.
+
+    While the scan runs the answer is 202 with ``building`` and a
+    ``Retry-After`` header.  ``timing`` gives every frame's start time
+    compactly: frame ``i`` starts ``sum of the first i durations`` ticks of
+    ``time_base`` after frame 0, the durations being ``runs`` of
+    ``[ticks, count]``.  Streams with more than ``_TIMING_MAX_RUNS`` runs get
+    ``timing: null`` and the full table from ``/api/media/index/times``.
+    """
+    video = assert_within_allowed_roots(request.args.get('path', ''))
+    if not video.is_file():
+        return jsonify({'ok': False, 'error': 'File not found'}), 404
+    idx, state = request_index(video)
+    if state == 'building':
+        return _building_response()
+    if idx is None:
+        return jsonify({'ok': False, 'reason': 'index_failed'})
+    kf = idx.keyframes
+    runs = idx.timing_runs(_TIMING_MAX_RUNS)
+    return jsonify({
+        'ok': True,
+        'frames': idx.frames,
+        'time_base': idx.header['time_base'],
+        'duration': float(idx.times[-1]) if idx.frames else 0.0,
+        'keyframes': {
+            'frame': kf.tolist(),
+            'time': [round(float(t), 6) for t in idx.times[kf]],
+            'pos': idx.pos[kf].tolist(),
+        },
+        'timing': {'runs': runs} if runs is not None else None,
+    })
+
+
+@bp.route('/api/media/index/times')
+def api_media_index_times():
+    """Every frame's start time as raw little-endian float64 seconds, gzipped if accepted."""
+    video = assert_within_allowed_roots(request.args.get('path', ''))
+    if not video.is_file():
+        return jsonify({'ok': False, 'error': 'File not found'}), 404
+    idx, state = request_index(video)
+    if state == 'building':
+        return _building_response()
+    if idx is None:
+        return jsonify({'ok': False, 'reason': 'index_failed'}), 404
+    body = np.ascontiguousarray(idx.times, dtype='<f8').tobytes()
+    gzipped = request.accept_encodings['gzip'] > 0
+    if gzipped:
+        body = gzip.compress(body, compresslevel=_TIMES_GZIP_LEVEL)
+    rv = Response(body, mimetype='application/octet-stream')
+    rv.headers['X-Frames'] = str(idx.frames)
+    rv.headers['Vary'] = 'Accept-Encoding'
+    if gzipped:
+        rv.headers['Content-Encoding'] = 'gzip'
+    return rv
+
+
+__all__ = ['bp', 'FrameIndex', 'build_index', 'load_index', 'request_index']
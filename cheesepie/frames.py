@@ -0,0 +1,309 @@
+"""Random-access frame decoding for videos under the allowed roots.
+
+An LRU of open ``cv2.VideoCapture`` handles is kept per file so sequential
+or nearby requests continue decoding from where the previous one stopped
+(``grab()`` forward) instead of reopening and seeking; recently decoded
+frames are cached by (path, frame index).  When a ``.frameindex.npz``
+sidecar exists, times map to exact frame numbers and forward decoding is
+preferred whenever a seek would restart from the same keyframe.  Without
+OpenCV a single frame is extracted with ffmpeg instead.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request
+
+from .frameindex import load_index
+from .media import probe_media
+from .pathguard import assert_within_allowed_roots
+
+bp = Blueprint('frames_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_MAX_OPEN_DECODERS = 8
+_FRAME_CACHE_BYTES = 256 * 1024 * 1024
+# Decoding forward up to this many frames is cheaper than a keyframe seek
+_MAX_FORWARD_GRAB = 90
+_FFMPEG_TIMEOUT = 30.0
+_JPEG_QUALITY = 85
+
+
+def _cv2():
+    try:
+        import cv2  # type: ignore
+        return cv2
+    except Exception:
+        return None
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return int(st.st_mtime_ns), int(st.st_size)
+
+
+class _Decoder:
+    """One open capture; ``lock`` serialises seeks and reads on it."""
+
+    def __init__(self, cv2: Any, path: Path, key: Tuple[int, int]):
+        self.key = key
+        self.lock = threading.Lock()
+        self.cap = cv2.VideoCapture(str(path))
+        if not self.cap.isOpened():
+            raise IOError(f'cannot open {path}')
+        self.fps = float(self.cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        self.frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        # Index the next read() returns without seeking; None when unknown
+        self.next_index: Optional[int] = 0
+
+    def read(self, cv2: Any, index: int, keyframe: Optional[int] = None) -> Optional[np.ndarray]:
+        """Decode frame *index*; *keyframe* is the last keyframe at or before it, if known."""
+        nxt = self.next_index
+        if nxt is not None and keyframe is not None and keyframe <= nxt <= index:
+            # A seek would decode forward from the same keyframe anyway
+            forward = True
+        else:
+            forward = nxt is not None and 0 <= index - nxt <= _MAX_FORWARD_GRAB
+        if not forward:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        else:
+            for _ in range(index - self.next_index):
+                if not self.cap.grab():
+                    break
+        ok, frame = self.cap.read()
+        if not ok or frame is None:
+            self.next_index = None
+            return None
+        self.next_index = index + 1
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def release(self) -> None:
+        with self.lock:
+            try:
+                self.cap.release()
+            except Exception:
+                pass
+
+
+_decoders: 'OrderedDict[str, _Decoder]' = OrderedDict()
+_decoders_lock = threading.Lock()
+_frame_cache: 'OrderedDict[Tuple[str, Tuple[int, int], int], np.ndarray]' = OrderedDict()
+_frame_cache_bytes = 0
+_frame_cache_lock = threading.Lock()
+
+
+def _decoder_for(cv2: Any, path: Path, key: Tuple[int, int]) -> _Decoder:
+    name = str(path)
+    evicted = []
+    try:
+        with _decoders_lock:
+            dec = _decoders.get(name)
+            if dec is not None and dec.key != key:
+                evicted.append(_decoders.pop(name))
+                dec = None
+            if dec is not None:
+                _decoders.move_to_end(name)
+                return dec
+        # Opening may be slow (network storage); keep other files' requests moving
+        new = _Decoder(cv2, path, key)
+        with _decoders_lock:
+            dec = _decoders.get(name)
+            if dec is not None and dec.key == key:
+                # Another request opened it meanwhile
+                evicted.append(new)
+            else:
+                if dec is not None:
+                    evicted.append(dec)
+                dec = _decoders[name] = new
+            _decoders.move_to_end(name)
+            while len(_decoders) > _MAX_OPEN_DECODERS:
+                evicted.append(_decoders.popitem(last=False)[1])
+        return dec
+    finally:
+        for old in evicted:
+            old.release()
+
+
+def _cached_frame(cache_key: Tuple[str, Tuple[int, int], int]) -> Optional[np.ndarray]:
+    with _frame_cache_lock:
+        frame = _frame_cache.get(cache_key)
+        if frame is not None:
+            _frame_cache.move_to_end(cache_key)
+        return frame
+
+
+def _store_frame(cache_key: Tuple[str, Tuple[int, int], int], frame: np.ndarray) -> None:
+    global _frame_cache_bytes
+    if frame.nbytes > _FRAME_CACHE_BYTES // 4:
+        return
+    frame.setflags(write=False)
+    with _frame_cache_lock:
+        if cache_key in _frame_cache:
+            return
+        _frame_cache[cache_key] = frame
+        _frame_cache_bytes += frame.nbytes
+        while _frame_cache_bytes > _FRAME_CACHE_BYTES and _frame_cache:
+            _k, old = _frame_cache.popitem(last=False)
+            _frame_cache_bytes -= old.nbytes
+
+
+def _video_fps(path: Path) -> float:
+    meta = probe_media(path)
+    fps = ((meta.get('streams') or {}).get('video') or {}).get('fps')
+    return float(fps) if isinstance(fps, (int, float)) and fps > 0 else 0.0
+
+
+def _ffmpeg_frame(path: Path, t: float) -> Optional[np.ndarray]:
+    if shutil.which('ffmpeg') is None:
+        return None
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-ss', f'{max(0.0, t):.3f}', '-i', str(path),
+        '-frames:v', '1', '-f', 'image2pipe', '-c:v', 'png', '-',
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, timeout=_FFMPEG_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return None
+    if proc.returncode != 0 or not proc.stdout:
+        return None
+    from PIL import Image  # type: ignore
+    try:
+        return np.asarray(Image.open(io.BytesIO(proc.stdout)).convert('RGB'))
+    except Exception:
+        return None
+
+
+def read_frame(
+    path: Path, t: Optional[float] = None, index: Optional[int] = None,
+) -> Optional[Tuple[np.ndarray, int, float]]:
+    """Decode one frame as read-only (height, width, 3) RGB.
+
+    Give either a time in seconds (*t*) or a frame *index*.  Returns
+    ``(rgb, frame_index, fps)`` or None when the frame cannot be decoded.
+    """
+    key = _stat_key(path)
+    if key is None:
+        return None
+    cv2 = _cv2()
+    dec: Optional[_Decoder] = None
+    if cv2 is not None:
+        try:
+            dec = _decoder_for(cv2, path, key)
+        except Exception as e:
+            _log.warning("frames: %s", e)
+    fps = dec.fps if dec is not None and dec.fps > 0 else _video_fps(path)
+    fidx = load_index(path)
+    if index is None:
+        if fidx is not None:
+            index = fidx.frame_at(max(0.0, float(t or 0.0)))
+        elif not fps:
+            return None
+        else:
+            index = int(round(max(0.0, float(t or 0.0)) * fps))
+    index = max(0, int(index))
+    if fidx is not None and fidx.frames > 0:
+        index = min(index, fidx.frames - 1)
+    elif dec is not None and dec.frames > 0:
+        index = min(index, dec.frames - 1)
+    cache_key = (str(path), key, index)
+    frame = _cached_frame(cache_key)
+    if frame is not None:
+        return frame, index, fps
+    if dec is not None:
+        keyframe = fidx.keyframe_before(index) if fidx is not None else None
+        with dec.lock:
+            frame = dec.read(cv2, index, keyframe)
+    elif fps:
+        frame = _ffmpeg_frame(path, index / fps)
+    if frame is None:
+        return None
+    frame = np.ascontiguousarray(frame)
+    _store_frame(cache_key, frame)
+    return frame, index, fps
+
+
+def _scaled(frame: np.ndarray, scale: float) -> np.ndarray:
+    if scale >= 1.0:
+        return frame
+    h, w = frame.shape[:2]
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    cv2 = _cv2()
+    if cv2 is not None:
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    from PIL import Image  # type: ignore
+    return np.asarray(Image.fromarray(frame).resize(size, Image.BILINEAR))
+
+
+def _encode(frame: np.ndarray, fmt: str) -> bytes:
+    cv2 = _cv2()
+    if cv2 is not None:
+        bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if fmt == 'png':
+            ok, buf = cv2.imencode('.png', bgr)
+        else:
+            ok, buf = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, _JPEG_QUALITY])
+        if ok:
+            return buf.tobytes()
+    from PIL import Image  # type: ignore
+    out = io.BytesIO()
+    if fmt == 'png':
+        Image.fromarray(frame).save(out, format='PNG')
+    else:
+        Image.fromarray(frame).save(out, format='JPEG', quality=_JPEG_QUALITY)
+    return out.getvalue()
+
+
+@bp.route('/api/media/frame')
+def api_media_frame():
+    """One decoded frame as JPEG (default), PNG or raw RGB24 (``format=raw``)."""
+    path = assert_within_allowed_roots(request.args.get('path', ''))
+    if not path.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        t = float(request.args['t']) if request.args.get('t') not in (None, '') else None
+        index = int(request.args['frame']) if request.args.get('frame') not in (None, '') else None
+        scale = float(request.args.get('scale') or 1.0)
+    except ValueError:
+        return jsonify({'error': 'Invalid t/frame/scale'}), 400
+    if t is None and index is None:
+        return jsonify({'error': 'Provide t or frame'}), 400
+    if not 0.0 < scale <= 1.0:
+        return jsonify({'error': 'scale must be in (0, 1]'}), 400
+    fmt = (request.args.get('format') or 'jpeg').strip().lower()
+    if fmt not in ('jpeg', 'jpg', 'png', 'raw'):
+        return jsonify({'error': 'format must be jpeg, png or raw'}), 400
+
+    result = read_frame(path, t=t, index=index)
+    if result is None:
+        return jsonify({'error': 'Frame could not be decoded'}), 422
+    frame, index, fps = result
+    frame = _scaled(frame, scale)
+    h, w = frame.shape[:2]
+    if fmt == 'raw':
+        rv = Response(np.ascontiguousarray(frame).tobytes(), mimetype='application/octet-stream')
+    else:
+        body = _encode(frame, 'png' if fmt == 'png' else 'jpeg')
+        rv = Response(body, mimetype='image/png' if fmt == 'png' else 'image/jpeg')
+    rv.headers['X-Frame-Index'] = str(index)
+    if fps:
+        rv.headers['X-Frame-Time'] = f'{index / fps:.6f}'
+    rv.headers['X-Frame-Width'] = str(w)
+    rv.headers['X-Frame-Height'] = str(h)
+    rv.headers['Cache-Control'] = 'private, max-age=300'
+    return rv
+
+
+__all__ = ['bp', 'read_frame']
@@ -0,0 +1,292 @@
+"""Occupancy heatmaps over the preproc arena bbox.
+
+Positions are binned once into per-block partial histograms
+(``_HEAT_BLOCK_FRAMES`` frames x mice x ``_HEAT_GRID``² cells) stored next
+to the track as ``.track.heat.npy`` + ``.track.heat.json``.  A time range is
+answered by summing the whole blocks it covers and re-binning only the
+frames of the (at most two) partial blocks at its edges.
+"""
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request
+
+from .analyze import _open_track, _sidecar_base, _track_load_lock, _track_path_for_video
+from .metrics import (
+    ArenaGeometry,
+    _TrackBlocks,
+    _preproc_path_for,
+    _read_json,
+    _stat_key,
+    _video_format,
+    arena_geometry,
+)
+from .pathguard import assert_within_allowed_roots
+
+bp = Blueprint('heatmap_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_HEAT_VERSION = 1
+_HEAT_BLOCK_FRAMES = 10000
+# Base resolution; requested bin counts are snapped to one of its divisors
+_HEAT_GRID = 60
+_HEAT_PNG_MAX_SIDE = 512
+# Colour ramp anchors for rendered heatmaps (dark -> bright)
+_HEAT_RAMP = np.array([
+    [0, 0, 4],
+    [87, 16, 110],
+    [188, 55, 84],
+    [249, 142, 9],
+    [252, 255, 164],
+], dtype=np.float64)
+
+
+def _heat_paths(mat_path: Path) -> Tuple[Path, Path]:
+    base = _sidecar_base(mat_path)
+    return mat_path.with_name(base + '.track.heat.npy'), mat_path.with_name(base + '.track.heat.json')
+
+
+def _bin_positions(x: np.ndarray, y: np.ndarray, bbox: Dict[str, float], grid: int) -> np.ndarray:
+    """Histogram (mice, frames) pixel positions into (mice, grid, grid)."""
+    mice = x.shape[0]
+    with np.errstate(invalid='ignore'):
+        col = np.floor((x - bbox['x']) * grid / bbox['width'])
+        row = np.floor((y - bbox['y']) * grid / bbox['height'])
+    inside = (row >= 0) & (row < grid) & (col >= 0) & (col < grid)
+    mouse_idx = np.broadcast_to(np.arange(mice)[:, None], inside.shape)[inside]
+    codes = (mouse_idx * (grid * grid) + row[inside] * grid + col[inside]).astype(np.int64)
+    return np.bincount(codes, minlength=mice * grid * grid).reshape(mice, grid, grid)
+
+
+def _bbox_dict(geom: ArenaGeometry) -> Dict[str, float]:
+    return {'x': geom.x, 'y': geom.y, 'width': geom.width, 'height': geom.height}
+
+
+def build_heat_blocks(video: Path) -> bool:
+    """Write the per-block partial histograms for *video*'s track."""
+    mat = _track_path_for_video(video)
+    track_key = _stat_key(mat)
+    src = _open_track(mat)
+    if src is None or track_key is None:
+        return False
+    preproc_path = _preproc_path_for(video)
+    preproc = _read_json(preproc_path)
+    geom = arena_geometry(preproc)
+    if geom is None:
+        return False
+    _fps, vid_w, vid_h = _video_format(video, preproc)
+    bbox = _bbox_dict(geom)
+    mice, frames = int(src.mice), int(src.frames)
+    nblocks = (frames + _HEAT_BLOCK_FRAMES - 1) // _HEAT_BLOCK_FRAMES
+
+    npy_path, header_path = _heat_paths(mat)
+    tmp_npy = npy_path.with_name(npy_path.name + '.tmp')
+    tmp_header = header_path.with_name(header_path.name + '.tmp')
+    try:
+        out = np.lib.format.open_memmap(
+            str(tmp_npy), mode='w+', dtype='<u2', shape=(nblocks, mice, _HEAT_GRID, _HEAT_GRID),
+        )
+        blocks = _TrackBlocks(src, vid_w, vid_h, _HEAT_BLOCK_FRAMES)
+        for start, x, y in blocks:
+            out[start // _HEAT_BLOCK_FRAMES] = _bin_positions(x, y, bbox, _HEAT_GRID)
+        out.flush()
+        del out
+        os.replace(tmp_npy, npy_path)
+        header = {
+            'version': _HEAT_VERSION,
+            'key': {'track': track_key, 'preproc': _stat_key(preproc_path)},
+            'block_frames': _HEAT_BLOCK_FRAMES,
+            'grid': _HEAT_GRID,
+            'bbox': bbox,
+            'normalized': bool(blocks.normalized),
+            'video_size': [vid_w, vid_h],
+            'mice': mice,
+            'frames': frames,
+            'colors': list(getattr(src, 'colors', None) or []),
+        }
+        tmp_header.write_text(json.dumps(header, indent=2), encoding='utf-8')
+        os.replace(tmp_header, header_path)
+        return True
+    except Exception as e:
+        _log.warning("heatmap: could not write partial histograms for %s: %s", mat, e)
+        for tmp in (tmp_npy, tmp_header):
+            try:
+                tmp.unlink(missing_ok=True)
+            except Exception:
+                pass
+        return False
+
+
+def _heat_is_current(header: Dict[str, Any], video: Path, mat: Path) -> bool:
+    return (
+        int(header.get('version') or 0) == _HEAT_VERSION
+        and int(header.get('block_frames') or 0) == _HEAT_BLOCK_FRAMES
+        and int(header.get('grid') or 0) == _HEAT_GRID
+        and header.get('key') == {'track': _stat_key(mat), 'preproc': _stat_key(_preproc_path_for(video))}
+    )
+
+
+def _open_heat_blocks(video: Path) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+    """Return the memory-mapped partial histograms and header, building if stale."""
+    mat = _track_path_for_video(video)
+    npy_path, header_path = _heat_paths(mat)
+    header = _read_json(header_path)
+    if not _heat_is_current(header, video, mat) or not npy_path.is_file():
+        with _track_load_lock(mat, 'heatmap'):
+            header = _read_json(header_path)
+            if not _heat_is_current(header, video, mat) or not npy_path.is_file():
+                if not build_heat_blocks(video):
+                    return None
+                header = _read_json(header_path)
+    try:
+        return np.load(str(npy_path), mmap_mode='r'), header
+    except Exception as e:
+        _log.warning("heatmap: could not map %s: %s", npy_path, e)
+        return None
+
+
+def _snap_bins(bins: int) -> int:
+    """Largest divisor of the base grid that does not exceed *bins*."""
+    bins = max(1, min(_HEAT_GRID, int(bins)))
+    while _HEAT_GRID % bins:
+        bins -= 1
+    return bins
+
+
+def occupancy(
+    video: Path, start: int, end: int, mice: Optional[Tuple[int, ...]] = None, bins: int = _HEAT_GRID,
+) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+    """Return a (bins, bins) frame-count histogram over [start, end)."""
+    opened = _open_heat_blocks(video)
+    if opened is None:
+        return None
+    blocks, header = opened
+    frames = int(header.get('frames') or 0)
+    start = max(0, min(int(start), frames))
+    end = max(start, min(int(end), frames))
+    sel = list(mice) if mice else list(range(blocks.shape[1]))
+    first_full = -(-start // _HEAT_BLOCK_FRAMES)
+    last_full = end // _HEAT_BLOCK_FRAMES
+    hist = np.zeros((_HEAT_GRID, _HEAT_GRID), dtype=np.int64)
+    if first_full < last_full:
+        hist += blocks[first_full:last_full][:, sel].sum(axis=(0, 1), dtype=np.int64)
+        edges = [(start, first_full * _HEAT_BLOCK_FRAMES), (last_full * _HEAT_BLOCK_FRAMES, end)]
+    else:
+        edges = [(start, end)]
+    edges = [(a, b) for a, b in edges if b > a]
+    if edges:
+        src = _open_track(_track_path_for_video(video))
+        if src is None:
+            return None
+        vid_w, vid_h = header.get('video_size') or [None, None]
+        for a, b in edges:
+            xs, ys = src.read(a, b)
+            x = np.asarray(xs, dtype=np.float64)[sel]
+            y = np.asarray(ys, dtype=np.float64)[sel]
+            if header.get('normalized'):
+                x = x * float(vid_w)
+                y = y * float(vid_h)
+            hist += _bin_positions(x, y, header['bbox'], _HEAT_GRID).sum(axis=0)
+    bins = _snap_bins(bins)
+    f = _HEAT_GRID // bins
+    hist = hist.reshape(bins, f, bins, f).sum(axis=(1, 3))
+    info = {
+        'start': start,
+        'end': end,
+        'frames': frames,
+        'bins': bins,
+        'bbox': header.get('bbox'),
+        'mice': sel,
+        'colors': header.get('colors') or [],
+    }
+    return hist, info
+
+
+def _render_png(hist: np.ndarray, bbox: Dict[str, float]) -> bytes:
+    from PIL import Image  # type: ignore
+
+    v = np.log1p(hist.astype(np.float64))
+    peak = float(v.max())
+    if peak > 0:
+        v /= peak
+    pos = v * (len(_HEAT_RAMP) - 1)
+    lo = np.clip(np.floor(pos).astype(np.int64), 0, len(_HEAT_RAMP) - 2)
+    t = (pos - lo)[..., None]
+    rgb = (_HEAT_RAMP[lo] * (1 - t) + _HEAT_RAMP[lo + 1] * t).astype(np.uint8)
+    img = Image.fromarray(rgb, mode='RGB')
+    scale = _HEAT_PNG_MAX_SIDE / max(bbox['width'], bbox['height'])
+    size = (max(1, int(round(bbox['width'] * scale))), max(1, int(round(bbox['height'] * scale))))
+    img = img.resize(size, Image.NEAREST)
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _mouse_selection(raw: str, colors: Any) -> Optional[Tuple[int, ...]]:
+    """Parse ``mouse=`` (indices or color letters, comma-separated)."""
+    out = []
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if part.isdigit():
+            out.append(int(part))
+        else:
+            names = [str(c).lower() for c in (colors or [])]
+            if part.lower() not in names:
+                raise ValueError(part)
+            out.append(names.index(part.lower()))
+    return tuple(out) or None
+
+
+@bp.route('/api/analyze/heatmap')
+def api_analyze_heatmap():
+    video = assert_within_allowed_roots((request.args.get('video') or '').strip())
+    mat = _track_path_for_video(video)
+    if not mat.exists():
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_file'})
+    if arena_geometry(_read_json(_preproc_path_for(video))) is None:
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_arena'})
+    src = _open_track(mat)
+    if src is None:
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_data'})
+    try:
+        mice = _mouse_selection(request.args.get('mouse') or '', src.colors)
+        if mice and max(mice) >= src.mice:
+            raise ValueError(max(mice))
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': f'unknown mouse: {e}'}), 400
+    try:
+        start = int(request.args.get('start') or 0)
+        end = int(request.args.get('end') or src.frames)
+        bins = int(request.args.get('bins') or _HEAT_GRID)
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'invalid start/end/bins'}), 400
+    result = occupancy(video, start, end, mice, bins)
+    if result is None:
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_data'})
+    hist, info = result
+    if (request.args.get('format') or '').strip().lower() == 'png':
+        try:
+            body = _render_png(hist, info['bbox'])
+        except Exception as e:
+            return jsonify({'ok': False, 'error': f'render failed: {e}'}), 500
+        return Response(body, mimetype='image/png', headers={'Cache-Control': 'no-cache'})
+    return jsonify({
+        'ok': True,
+        **info,
+        'total': int(hist.sum()),
+        'max': int(hist.max()) if hist.size else 0,
+        'counts': hist.tolist(),
+    })
+
+
+__all__ = ['bp', 'build_heat_blocks', 'occupancy']
@@ -29,7 +29,7 @@ from .config import (
     cfg_importer_ignore_dir_regex,
     cfg_importer_health_tolerance_seconds,
 )
-from .media import probe_media
+from .media import probe_many, probe_media
 from .tasks import (
     TaskContext,
     cancel_task as cancel_task_record,
@@ -254,8 +254,9 @@ def _iter_files_for_camera(source_dir: Path, cam_idx: int, exts: List[str], came
     return res
 
 
-def _file_time_range(path: Path) -> Optional[tuple[datetime, datetime]]:
-    meta = probe_media(path)
+def _file_time_range(path: Path, meta: Optional[Dict[str, Any]] = None) -> Optional[tuple[datetime, datetime]]:
+    if meta is None:
+        meta = probe_media(path)
     if not meta.get('available') or meta.get('error'):
         return None
     dur = meta.get('duration')
@@ -1571,8 +1572,11 @@ def api_scan_prepare_current():
         return None
 
 
-def _file_time_range_with_regex(path: Path, regex: str) -> Optional[tuple[datetime, datetime]]:
-    meta = probe_media(path)
+def _file_time_range_with_regex(
+    path: Path, regex: str, meta: Optional[Dict[str, Any]] = None,
+) -> Optional[tuple[datetime, datetime]]:
+    if meta is None:
+        meta = probe_media(path)
     if not meta.get('available') or meta.get('error'):
         return None
     dur = meta.get('duration')
@@ -1739,11 +1743,18 @@ def api_import_start():
             'output_dir': str(work_base),
             'used_batches': used_batches,
         }), 409
+    cam_files = {
+        cam: _iter_files_for_camera(source_dir, cam, exts, camera_pattern_override or fac.get('camera_pattern', ''))
+        for cam in cams
+    }
+    # Probe every source up front on the shared worker pool
+    metas = dict(probe_many([f for files in cam_files.values() for f in files]))
     for cam in cams:
-        files = _iter_files_for_camera(source_dir, cam, exts, camera_pattern_override or fac.get('camera_pattern', ''))
+        files = cam_files[cam]
         timeline: List[Dict[str, Any]] = []
         for f in files:
-            tr = _file_time_range_with_regex(f, ptre) or _file_time_range(f)
+            meta = metas.get(f)
+            tr = _file_time_range_with_regex(f, ptre, meta) or _file_time_range(f, meta)
             if not tr:
                 continue
             timeline.append({'path': f, 'start': tr[0], 'end': tr[1]})
@@ -2377,6 +2388,7 @@ def api_import_prepare_days():
             if not (root.exists() and root.is_dir()):
                 out.append({'camera': cam, 'days': [], 'warning': f'Camera root not found: {root}'})
                 continue
+            starts: Dict[Path, datetime] = {}
             for cur, dirnames, filenames in os.walk(root):
                 if ig_re:
                     dirnames[:] = [d for d in dirnames if not ig_re.search(d)]
@@ -2387,12 +2399,13 @@ def api_import_prepare_days():
                     ts = _parse_start_from_stem(p.stem) or _parse_time_from_path(p, str(fac.get('path_time_regex') or ''))
                     if not ts:
                         continue
-                    meta = probe_media(p)
-                    dur = meta.get('duration') if isinstance(meta, dict) else None
-                    if not isinstance(dur, (int, float)) or dur <= 0:
-                        dur = max_dur_sec
-                    start_dt = ts
-                    segments.append({'path': p, 'start': start_dt, 'end': start_dt + timedelta(seconds=float(dur))})
+                    starts[p] = ts
+            for p, meta in probe_many(list(starts)):
+                dur = meta.get('duration') if isinstance(meta, dict) else None
+                if not isinstance(dur, (int, float)) or dur <= 0:
+                    dur = max_dur_sec
+                start_dt = starts[p]
+                segments.append({'path': p, 'start': start_dt, 'end': start_dt + timedelta(seconds=float(dur))})
         except Exception:
             pass
 
@@ -2547,6 +2560,7 @@ def api_import_scan_full_stream():
                 if ig_re:
                     dirnames[:] = [d for d in dirnames if not ig_re.search(d)]
                 # list files
+                entries: List[Dict[str, Any]] = []
                 for fn in filenames:
                     if Path(fn).suffix.lower() in exts:
                         fp = os.path.join(cur, fn)
@@ -2561,7 +2575,7 @@ def api_import_scan_full_stream():
                         day_idx = None
                         start_iso = None
                         start_hms = None
-                        end_hms = None
+                        ts = None
                         try:
                             ts_name = _parse_start_from_stem(Path(fp).stem)
                             ts = ts_name or (_parse_time_from_path(Path(fp), ptre) if rx else None)
@@ -2581,29 +2595,45 @@ def api_import_scan_full_stream():
                             in_range = False
                             day_idx = None
                         total += 1
-                        # If file is in range, try to get actual duration to compute end time
-                        if in_range:
-                            try:
-                                meta = probe_media(Path(fp))
-                                dur = meta.get('duration') if isinstance(meta, dict) else None
-                                if isinstance(dur, (int, float)) and start_hms:
-                                    # recompute precise end_hms based on parsed start
-                                    ts2 = ts_name or (_parse_time_from_path(Path(fp), ptre) if rx else None)
-                                    if ts2:
-                                        end_iso_dt = ts2 + timedelta(seconds=float(dur))
-                                        end_hms = f"{end_iso_dt.strftime('%H:%M:%S')}.{int(end_iso_dt.microsecond/1000):03d}"
-                            except Exception:
-                                pass
-                        yield _sse_event('file', {
-                            'camera': cam,
-                            'path': fp,
-                            'match_regex': mr,
-                            'in_range': in_range,
-                            'day': day_idx,
-                            'start': start_iso,
-                            'start_hms': start_hms,
-                            'end_hms': end_hms,
+                        entries.append({
+                            'ts': ts,
+                            'event': {
+                                'camera': cam,
+                                'path': fp,
+                                'match_regex': mr,
+                                'in_range': in_range,
+                                'day': day_idx,
+                                'start': start_iso,
+                                'start_hms': start_hms,
+                                'end_hms': None,
+                            },
                         })
+                # Files outside the window go out at once; in-range files are probed
+                # together for their actual end time and sent as each probe completes
+                pending: Dict[str, Dict[str, Any]] = {}
+                for e in entries:
+                    if e['event']['in_range'] and e['ts']:
+                        pending[e['event']['path']] = e
+                    else:
+                        yield _sse_event('file', e['event'])
+                probes = probe_many([Path(fp) for fp in pending])
+                try:
+                    for p, meta in probes:
+                        e = pending.pop(str(p), None)
+                        if e is None:
+                            continue
+                        dur = meta.get('duration') if isinstance(meta, dict) else None
+                        if isinstance(dur, (int, float)):
+                            end_iso_dt = e['ts'] + timedelta(seconds=float(dur))
+                            e['event']['end_hms'] = f"{end_iso_dt.strftime('%H:%M:%S')}.{int(end_iso_dt.microsecond/1000):03d}"
+                        yield _sse_event('file', e['event'])
+                except Exception as exc:
+                    _log.warning("scan_full_stream: probing %s failed: %s", cur, exc)
+                finally:
+                    probes.close()
+                # Whatever the probes did not return is sent without an end time
+                for e in pending.values():
+                    yield _sse_event('file', e['event'])
         yield _sse_event('done', {'ok': True, 'total': total})
 
     return Response(stream_with_context(walker()), mimetype='text/event-stream')
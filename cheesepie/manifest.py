@@ -0,0 +1,243 @@
+"""Per-directory manifest of pipeline artifacts.
+
+For every video in a directory the manifest records which sidecars exist
+(preproc, annotations, ``.obj.mat`` track, tracking ``.log``, frame index)
+with their size and mtime.  It is derived from the browser's single
+``os.scandir`` pass, so no per-file ``exists()`` probes are needed, and is
+persisted under ``working/manifests/`` keyed by the directory path.  A
+manifest is rebuilt only when the directory's mtime changes, so status
+views over many directories cost one stat and one small read per
+directory.  Appending to a log does not touch the directory, so the logs of
+possibly running tracks (no track yet, or written within
+``_MANIFEST_LIVE_LOG_SECONDS``) are re-stated individually on each read.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from flask import Blueprint, jsonify, request
+
+from .config import cfg_browser_visible_extensions, cfg_importer_facilities
+
+bp = Blueprint('manifest_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_MANIFEST_VERSION = 1
+_MANIFEST_DIR = Path(__file__).resolve().parent.parent / 'working' / 'manifests'
+# Logs written this recently may still be growing
+_MANIFEST_LIVE_LOG_SECONDS = 3600.0
+_MANIFEST_MEM_MAX = 256
+_MANIFEST_WALK_MAX = 5000
+
+# Artifact kind -> sidecar name patterns, first match wins
+ARTIFACTS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('preproc', ('{name}.preproc.json', '{stem}.preproc.json')),
+    ('annotations', ('{stem}.json',)),
+    ('track', ('{name}.obj.mat',)),
+    ('log', ('{name}.log',)),
+    ('frameindex', ('{name}.frameindex.npz',)),
+)
+
+_mem: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_mem_lock = threading.Lock()
+
+
+def video_artifacts(name: str, stats: Mapping[str, Tuple[int, float]]) -> Dict[str, List[Any]]:
+    """Artifacts of file *name* as ``{kind: [size, mtime]}``, given ``stats`` of its directory."""
+    stem = os.path.splitext(name)[0]
+    out: Dict[str, List[Any]] = {}
+    for kind, patterns in ARTIFACTS:
+        for pattern in patterns:
+            st = stats.get(pattern.format(name=name, stem=stem))
+            if st is not None:
+                out[kind] = [st[0], st[1]]
+                break
+    return out
+
+
+def _manifest_path(directory: str) -> Path:
+    digest = hashlib.sha1(directory.encode('utf-8')).hexdigest()
+    return _MANIFEST_DIR / digest[:2] / f'{digest}.json'
+
+
+def _fresh(manifest: Optional[Dict[str, Any]], mtime_ns: int) -> bool:
+    return (
+        manifest is not None
+        and int(manifest.get('version') or 0) == _MANIFEST_VERSION
+        and manifest.get('mtime_ns') == mtime_ns
+    )
+
+
+def _remember(key: str, manifest: Dict[str, Any]) -> None:
+    with _mem_lock:
+        _mem[key] = manifest
+        _mem.move_to_end(key)
+        while len(_mem) > _MANIFEST_MEM_MAX:
+            _mem.popitem(last=False)
+
+
+def _refresh_live_logs(directory: Path, manifest: Dict[str, Any]) -> bool:
+    """Re-stat the logs of possibly running tracks in place; True if any changed."""
+    changed = False
+    now = time.time()
+    for name, (_size, _mtime, artifacts) in manifest['videos'].items():
+        log = artifacts.get('log')
+        if log is None or ('track' in artifacts and now - float(log[1]) > _MANIFEST_LIVE_LOG_SECONDS):
+            continue
+        try:
+            st = os.stat(directory / f'{name}.log')
+        except OSError:
+            # Removing it changes the directory mtime, which rebuilds the manifest
+            continue
+        if [st.st_size, st.st_mtime] != log:
+            artifacts['log'] = [st.st_size, st.st_mtime]
+            changed = True
+    return changed
+
+
+def _dumps(manifest: Dict[str, Any]) -> str:
+    return json.dumps(manifest, separators=(',', ':'))
+
+
+def _write(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + '.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, path)
+    except Exception as e:
+        _log.warning("manifest: could not write %s: %s", path, e)
+        try:
+            tmp.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+
+def _build(directory: Path) -> Optional[Dict[str, Any]]:
+    from .browser import _dir_listing
+
+    listing = _dir_listing(directory)
+    if listing is None:
+        return None
+    exts = set(cfg_browser_visible_extensions())
+    videos: Dict[str, List[Any]] = {}
+    dirs: List[str] = []
+    for entry in listing.entries:
+        if entry['is_dir']:
+            dirs.append(entry['path'])
+        elif entry['ext'] in exts:
+            videos[entry['name']] = [entry['size'], entry['modified'], dict(entry.get('artifacts') or {})]
+    return {
+        'version': _MANIFEST_VERSION,
+        'dir': str(directory),
+        'mtime_ns': listing.mtime_ns,
+        # The listing may come from the browser's cache; date it to its scan
+        'scanned_at': time.time() - (time.monotonic() - listing.scanned_at),
+        'dirs': dirs,
+        'videos': videos,
+    }
+
+
+def dir_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    """Current manifest of *directory*, rebuilt and persisted when stale.
+
+    ``videos`` maps each visible video name to ``[size, mtime, artifacts]``
+    and ``dirs`` lists the subdirectory paths.  Returns None when the
+    directory cannot be listed.
+    """
+    key = str(directory)
+    try:
+        mtime_ns = os.stat(key).st_mtime_ns
+    except OSError:
+        return None
+    path = _manifest_path(key)
+    with _mem_lock:
+        manifest = _mem.get(key)
+    if not _fresh(manifest, mtime_ns):
+        try:
+            manifest = json.loads(path.read_text(encoding='utf-8'))
+        except Exception:
+            manifest = None
+        if not (_fresh(manifest, mtime_ns) and manifest.get('dir') == key):
+            manifest = None
+    if manifest is not None:
+        with _mem_lock:
+            text = _dumps(manifest) if _refresh_live_logs(directory, manifest) else None
+        if text is not None:
+            _write(path, text)
+        _remember(key, manifest)
+        return manifest
+
+    manifest = _build(directory)
+    if manifest is None:
+        return None
+    _write(path, _dumps(manifest))
+    _remember(key, manifest)
+    return manifest
+
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+@bp.route('/api/manifest')
+def api_manifest():
+    """Pipeline status of a directory (``recursive=1`` for its whole subtree).
+
+    Returns one entry per directory with its videos' artifacts and
+    ``totals`` counting videos per artifact kind.
+    """
+    facility = (request.args.get('facility') or '').strip().lower()
+    facs = cfg_importer_facilities()
+    if not facility or facility not in facs:
+        return jsonify({'error': 'Invalid or missing facility'}), 400
+    base = Path(facs[facility].get('output_dir') or '').expanduser().resolve()
+    directory = (request.args.get('dir') or '').strip()
+    root = Path(directory).expanduser().resolve() if directory else base
+    try:
+        root.relative_to(base)
+    except Exception:
+        return jsonify({'error': 'Path outside facility scope'}), 403
+    recursive = (request.args.get('recursive') or '').strip().lower() in ('1', 'true', 'yes')
+
+    totals: Dict[str, int] = {'dirs': 0, 'videos': 0, **{kind: 0 for kind, _p in ARTIFACTS}}
+    out: List[Dict[str, Any]] = []
+    seen: set[str] = set()
+    stack = [str(root)]
+    truncated = False
+    while stack:
+        if len(out) >= _MANIFEST_WALK_MAX:
+            truncated = True
+            break
+        d = stack.pop()
+        if d in seen:
+            continue
+        seen.add(d)
+        manifest = dir_manifest(Path(d))
+        if manifest is None:
+            continue
+        videos = manifest['videos']
+        out.append({'dir': d, 'scanned_at': manifest['scanned_at'], 'videos': videos})
+        totals['dirs'] += 1
+        totals['videos'] += len(videos)
+        for _size, _mtime, artifacts in videos.values():
+            for kind in artifacts:
+                totals[kind] = totals.get(kind, 0) + 1
+        if recursive:
+            stack.extend(
+                sub for sub in reversed(manifest['dirs'])
+                if _within(sub, str(base)) and sub not in seen
+            )
+    return jsonify({'ok': True, 'dirs': out, 'totals': totals, 'truncated': truncated})
+
+
+__all__ = ['bp', 'ARTIFACTS', 'dir_manifest', 'video_artifacts']
@@ -1,23 +1,55 @@
 from __future__ import annotations
 
+import copy
 import json
+import logging
+import math
 import mimetypes
+import os
+import re
+import shutil
+import sqlite3
 import subprocess
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
-from flask import Blueprint, jsonify, request, Response, send_file
+from flask import Blueprint, jsonify, redirect, request, Response, send_file
+from werkzeug.http import parse_date
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
 
+from .config import (
+    cfg_browser_visible_extensions,
+    cfg_media_hls_quota_bytes,
+    cfg_media_preview_tmp_quota_bytes,
+    cfg_media_probe_concurrency,
+)
 from .pathguard import assert_within_allowed_roots, get_app_tmp_root
+from .tasks import TaskContext, enqueue_task, register_task_resumer, update_task
 
 
 bp = Blueprint('media_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_FFPROBE_RECHECK_SECONDS = 60.0
+_ffprobe_state: Dict[str, Any] = {'path': None, 'checked': None}
 
 
 def _ffprobe_exists() -> bool:
-    return subprocess.run(['which', 'ffprobe'], capture_output=True).returncode == 0
+    # Resolved in-process; a missing binary is looked up again after a while
+    now = time.monotonic()
+    checked = _ffprobe_state['checked']
+    if _ffprobe_state['path'] is None and (checked is None or now - checked >= _FFPROBE_RECHECK_SECONDS):
+        _ffprobe_state['path'] = shutil.which('ffprobe')
+        _ffprobe_state['checked'] = now
+    return _ffprobe_state['path'] is not None
 
 
 def _parse_fraction(fr: Optional[str]) -> Optional[float]:
@@ -34,7 +66,10 @@ def _parse_fraction(fr: Optional[str]) -> Optional[float]:
         return None
 
 
-def probe_media(path: Path) -> Dict[str, Any]:
+_PROBE_TIMEOUT_SECONDS = 10.0
+
+
+def _probe_media_uncached(path: Path, timeout: float = _PROBE_TIMEOUT_SECONDS) -> Dict[str, Any]:
     if not _ffprobe_exists():
         return {"available": False, "error": "ffprobe not found"}
     if not path.exists() or not path.is_file():
@@ -44,7 +79,7 @@ def probe_media(path: Path) -> Dict[str, Any]:
         '-show_format', '-show_streams', str(path)
     ]
     try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
         if proc.returncode != 0:
             return {"available": True, "error": proc.stderr.strip() or 'ffprobe failed'}
         data = json.loads(proc.stdout or '{}')
@@ -107,6 +142,314 @@ def probe_media(path: Path) -> Dict[str, Any]:
     return info
 
 
+# ---------------------------------------------------------------------------
+# Persistent probe cache
+# ---------------------------------------------------------------------------
+
+_PROBE_DB_FILE = Path(__file__).resolve().parent.parent / 'working' / 'probe_cache.sqlite3'
+_PROBE_MEM_MAX = 4096
+
+
+class _ProbeCache:
+    """ffprobe results keyed by (path, size, mtime_ns).
+
+    An in-memory LRU sits in front of a SQLite table under ``working/`` so
+    results survive restarts.  Only successful probes are stored; errors
+    (e.g. a file still being written) are always re-probed.
+    """
+
+    def __init__(self, db_file: Path):
+        self._db_file = db_file
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._mem: 'OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'mem_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and not self._db_failed:
+            try:
+                self._db_file.parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(str(self._db_file), timeout=5.0, check_same_thread=False)
+                db.execute('PRAGMA journal_mode=WAL')
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS probe ('
+                    ' path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,'
+                    ' meta TEXT, probed_at REAL)'
+                )
+                db.commit()
+                self._db = db
+            except Exception as e:
+                _log.warning("media: probe cache database unavailable (%s): %s", self._db_file, e)
+                self._db_failed = True
+        return self._db
+
+    def _remember(self, name: str, key: Tuple[int, int], meta: Dict[str, Any]) -> None:
+        self._mem[name] = (key, meta)
+        self._mem.move_to_end(name)
+        while len(self._mem) > _PROBE_MEM_MAX:
+            self._mem.popitem(last=False)
+
+    def get(self, name: str, key: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._mem.get(name)
+            if entry is not None and entry[0] == key:
+                self._mem.move_to_end(name)
+                self.counters['mem_hits'] += 1
+                return entry[1]
+            db = self._conn()
+            row = None
+            if db is not None:
+                try:
+                    row = db.execute(
+                        'SELECT meta FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?',
+                        (name, key[0], key[1]),
+                    ).fetchone()
+                except Exception as e:
+                    _log.warning("media: probe cache read failed: %s", e)
+            if row is not None:
+                try:
+                    meta = json.loads(row[0])
+                    self._remember(name, key, meta)
+                    self.counters['db_hits'] += 1
+                    return meta
+                except Exception:
+                    pass
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, name: str, key: Tuple[int, int], meta: Dict[str, Any]) -> None:
+        with self._lock:
+            self._remember(name, key, meta)
+            self.counters['stores'] += 1
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    'INSERT OR REPLACE INTO probe (path, size, mtime_ns, meta, probed_at) VALUES (?, ?, ?, ?, ?)',
+                    (name, key[0], key[1], json.dumps(meta), time.time()),
+                )
+                db.commit()
+            except Exception as e:
+                _log.warning("media: probe cache write failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            out['mem_entries'] = len(self._mem)
+            out['mem_max'] = _PROBE_MEM_MAX
+            out['db'] = str(self._db_file)
+            db = self._conn()
+            if db is not None:
+                try:
+                    out['db_entries'] = int(db.execute('SELECT COUNT(*) FROM probe').fetchone()[0])
+                except Exception:
+                    pass
+        lookups = out['mem_hits'] + out['db_hits'] + out['misses']
+        out['hit_rate'] = (out['mem_hits'] + out['db_hits']) / lookups if lookups else None
+        return out
+
+
+_PROBE_CACHE = _ProbeCache(_PROBE_DB_FILE)
+
+
+def _probe_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return int(st.st_size), int(st.st_mtime_ns)
+
+
+def _probe_and_store(path: Path, key: Optional[Tuple[int, int]], timeout: float) -> Dict[str, Any]:
+    meta = _probe_media_uncached(path, timeout)
+    if key is not None and meta.get('available') and not meta.get('error'):
+        _PROBE_CACHE.put(str(path), key, meta)
+    return meta
+
+
+def _probe_lookup(path: Path, timeout: float = _PROBE_TIMEOUT_SECONDS) -> Tuple[Dict[str, Any], bool]:
+    """Return (meta, cache_hit); cached dicts are shared and must not be modified."""
+    key = _probe_key(path)
+    if key is None or not path.is_file():
+        return _probe_media_uncached(path, timeout), False
+    meta = _PROBE_CACHE.get(str(path), key)
+    if meta is not None:
+        return meta, True
+    return _probe_and_store(path, key, timeout), False
+
+
+def probe_media(path: Path) -> Dict[str, Any]:
+    """ffprobe summary for *path*, served from the probe cache when unchanged.
+
+    Returns a fresh dict on every call, so callers may modify it.
+    """
+    return copy.deepcopy(_probe_lookup(path)[0])
+
+
+def probe_cache_stats() -> Dict[str, Any]:
+    return _PROBE_CACHE.stats()
+
+
+def _probe_many(
+    paths: Iterable[Path], concurrency: Optional[int], timeout: float,
+) -> Iterator[Tuple[Path, Dict[str, Any], bool]]:
+    """Yield (path, shared meta, cache_hit): hits first, then misses as their probes finish."""
+    misses: List[Tuple[Path, Tuple[int, int]]] = []
+    for path in paths:
+        key = _probe_key(path)
+        if key is None or not path.is_file():
+            yield path, _probe_media_uncached(path, timeout), False
+            continue
+        meta = _PROBE_CACHE.get(str(path), key)
+        if meta is not None:
+            yield path, meta, True
+        else:
+            misses.append((path, key))
+    if not misses:
+        return
+    workers = max(1, int(concurrency or cfg_media_probe_concurrency()))
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(misses)), thread_name_prefix='probe')
+    try:
+        futures = {pool.submit(_probe_and_store, p, key, timeout): p for p, key in misses}
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                meta = fut.result()
+            except Exception as e:
+                meta = {'available': True, 'error': str(e)}
+            yield path, meta, False
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def probe_many(
+    paths: Iterable[Path],
+    concurrency: Optional[int] = None,
+    timeout: float = _PROBE_TIMEOUT_SECONDS,
+) -> Iterator[Tuple[Path, Dict[str, Any]]]:
+    """Probe *paths* on a bounded thread pool, yielding ``(path, meta)`` as each completes.
+
+    Cache hits are yielded first without touching the pool; each ffprobe run
+    is limited to *timeout* seconds.  Closing the generator early cancels the
+    probes that have not started yet.
+    """
+    for path, meta, _hit in _probe_many(paths, concurrency, timeout):
+        yield path, copy.deepcopy(meta)
+
+
+def warm_probe_cache(paths: Iterable[Path], should_stop: Optional[Callable[[], bool]] = None,
+                     progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    """Probe every path not already cached; returns counts of cached/probed/failed."""
+    out = {'cached': 0, 'probed': 0, 'failed': 0}
+    probes = _probe_many(paths, None, _PROBE_TIMEOUT_SECONDS)
+    try:
+        for i, (_path, meta, hit) in enumerate(probes, start=1):
+            if hit:
+                out['cached'] += 1
+            else:
+                out['failed' if meta.get('error') or not meta.get('available') else 'probed'] += 1
+            if progress is not None:
+                progress(i)
+            if should_stop is not None and should_stop():
+                break
+    finally:
+        probes.close()
+    return out
+
+
+def _warm_paths(payload: Dict[str, Any]) -> List[Path]:
+    paths = [Path(p) for p in (payload.get('paths') or []) if str(p).strip()]
+    directory = str(payload.get('dir') or '').strip()
+    if directory:
+        root = Path(directory)
+        exts = {e.lower() for e in cfg_browser_visible_extensions()}
+        it = root.rglob('*') if payload.get('recursive', True) else root.iterdir()
+        paths.extend(sorted(p for p in it if p.is_file() and p.suffix.lower() in exts))
+    return paths
+
+
+def _run_probe_warm(ctx: TaskContext, payload: Dict[str, Any]) -> None:
+    paths = _warm_paths(payload)
+    ctx.set_progress(0, total=len(paths))
+    counts = warm_probe_cache(paths, should_stop=ctx.cancelled, progress=ctx.set_progress)
+    status = 'CANCELLED' if ctx.cancelled() else 'DONE'
+    update_task(
+        ctx.task_id,
+        status=status,
+        message=f"{counts['probed']} probed, {counts['cached']} already cached, {counts['failed']} failed",
+        meta={'counts': counts},
+    )
+
+
+@bp.route('/api/media_meta/warm', methods=['POST'])
+def api_media_meta_warm():
+    """Queue a background probe of ``paths`` and/or every video under ``dir``."""
+    payload = request.json or {}
+    paths = [str(assert_within_allowed_roots(str(p))) for p in (payload.get('paths') or []) if str(p).strip()]
+    directory = str(payload.get('dir') or '').strip()
+    if directory:
+        root = assert_within_allowed_roots(directory)
+        if not root.is_dir():
+            return jsonify({'error': 'Directory not found'}), 404
+        directory = str(root)
+    if not paths and not directory:
+        return jsonify({'error': 'Provide paths or dir'}), 400
+    task_payload = {'paths': paths, 'dir': directory, 'recursive': bool(payload.get('recursive', True))}
+    task = enqueue_task(
+        title=f"Probe {Path(directory).name if directory else f'{len(paths)} files'}",
+        kind='media.probe_warm',
+        runner=lambda ctx, p=task_payload: _run_probe_warm(ctx, p),
+        payload=task_payload,
+    )
+    return jsonify({'ok': True, 'task_id': task['id']})
+
+
+@bp.route('/api/media_meta/batch', methods=['POST'])
+def api_media_meta_batch():
+    """Probe many files concurrently, streaming one NDJSON line per file as it completes."""
+    payload = request.json or {}
+    raw_paths = payload.get('paths') or []
+    if not isinstance(raw_paths, list) or not raw_paths:
+        return jsonify({'error': 'Provide paths'}), 400
+    try:
+        concurrency = int(payload['concurrency']) if payload.get('concurrency') else None
+        timeout = float(payload.get('timeout') or _PROBE_TIMEOUT_SECONDS)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid concurrency/timeout'}), 400
+    timeout = max(1.0, min(120.0, timeout))
+    paths: List[Path] = []
+    rejected: List[str] = []
+    for raw in raw_paths:
+        try:
+            paths.append(assert_within_allowed_roots(str(raw)))
+        except Exception:
+            rejected.append(str(raw))
+
+    def generate():
+        for raw in rejected:
+            yield json.dumps({'path': raw, 'meta': {'available': True, 'error': 'Path not allowed'}}) + '\n'
+        count = len(rejected)
+        for path, meta in probe_many(paths, concurrency=concurrency, timeout=timeout):
+            count += 1
+            yield json.dumps({'path': str(path), 'meta': meta}) + '\n'
+        yield json.dumps({'done': True, 'count': count}) + '\n'
+
+    rv = Response(generate(), mimetype='application/x-ndjson')
+    rv.headers['Cache-Control'] = 'no-cache'
+    rv.headers['X-Accel-Buffering'] = 'no'
+    return rv
+
+
+@bp.route('/api/media_meta/cache')
+def api_media_meta_cache():
+    return jsonify({'ok': True, **probe_cache_stats()})
+
+
+register_task_resumer('media.probe_warm', _run_probe_warm)
+
+
 @bp.route('/api/media_meta')
 def api_media_meta():
     path = assert_within_allowed_roots(request.args.get('path', ''))
@@ -114,66 +457,513 @@ def api_media_meta():
     return jsonify(meta)
 
 
+# Read size for servers without sendfile; slices are read in block-aligned chunks
+_MEDIA_BLOCK_SIZE = 1 << 20
+_MEDIA_MAX_RANGES = 32
+
+
+class _FileSlice:
+    """Read-only view of *length* bytes of a file starting at *offset*.
+
+    Handed to ``wsgi.file_wrapper``: servers with sendfile support use
+    ``fileno()`` plus the current offset and Content-Length, so the bytes never
+    pass through Python; other servers call ``read()``, which stops at the end
+    of the slice and keeps reads aligned to ``_MEDIA_BLOCK_SIZE``.
+    """
+
+    def __init__(self, path: Path, offset: int, length: int):
+        self._f = path.open('rb', buffering=0)
+        self._f.seek(offset)
+        self._pos = offset
+        self._remaining = length
+
+    def fileno(self) -> int:
+        return self._f.fileno()
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0:
+            size = self._remaining
+        size = min(size, self._remaining, _MEDIA_BLOCK_SIZE - self._pos % _MEDIA_BLOCK_SIZE)
+        data = self._f.read(size)
+        self._pos += len(data)
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def _parse_byte_ranges(header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``Range`` header into sorted, merged inclusive ranges; None if unsatisfiable."""
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes' or file_size <= 0:
+        return None
+    ranges: List[Tuple[int, int]] = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start_str, sep, end_str = part.partition('-')
+        if not sep:
+            return None
+        start_str, end_str = start_str.strip(), end_str.strip()
+        if not start_str:
+            # suffix range: last N bytes
+            n = int(end_str)
+            if n <= 0:
+                continue
+            start, end = max(0, file_size - n), file_size - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+            if start < 0 or end < start:
+                return None
+            if start >= file_size:
+                continue
+            end = min(end, file_size - 1)
+        ranges.append((start, end))
+    if not ranges:
+        return None
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(value: str, etag: str, mtime: float) -> bool:
+    """If-Range needs a strong ETag match or the exact Last-Modified date."""
+    value = value.strip()
+    if value.startswith('W/'):
+        return False
+    if value.startswith('"'):
+        return value == f'"{etag}"'
+    date = parse_date(value)
+    return date is not None and int(date.timestamp()) == int(mtime)
+
+
+def _file_slice_response(path: Path, start: int, length: int, status: int, mime: str) -> Response:
+    body = wrap_file(request.environ, _FileSlice(path, start, length), buffer_size=_MEDIA_BLOCK_SIZE)
+    rv = Response(body, status, mimetype=mime, direct_passthrough=True)
+    rv.content_length = length
+    return rv
+
+
+def _multipart_ranges_response(path: Path, ranges: List[Tuple[int, int]], file_size: int, mime: str) -> Response:
+    boundary = uuid.uuid4().hex
+    heads = [
+        (f'--{boundary}\r\nContent-Type: {mime}\r\n'
+         f'Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n').encode('latin-1')
+        for start, end in ranges
+    ]
+    tail = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    length = sum(len(h) + (end - start + 1) + 2 for h, (start, end) in zip(heads, ranges)) - 2 + len(tail)
+
+    def generate():
+        for i, (head, (start, end)) in enumerate(zip(heads, ranges)):
+            yield (b'\r\n' if i else b'') + head
+            part = _FileSlice(path, start, end - start + 1)
+            try:
+                while True:
+                    data = part.read(_MEDIA_BLOCK_SIZE)
+                    if not data:
+                        break
+                    yield data
+            finally:
+                part.close()
+        yield tail
+
+    rv = Response(generate(), 206, mimetype=f'multipart/byteranges; boundary={boundary}', direct_passthrough=True)
+    rv.content_length = length
+    return rv
+
+
+def _proxy_redirect(path: Path) -> Response:
+    """Redirect ``proxy=1`` to the current proxy's versioned URL, or to the original.
+
+    Media elements send their later range requests to the redirect target,
+    so the choice is made once per playback and a proxy finishing
+    mid-playback never changes the bytes under a player.  Proxies are only
+    generated on request (``POST /api/media/proxy``), never by playback.
+    """
+    from .proxy import current_proxy
+    current = current_proxy(path)
+    if current is not None:
+        target, proxied = f'/media?path={quote(str(path))}&proxy={current[1]}', '1'
+    else:
+        target, proxied = f'/media?path={quote(str(path))}', '0'
+    rv = redirect(target, 307)
+    rv.headers['Cache-Control'] = 'no-store'
+    rv.headers['X-Proxy'] = proxied
+    return rv
+
+
 @bp.route('/media')
 def media():
     path = assert_within_allowed_roots(request.args.get('path', ''))
     if not path.exists() or not path.is_file():
         return jsonify({"error": "File not found"}), 404
-    file_size = path.stat().st_size
+    proxied: Optional[str] = None
+    proxy_arg = (request.args.get('proxy') or '').strip().lower()
+    if proxy_arg in ('1', 'true', 'yes'):
+        return _proxy_redirect(path)
+    if proxy_arg:
+        # Versioned proxy URL handed out by _proxy_redirect
+        from .proxy import current_proxy
+        current = current_proxy(path)
+        if current is None or current[1] != proxy_arg:
+            return jsonify({"error": "Proxy not available"}), 404
+        path, proxied = current[0], '1'
+    st = path.stat()
+    file_size = st.st_size
     mime, _ = mimetypes.guess_type(str(path))
+    mime = mime or 'application/octet-stream'
+    etag = f'{st.st_mtime_ns:x}-{file_size:x}'
     range_header = request.headers.get('Range', None)
+    if_range = request.headers.get('If-Range')
+    if range_header and if_range and not _if_range_matches(if_range, etag, st.st_mtime):
+        # Validator changed: the client's partial copy is stale, send the whole file
+        range_header = None
+
+    def _finish(rv: Response) -> Response:
+        rv.headers['Accept-Ranges'] = 'bytes'
+        if proxied is not None:
+            rv.headers['X-Proxy'] = proxied
+        rv.set_etag(etag)
+        rv.last_modified = int(st.st_mtime)
+        return rv
 
     def _range_not_satisfiable():
         rv = Response(status=416)
         rv.headers.add('Content-Range', f'bytes */{file_size}')
-        rv.headers.add('Accept-Ranges', 'bytes')
-        return rv
+        return _finish(rv)
 
     if range_header:
         try:
-            units, rng = range_header.split('=', 1)
-            if units.strip() != 'bytes':
-                return _range_not_satisfiable()
-            if ',' in rng:
-                return _range_not_satisfiable()
-            start_str, end_str = (rng.split('-', 1) + [''])[:2]
-            start = int(start_str) if start_str else 0
-            end = int(end_str) if end_str else file_size - 1
-            if start < 0 or end < start:
-                return _range_not_satisfiable()
-            start = max(0, min(start, file_size - 1))
-            end = max(start, min(end, file_size - 1))
-            if file_size == 0 or start >= file_size:
-                return _range_not_satisfiable()
-            length = (end - start + 1)
-
-            def generate():
-                chunk_size = 8192
-                with path.open('rb') as f:
-                    f.seek(start)
-                    remaining = length
-                    while remaining > 0:
-                        data = f.read(min(chunk_size, remaining))
-                        if not data:
-                            break
-                        remaining -= len(data)
-                        yield data
-
-            rv = Response(generate(), 206, mimetype=mime or 'application/octet-stream')
-            rv.headers.add('Content-Range', f'bytes {start}-{end}/{file_size}')
-            rv.headers.add('Accept-Ranges', 'bytes')
-            rv.headers.add('Content-Length', str(length))
-            return rv
-        except Exception:
+            ranges = _parse_byte_ranges(range_header, file_size)
+        except ValueError:
+            ranges = None
+        if ranges is None:
             return _range_not_satisfiable()
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            rv = _file_slice_response(path, start, end - start + 1, 206, mime)
+            rv.headers.add('Content-Range', f'bytes {start}-{end}/{file_size}')
+            return _finish(rv)
+        if len(ranges) <= _MEDIA_MAX_RANGES:
+            return _finish(_multipart_ranges_response(path, ranges, file_size, mime))
+        # Too many disjoint ranges: cheaper to send the file once
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and int(st.st_mtime) <= since.timestamp()
+    if not_modified:
+        return _finish(Response(status=304))
+    return _finish(_file_slice_response(path, 0, file_size, 200, mime))
+
+
+# ---------------------------------------------------------------------------
+# On-demand HLS
+# ---------------------------------------------------------------------------
+
+_HLS_DIR = Path(__file__).resolve().parent.parent / 'working' / 'hls'
+_HLS_TARGET_SECONDS = 6.0
+# Segment caches kept per video; the least recently used video's are dropped
+# beyond this count or cfg_media_hls_quota_bytes()
+_HLS_MAX_VIDEOS = 16
+_HLS_SEGMENT_TIMEOUT = 120.0
+# A video's cache directory mtime is its last use; refresh it at most this often
+_HLS_TOUCH_INTERVAL = 60.0
+# Bytes written between quota checks
+_HLS_EVICT_SLACK = 256 * 1024 * 1024
+_hls_locks: Dict[str, threading.Lock] = {}
+_hls_locks_guard = threading.Lock()
+_hls_unchecked_bytes = 0
+
+
+def _hls_segments(times: Any, keyframes: Any) -> List[Tuple[float, float]]:
+    """Split at keyframes into (start, duration) segments of about _HLS_TARGET_SECONDS."""
+    if not len(times):
+        return []
+    frame_dur = float(times[-1] - times[-2]) if len(times) > 1 else 0.0
+    end = float(times[-1]) + frame_dur
+    starts = [0.0]
+    for k in keyframes:
+        t = float(times[int(k)])
+        if t - starts[-1] >= _HLS_TARGET_SECONDS and end - t > 0.5:
+            starts.append(t)
+    return [(a, b - a) for a, b in zip(starts, starts[1:] + [end])]
+
+
+def _hls_video_dir(path: Path, key: Tuple[int, int]) -> Path:
+    digest = uuid.uuid5(uuid.NAMESPACE_URL, f'{path}|{key[0]}|{key[1]}').hex
+    return _HLS_DIR / digest
+
 
-    rv = send_file(str(path), mimetype=mime or 'application/octet-stream', conditional=True)
-    rv.headers.add('Accept-Ranges', 'bytes')
+def _hls_touch(out_dir: Path) -> None:
+    try:
+        if time.time() - out_dir.stat().st_mtime > _HLS_TOUCH_INTERVAL:
+            os.utime(out_dir)
+    except OSError:
+        pass
+
+
+def _hls_evict(keep: Optional[Path] = None) -> None:
+    """Drop least recently used segment caches beyond _HLS_MAX_VIDEOS or the byte quota."""
+    quota = cfg_media_hls_quota_bytes()
+    entries = []
+    try:
+        dirs = [d for d in _HLS_DIR.iterdir() if d.is_dir()]
+    except OSError:
+        return
+    for d in dirs:
+        try:
+            mtime = d.stat().st_mtime
+            size = sum(e.stat().st_size for e in os.scandir(d) if e.is_file())
+        except OSError:
+            continue
+        entries.append((mtime, size, d))
+    total = sum(size for _m, size, _d in entries)
+    count = len(entries)
+    for _mtime, size, d in sorted(entries, key=lambda e: e[0]):
+        if count <= _HLS_MAX_VIDEOS and total <= quota:
+            break
+        if keep is not None and d == keep:
+            continue
+        shutil.rmtree(d, ignore_errors=True)
+        total -= size
+        count -= 1
+
+
+def _hls_account(out_dir: Path, size: int, fresh: bool) -> None:
+    """Check the quota for a new video's cache, and after every _HLS_EVICT_SLACK bytes."""
+    global _hls_unchecked_bytes
+    with _hls_locks_guard:
+        _hls_unchecked_bytes += size
+        due = fresh or _hls_unchecked_bytes >= _HLS_EVICT_SLACK
+        if due:
+            _hls_unchecked_bytes = 0
+    if due:
+        _hls_evict(keep=out_dir)
+
+
+def _hls_segment_file(path: Path, key: Tuple[int, int], n: int, start: float, duration: float) -> Optional[Path]:
+    """Cut segment *n* with stream copy, once; later requests reuse the file."""
+    out_dir = _hls_video_dir(path, key)
+    out = out_dir / f'{n:06d}.ts'
+    if out.is_file():
+        _hls_touch(out_dir)
+        return out
+    with _hls_locks_guard:
+        lock = _hls_locks.setdefault(str(out), threading.Lock())
+    with lock:
+        if out.is_file():
+            return out
+        fresh = not out_dir.is_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(out.name + '.tmp')
+        cmd = [
+            'ffmpeg', '-hide_banner', '-v', 'error', '-nostdin', '-y',
+            '-ss', f'{start:.6f}', '-i', str(path), '-t', f'{duration:.6f}',
+            '-map', '0:v:0', '-c', 'copy', '-an',
+            '-output_ts_offset', f'{start:.6f}', '-f', 'mpegts', str(tmp),
+        ]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=_HLS_SEGMENT_TIMEOUT)
+        except Exception as e:
+            _log.warning("media: HLS segment %d of %s failed: %s", n, path, e)
+            tmp.unlink(missing_ok=True)
+            return None
+        if proc.returncode != 0 or not tmp.is_file():
+            _log.warning("media: HLS segment %d of %s failed: %s", n, path, proc.stderr.strip()[-300:])
+            tmp.unlink(missing_ok=True)
+            return None
+        os.replace(tmp, out)
+        _hls_account(out_dir, out.stat().st_size, fresh)
+    with _hls_locks_guard:
+        _hls_locks.pop(str(out), None)
+    return out
+
+
+def _hls_plan(path: Path) -> Tuple[Optional[Tuple[Tuple[int, int], List[Tuple[float, float]]]], str]:
+    """Return (plan, state); the frame index is built in the background while ``building``."""
+    from .frameindex import request_index
+
+    key = _probe_key(path)
+    idx, state = request_index(path)
+    if idx is None:
+        return None, state
+    if key is None or not idx.frames:
+        return None, 'failed'
+    return (key, _hls_segments(idx.times, idx.keyframes)), 'ready'
+
+
+def _hls_building(status: int) -> Response:
+    rv = jsonify({"ok": False, "building": True})
+    rv.status_code = status
+    rv.headers['Retry-After'] = '5'
+    return rv
+
+
+@bp.route('/media/hls/index.m3u8')
+def media_hls_playlist():
+    """VOD playlist split at keyframes; segments are cut only when fetched.
+
+    The first request queues the frame-index scan and answers 202 with
+    ``Retry-After`` until the index exists.
+    """
+    path = assert_within_allowed_roots(request.args.get('path', ''))
+    if not path.is_file():
+        return jsonify({"error": "File not found"}), 404
+    if not _ffprobe_exists() or shutil.which('ffmpeg') is None:
+        return jsonify({"error": "ffmpeg/ffprobe not available"}), 503
+    plan, state = _hls_plan(path)
+    if state == 'building':
+        return _hls_building(202)
+    if plan is None:
+        return jsonify({"error": "Could not index video"}), 422
+    key, segments = plan
+    cache_dir = _hls_video_dir(path, key)
+    if cache_dir.is_dir():
+        _hls_touch(cache_dir)
+    q = quote(str(path))
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{int(math.ceil(round(max(d for _s, d in segments), 3)))}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    for n, (_start, duration) in enumerate(segments):
+        lines.append(f'#EXTINF:{duration:.6f},')
+        lines.append(f'segment.ts?path={q}&n={n}&v={key[1]:x}')
+    lines.append('#EXT-X-ENDLIST')
+    rv = Response('\n'.join(lines) + '\n', mimetype='application/vnd.apple.mpegurl')
+    rv.headers['Cache-Control'] = 'no-cache'
     return rv
 
 
+@bp.route('/media/hls/segment.ts')
+def media_hls_segment():
+    path = assert_within_allowed_roots(request.args.get('path', ''))
+    try:
+        n = int(request.args.get('n', ''))
+    except ValueError:
+        return jsonify({"error": "Invalid segment"}), 400
+    if not path.is_file():
+        return jsonify({"error": "File not found"}), 404
+    plan, state = _hls_plan(path)
+    if state == 'building':
+        return _hls_building(503)
+    if plan is None:
+        return jsonify({"error": "Could not index video"}), 422
+    key, segments = plan
+    if not 0 <= n < len(segments):
+        return jsonify({"error": "Segment out of range"}), 404
+    seg = _hls_segment_file(path, key, n, *segments[n])
+    if seg is None:
+        return jsonify({"error": "Segment could not be produced"}), 500
+    # Segment URLs carry the source's mtime, so they are immutable
+    return send_file(str(seg), mimetype='video/mp2t', conditional=True, max_age=7 * 86400)
+
+
 _PREVIEW_ALLOWED_MIME_PREFIXES = ('video/', 'image/')
 _PREVIEW_MAX_BYTES = 4 * 1024 * 1024 * 1024  # 4 GiB
+_PREVIEW_PREFIX = 'cheesepie_preview_'
+_UPLOAD_STATE_PREFIX = 'cheesepie_upload_'
+# Chunk size suggested to clients; request bodies are copied in _UPLOAD_IO_BYTES pieces
+_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+_UPLOAD_IO_BYTES = 1024 * 1024
+# Partial uploads untouched for this long are abandoned and removed
+_UPLOAD_STALE_SECONDS = 24 * 3600
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_upload_locks: Dict[str, threading.Lock] = {}
+_upload_locks_guard = threading.Lock()
+
+
+def _preview_name_check(filename: str) -> Tuple[str, Optional[Tuple[str, int]]]:
+    """Return (safe name, error) for an uploaded preview file name."""
+    safe_name = secure_filename(filename) or 'upload'
+    # Restrict to image/video by guessing from the filename extension
+    guessed_mime, _ = mimetypes.guess_type(safe_name)
+    if not guessed_mime or not any(guessed_mime.startswith(p) for p in _PREVIEW_ALLOWED_MIME_PREFIXES):
+        return safe_name, ('Only image and video files are accepted', 415)
+    return safe_name, None
+
+
+def _preview_tmp_cleanup(incoming: int = 0) -> bool:
+    """Evict least recently used preview files so *incoming* more bytes fit the quota.
+
+    Partial uploads count toward the quota but are only removed once stale.
+    Returns False if the space cannot be made.
+    """
+    root = get_app_tmp_root()
+    quota = cfg_media_preview_tmp_quota_bytes()
+    now = time.time()
+    total = 0
+    done: List[Tuple[float, int, Path]] = []
+    for p in root.glob(_PREVIEW_PREFIX + '*'):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        if p.name.endswith('.part'):
+            if now - st.st_mtime > _UPLOAD_STALE_SECONDS:
+                upload_id = p.name[len(_PREVIEW_PREFIX):].split('_', 1)[0]
+                for stale in (p, root / f'{_UPLOAD_STATE_PREFIX}{upload_id}.json'):
+                    try:
+                        stale.unlink(missing_ok=True)
+                    except OSError:
+                        pass
+            else:
+                total += st.st_size
+            continue
+        total += st.st_size
+        done.append((max(st.st_atime, st.st_mtime), st.st_size, p))
+    for _used, size, p in sorted(done, key=lambda e: e[0]):
+        if total + incoming <= quota:
+            break
+        try:
+            p.unlink()
+            total -= size
+        except OSError as e:
+            _log.warning("media: could not evict preview upload %s: %s", p, e)
+    return total + incoming <= quota
+
+
+def _upload_files(upload_id: str) -> Optional[Tuple[Dict[str, Any], Path, Path]]:
+    """Return (state, state_path, part_path) of an upload in progress."""
+    if not _UPLOAD_ID_RE.match(upload_id or ''):
+        return None
+    root = get_app_tmp_root()
+    state_path = root / f'{_UPLOAD_STATE_PREFIX}{upload_id}.json'
+    try:
+        state = json.loads(state_path.read_text(encoding='utf-8'))
+    except Exception:
+        return None
+    return state, state_path, root / f"{_PREVIEW_PREFIX}{upload_id}_{state['name']}.part"
+
+
+def _upload_lock(upload_id: str) -> threading.Lock:
+    with _upload_locks_guard:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _part_size(part: Path) -> int:
+    try:
+        return part.stat().st_size
+    except OSError:
+        return 0
 
 
 @bp.route('/api/preview_upload', methods=['POST'])
@@ -183,18 +973,18 @@ def preview_upload():
     upload = request.files['file']
     if not upload or not upload.filename:
         return jsonify({'error': 'No file provided'}), 400
-    safe_name = secure_filename(upload.filename) or 'upload'
-    # Restrict to image/video by guessing from the filename extension
-    guessed_mime, _ = mimetypes.guess_type(safe_name)
-    if not guessed_mime or not any(guessed_mime.startswith(p) for p in _PREVIEW_ALLOWED_MIME_PREFIXES):
-        return jsonify({'error': 'Only image and video files are accepted'}), 415
+    safe_name, err = _preview_name_check(upload.filename)
+    if err:
+        return jsonify({'error': err[0]}), err[1]
     # Enforce size cap using Content-Length when available; stream-check otherwise
     content_length = request.content_length
     if content_length is not None and content_length > _PREVIEW_MAX_BYTES:
         return jsonify({'error': 'File exceeds 4 GiB size limit'}), 413
     try:
+        if not _preview_tmp_cleanup(content_length or 0):
+            return jsonify({'error': 'Upload storage quota exceeded'}), 507
         tmp_root = get_app_tmp_root()
-        dest = tmp_root / f"cheesepie_preview_{uuid.uuid4().hex}_{safe_name}"
+        dest = tmp_root / f"{_PREVIEW_PREFIX}{uuid.uuid4().hex}_{safe_name}"
         upload.save(dest)
     except Exception as e:
         return jsonify({'error': f'Failed to save upload: {e}'}), 500
@@ -208,4 +998,100 @@ def preview_upload():
     return jsonify({'ok': True, 'path': str(dest), 'name': safe_name, 'size': saved_size})
 
 
-__all__ = ['bp', 'probe_media']
+@bp.route('/api/preview_upload/init', methods=['POST'])
+def preview_upload_init():
+    """Start a chunked upload: ``{name, size}`` -> ``{upload_id, offset, chunk_size}``."""
+    payload = request.json or {}
+    name = str(payload.get('name') or '').strip()
+    try:
+        size = int(payload.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Provide name and size'}), 400
+    if not name or size <= 0:
+        return jsonify({'error': 'Provide name and size'}), 400
+    if size > _PREVIEW_MAX_BYTES:
+        return jsonify({'error': 'File exceeds 4 GiB size limit'}), 413
+    safe_name, err = _preview_name_check(name)
+    if err:
+        return jsonify({'error': err[0]}), err[1]
+    try:
+        if not _preview_tmp_cleanup(size):
+            return jsonify({'error': 'Upload storage quota exceeded'}), 507
+        upload_id = uuid.uuid4().hex
+        root = get_app_tmp_root()
+        (root / f'{_PREVIEW_PREFIX}{upload_id}_{safe_name}.part').touch()
+        state = {'name': safe_name, 'size': size, 'created': time.time()}
+        (root / f'{_UPLOAD_STATE_PREFIX}{upload_id}.json').write_text(json.dumps(state), encoding='utf-8')
+    except Exception as e:
+        return jsonify({'error': f'Failed to start upload: {e}'}), 500
+    return jsonify({'ok': True, 'upload_id': upload_id, 'offset': 0, 'size': size, 'chunk_size': _UPLOAD_CHUNK_BYTES})
+
+
+@bp.route('/api/preview_upload/<upload_id>', methods=['GET'])
+def preview_upload_status(upload_id: str):
+    """Bytes received so far; a reconnecting client resumes from ``offset``."""
+    found = _upload_files(upload_id)
+    if found is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    state, _state_path, part = found
+    return jsonify({'ok': True, 'upload_id': upload_id, 'offset': _part_size(part), 'size': state['size']})
+
+
+@bp.route('/api/preview_upload/<upload_id>', methods=['PUT'])
+def preview_upload_chunk(upload_id: str):
+    """Append the raw request body at ``?offset=`` (must equal the bytes received so far)."""
+    found = _upload_files(upload_id)
+    if found is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    state, _state_path, part = found
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Provide offset'}), 400
+    length = request.content_length
+    if length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    with _upload_lock(upload_id):
+        current = _part_size(part)
+        if offset != current:
+            return jsonify({'error': 'Offset mismatch', 'offset': current}), 409
+        if offset + length > int(state['size']):
+            return jsonify({'error': 'Chunk exceeds declared size', 'offset': current}), 413
+        stream = request.stream
+        remaining = length
+        try:
+            with part.open('ab') as f:
+                while remaining > 0:
+                    data = stream.read(min(_UPLOAD_IO_BYTES, remaining))
+                    if not data:
+                        break
+                    f.write(data)
+                    remaining -= len(data)
+        except Exception as e:
+            # Whatever reached the disk stays; the client resumes from the new offset
+            return jsonify({'error': f'Write failed: {e}', 'offset': _part_size(part)}), 500
+        return jsonify({'ok': True, 'offset': _part_size(part), 'size': state['size']})
+
+
+@bp.route('/api/preview_upload/<upload_id>/finalize', methods=['POST'])
+def preview_upload_finalize(upload_id: str):
+    found = _upload_files(upload_id)
+    if found is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    state, state_path, part = found
+    with _upload_lock(upload_id):
+        received = _part_size(part)
+        if received != int(state['size']):
+            return jsonify({'error': 'Upload incomplete', 'offset': received, 'size': state['size']}), 409
+        dest = part.with_name(part.name[:-len('.part')])
+        try:
+            os.replace(part, dest)
+            state_path.unlink(missing_ok=True)
+        except Exception as e:
+            return jsonify({'error': f'Failed to finalize upload: {e}'}), 500
+    with _upload_locks_guard:
+        _upload_locks.pop(upload_id, None)
+    return jsonify({'ok': True, 'path': str(dest), 'name': state['name'], 'size': received})
+
+
+__all__ = ['bp', 'probe_media', 'probe_many', 'probe_cache_stats', 'warm_probe_cache']
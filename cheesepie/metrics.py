@@ -0,0 +1,463 @@
+"""Per-mouse behavioural metrics computed from decoded tracks.
+
+Speed, distance, immobility bouts and ROI occupancy are accumulated over
+fixed-size frame blocks with array operations, so week-long recordings are
+processed in bounded memory.  Results are cached next to the track in a
+``.track.metrics.json`` file keyed by the track and preproc sidecar stats.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+from .analyze import (
+    _open_track,
+    _sidecar_base,
+    _track_load_lock,
+    _track_path_for_video,
+    _track_stat_key,
+)
+from .config import cfg_default_fps
+from .media import probe_media
+from .pathguard import assert_within_allowed_roots
+
+bp = Blueprint('metrics_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_METRICS_VERSION = 1
+_METRICS_BLOCK_FRAMES = 1 << 18
+# Distinct parameter sets kept per metrics file
+_METRICS_ENTRIES_MAX = 8
+# Immobility speed thresholds when the request does not provide one
+_DEFAULT_IMMOBILE_SPEED = {'cm': 1.0, 'px': 5.0}
+
+
+@dataclass
+class MetricsParams:
+    immobile_speed: Optional[float] = None  # units/s; None -> per-unit default
+    immobile_min_s: float = 1.0
+
+
+@dataclass
+class ArenaGeometry:
+    """Arena bbox and ROI grid from a final preproc sidecar (video pixels)."""
+    x: float
+    y: float
+    width: float
+    height: float
+    rows: int
+    cols: int
+    cm_per_px: Optional[float]
+    roi: Dict[str, List[Tuple[int, int]]]
+
+
+def _preproc_path_for(video: Path) -> Path:
+    return video.parent / f"{video.name}.preproc.json"
+
+
+def _metrics_path_for(mat_path: Path) -> Path:
+    return mat_path.with_name(_sidecar_base(mat_path) + '.track.metrics.json')
+
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    try:
+        if path.is_file():
+            data = json.loads(path.read_text(encoding='utf-8'))
+            return data if isinstance(data, dict) else {}
+    except Exception:
+        pass
+    return {}
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    key = _track_stat_key(path)
+    return list(key) if key is not None else None
+
+
+def _positive(value: Any) -> Optional[float]:
+    try:
+        v = float(value)
+        return v if np.isfinite(v) and v > 0 else None
+    except Exception:
+        return None
+
+
+def arena_geometry(preproc: Dict[str, Any]) -> Optional[ArenaGeometry]:
+    """Return the arena geometry stored by preproc, or None if incomplete."""
+    arena = preproc.get('arena')
+    if not isinstance(arena, dict):
+        return None
+    bbox = arena.get('bbox')
+    if not isinstance(bbox, dict):
+        return None
+    width = _positive(bbox.get('width'))
+    height = _positive(bbox.get('height'))
+    if width is None or height is None:
+        return None
+    try:
+        x = float(bbox.get('x') or 0)
+        y = float(bbox.get('y') or 0)
+    except Exception:
+        return None
+    rows = int(_positive(arena.get('grid_rows')) or 0)
+    cols = int(_positive(arena.get('grid_cols')) or 0)
+    scales = []
+    wcm = _positive(arena.get('width_in_cm'))
+    hcm = _positive(arena.get('height_in_cm'))
+    if wcm is not None:
+        scales.append(wcm / width)
+    if hcm is not None:
+        scales.append(hcm / height)
+    roi: Dict[str, List[Tuple[int, int]]] = {}
+    raw_roi = preproc.get('roi') or preproc.get('regions') or {}
+    if isinstance(raw_roi, dict):
+        for name, cfg in raw_roi.items():
+            if not isinstance(cfg, dict) or not cfg.get('enabled', True):
+                continue
+            cells = []
+            for c in cfg.get('cells') or []:
+                try:
+                    cells.append((int(c[0]), int(c[1])))
+                except Exception:
+                    continue
+            roi[str(name)] = sorted(set(cells))
+    return ArenaGeometry(
+        x=x, y=y, width=width, height=height,
+        rows=rows, cols=cols,
+        cm_per_px=float(np.mean(scales)) if scales else None,
+        roi=roi,
+    )
+
+
+def _video_format(video: Path, preproc: Dict[str, Any]) -> Tuple[float, Optional[int], Optional[int]]:
+    """Return (fps, width, height), preferring the preproc sidecar over ffprobe."""
+    meta = preproc.get('video') if isinstance(preproc.get('video'), dict) else {}
+    fps = _positive(meta.get('frame_rate'))
+    width = _positive(meta.get('width'))
+    height = _positive(meta.get('height'))
+    if fps is None or width is None or height is None:
+        try:
+            probed = probe_media(video)
+            vs = (probed.get('streams') or {}).get('video') or {}
+            fps = fps or _positive(vs.get('fps'))
+            width = width or _positive(vs.get('width'))
+            height = height or _positive(vs.get('height'))
+        except Exception:
+            pass
+    return (
+        float(fps or cfg_default_fps()),
+        int(width) if width else None,
+        int(height) if height else None,
+    )
+
+
+class _TrackBlocks:
+    """Iterate a track source as ``(start, x, y)`` float64 blocks in pixels.
+
+    Tracks stored in unit-square coordinates (the preview overlay's
+    ``max |v| <= 2`` heuristic, checked on the first block) are scaled to the
+    video size.
+    """
+
+    def __init__(self, src: Any, width: Optional[int], height: Optional[int], block_frames: int):
+        self.src = src
+        self.width = width
+        self.height = height
+        self.block_frames = max(1, int(block_frames))
+        self.normalized: Optional[bool] = None
+
+    def __iter__(self):
+        frames = int(self.src.frames)
+        for start in range(0, frames, self.block_frames):
+            end = min(frames, start + self.block_frames)
+            xs, ys = self.src.read(start, end)
+            x = np.asarray(xs, dtype=np.float64)
+            y = np.asarray(ys, dtype=np.float64)
+            if self.normalized is None:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    peak = np.nanmax(np.abs(np.concatenate((x.ravel(), y.ravel())))) if x.size else np.nan
+                self.normalized = bool(np.isfinite(peak) and peak <= 2 and self.width and self.height)
+            if self.normalized:
+                x = x * float(self.width)
+                y = y * float(self.height)
+            yield start, x, y
+
+
+def _run_lengths(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (starts, lengths) of the True runs in a 1-D boolean *mask*."""
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+
+class _BoutCounter:
+    """Immobility bouts for one mouse, with runs carried across blocks."""
+
+    def __init__(self, min_frames: int):
+        self.min_frames = max(1, int(min_frames))
+        self.carry = 0
+        self.count = 0
+        self.frames = 0
+        self.longest = 0
+
+    def _close(self, length: int) -> None:
+        if length >= self.min_frames:
+            self.count += 1
+            self.frames += length
+            self.longest = max(self.longest, length)
+
+    def feed(self, mask: np.ndarray) -> None:
+        n = mask.shape[0]
+        if n == 0:
+            return
+        starts, lengths = _run_lengths(mask)
+        lengths = lengths.astype(np.int64)
+        if self.carry:
+            if lengths.size and starts[0] == 0:
+                lengths[0] += self.carry
+            else:
+                self._close(self.carry)
+        self.carry = 0
+        if lengths.size and mask[-1]:
+            self.carry = int(lengths[-1])
+            lengths = lengths[:-1]
+        keep = lengths[lengths >= self.min_frames]
+        if keep.size:
+            self.count += int(keep.size)
+            self.frames += int(keep.sum())
+            self.longest = max(self.longest, int(keep.max()))
+
+    def finish(self) -> None:
+        if self.carry:
+            self._close(self.carry)
+            self.carry = 0
+
+
+def compute_metrics(video: Path, params: Optional[MetricsParams] = None) -> Optional[Dict[str, Any]]:
+    """Compute per-mouse metrics for *video* from its track and preproc sidecar.
+
+    Has no Flask dependency so it can run in worker processes.  Returns None
+    when the track cannot be opened.
+    """
+    params = params or MetricsParams()
+    mat = _track_path_for_video(video)
+    src = _open_track(mat)
+    if src is None:
+        return None
+    preproc = _read_json(_preproc_path_for(video))
+    geom = arena_geometry(preproc)
+    fps, vid_w, vid_h = _video_format(video, preproc)
+    mice, frames = int(src.mice), int(src.frames)
+
+    units = 'cm' if geom is not None and geom.cm_per_px else 'px'
+    unit_scale = geom.cm_per_px if units == 'cm' else 1.0
+    immobile_speed = params.immobile_speed
+    if immobile_speed is None:
+        immobile_speed = _DEFAULT_IMMOBILE_SPEED[units]
+    immobile_min_frames = max(1, int(round(params.immobile_min_s * fps)))
+
+    # Occupancy is counted on a cell grid spanning the arena plus any ROI
+    # cells drawn outside it; ROI times are summed from it at the end.
+    grid = None
+    if geom is not None and geom.rows and geom.cols:
+        all_cells = [c for cells in geom.roi.values() for c in cells]
+        r0 = min([0] + [c[0] for c in all_cells])
+        c0 = min([0] + [c[1] for c in all_cells])
+        r1 = max([geom.rows - 1] + [c[0] for c in all_cells])
+        c1 = max([geom.cols - 1] + [c[1] for c in all_cells])
+        grid = (r0, c0, r1 - r0 + 1, c1 - c0 + 1)
+        cell_counts = np.zeros((mice, grid[2] * grid[3]), dtype=np.int64)
+
+    valid_frames = np.zeros(mice, dtype=np.int64)
+    distance = np.zeros(mice, dtype=np.float64)
+    speed_sum = np.zeros(mice, dtype=np.float64)
+    speed_n = np.zeros(mice, dtype=np.int64)
+    speed_max = np.zeros(mice, dtype=np.float64)
+    moving_frames = np.zeros(mice, dtype=np.int64)
+    bouts = [_BoutCounter(immobile_min_frames) for _ in range(mice)]
+    prev_x = np.full(mice, np.nan)
+    prev_y = np.full(mice, np.nan)
+
+    blocks = _TrackBlocks(src, vid_w, vid_h, _METRICS_BLOCK_FRAMES)
+    for _start, x, y in blocks:
+        valid = np.isfinite(x) & np.isfinite(y)
+        valid_frames += valid.sum(axis=1)
+
+        step = np.hypot(
+            np.diff(np.concatenate((prev_x[:, None], x), axis=1), axis=1),
+            np.diff(np.concatenate((prev_y[:, None], y), axis=1), axis=1),
+        ) * unit_scale
+        step_ok = np.isfinite(step)
+        step = np.where(step_ok, step, 0.0)
+        speed = step * fps
+        distance += step.sum(axis=1)
+        speed_sum += speed.sum(axis=1)
+        speed_n += step_ok.sum(axis=1)
+        speed_max = np.maximum(speed_max, speed.max(axis=1))
+        immobile = step_ok & (speed < immobile_speed)
+        moving_frames += (step_ok & ~immobile).sum(axis=1)
+        for m in range(mice):
+            bouts[m].feed(immobile[m])
+        prev_x = x[:, -1].copy()
+        prev_y = y[:, -1].copy()
+
+        if grid is not None:
+            r0, c0, nr, nc = grid
+            with np.errstate(invalid='ignore'):
+                col = np.floor((x - geom.x) * geom.cols / geom.width) - c0
+                row = np.floor((y - geom.y) * geom.rows / geom.height) - r0
+            inside = valid & (row >= 0) & (row < nr) & (col >= 0) & (col < nc)
+            mouse_idx = np.broadcast_to(np.arange(mice)[:, None], inside.shape)[inside]
+            codes = (mouse_idx * (nr * nc) + row[inside] * nc + col[inside]).astype(np.int64)
+            cell_counts += np.bincount(codes, minlength=mice * nr * nc).reshape(mice, nr * nc)
+
+    for b in bouts:
+        b.finish()
+
+    colors = list(getattr(src, 'colors', None) or [])
+    per_mouse: List[Dict[str, Any]] = []
+    for m in range(mice):
+        entry: Dict[str, Any] = {
+            'index': m,
+            'color': colors[m] if m < len(colors) else None,
+            'valid_frames': int(valid_frames[m]),
+            'distance': float(distance[m]),
+            'speed_mean': float(speed_sum[m] / speed_n[m]) if speed_n[m] else None,
+            'speed_max': float(speed_max[m]) if speed_n[m] else None,
+            'moving_s': float(moving_frames[m] / fps),
+            'immobile': {
+                'bouts': bouts[m].count,
+                'total_s': float(bouts[m].frames / fps),
+                'longest_s': float(bouts[m].longest / fps),
+            },
+        }
+        if grid is not None:
+            r0, c0, nr, nc = grid
+            counts = cell_counts[m].reshape(nr, nc)
+            arena = counts[-r0:-r0 + geom.rows, -c0:-c0 + geom.cols]
+            entry['arena_s'] = float(arena.sum() / fps)
+            entry['roi_s'] = {
+                name: float(sum(int(counts[r - r0, c - c0]) for r, c in cells) / fps)
+                for name, cells in geom.roi.items()
+            }
+        per_mouse.append(entry)
+
+    return {
+        'version': _METRICS_VERSION,
+        'video': str(video),
+        'track': str(mat),
+        'frames': frames,
+        'fps': fps,
+        'duration_s': frames / fps if fps else None,
+        'units': units,
+        'normalized': bool(blocks.normalized),
+        'params': {
+            'immobile_speed': float(immobile_speed),
+            'immobile_min_s': float(params.immobile_min_s),
+        },
+        'grid': {'rows': geom.rows, 'cols': geom.cols} if grid is not None else None,
+        'mice': per_mouse,
+    }
+
+
+def _cache_key(video: Path, mat: Path, params: MetricsParams) -> Dict[str, Any]:
+    return {
+        'version': _METRICS_VERSION,
+        'track': _stat_key(mat),
+        'preproc': _stat_key(_preproc_path_for(video)),
+        'params': asdict(params),
+    }
+
+
+def _cached_metrics(path: Path, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    for entry in _read_json(path).get('entries') or []:
+        if isinstance(entry, dict) and entry.get('key') == key:
+            return entry.get('result')
+    return None
+
+
+def _store_metrics(path: Path, key: Dict[str, Any], result: Dict[str, Any]) -> None:
+    entries = [
+        e for e in (_read_json(path).get('entries') or [])
+        if isinstance(e, dict) and e.get('key') != key
+        and e.get('key', {}).get('track') == key['track']
+        and e.get('key', {}).get('preproc') == key['preproc']
+    ]
+    entries.append({'key': key, 'result': result})
+    tmp = path.with_name(path.name + '.tmp')
+    try:
+        tmp.write_text(json.dumps({'entries': entries[-_METRICS_ENTRIES_MAX:]}), encoding='utf-8')
+        os.replace(tmp, path)
+    except Exception as e:
+        _log.warning("metrics: could not write %s: %s", path, e)
+        try:
+            tmp.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+
+def metrics_for_video(
+    video: Path, params: Optional[MetricsParams] = None, refresh: bool = False,
+) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Return (metrics, cached) for *video*, computing and storing on a miss."""
+    params = params or MetricsParams()
+    mat = _track_path_for_video(video)
+    path = _metrics_path_for(mat)
+    key = _cache_key(video, mat, params)
+    if key['track'] is None:
+        return None, False
+    if not refresh:
+        hit = _cached_metrics(path, key)
+        if hit is not None:
+            return hit, True
+    with _track_load_lock(mat, 'metrics'):
+        if not refresh:
+            hit = _cached_metrics(path, key)
+            if hit is not None:
+                return hit, True
+        result = compute_metrics(video, params)
+        if result is not None:
+            _store_metrics(path, key, result)
+    return result, False
+
+
+def _params_from_request() -> MetricsParams:
+    params = MetricsParams()
+    speed = request.args.get('immobile_speed')
+    if speed not in (None, ''):
+        params.immobile_speed = max(0.0, float(speed))
+    min_s = request.args.get('immobile_min_s')
+    if min_s not in (None, ''):
+        params.immobile_min_s = max(0.0, float(min_s))
+    return params
+
+
+@bp.route('/api/analyze/metrics')
+def api_analyze_metrics():
+    video = assert_within_allowed_roots((request.args.get('video') or '').strip())
+    mat = _track_path_for_video(video)
+    if not mat.exists():
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_file'})
+    try:
+        params = _params_from_request()
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'invalid parameters'}), 400
+    refresh = (request.args.get('refresh') or '').strip().lower() in ('1', 'true', 'yes')
+    result, cached = metrics_for_video(video, params, refresh=refresh)
+    if result is None:
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_data'})
+    return jsonify({'ok': True, 'cached': cached, **result})
+
+
+__all__ = ['bp', 'MetricsParams', 'ArenaGeometry', 'arena_geometry', 'compute_metrics', 'metrics_for_video']
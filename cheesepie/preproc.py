@@ -22,6 +22,7 @@ except Exception:
     _HAVE_PYDANTIC = False
 
 from .config import CONFIG, _config_path
+from .frameindex import load_index
 from .media import probe_media  # type: ignore
 from .pathguard import assert_within_allowed_roots
 
@@ -215,7 +216,11 @@ def _video_meta_for(video_path: Path) -> Dict[str, Any]:
             try:
                 # If probe_media was extended to include nb_frames, look for it on streams.video
                 nb_frames = vs.get('nb_frames') if isinstance(vs, dict) else None
-                if nb_frames is not None:
+                fidx = load_index(video_path)
+                if fidx is not None:
+                    # Exact count from the packet index, matching /api/media/frame numbering
+                    out['num_frames'] = fidx.frames
+                elif nb_frames is not None:
                     try:
                         out['num_frames'] = int(nb_frames)
                     except Exception:
@@ -439,6 +444,33 @@ def _save_state(vpath: Path, st: Dict[str, Any]) -> None:
     _write_json(_state_path(vpath), st)
 
 
+def _background_image_for(vpath: Path):
+    """Saved background of a video as an RGB PIL image, or None.
+
+    Looks where /state does: temp state, then the ``.preproc.json`` sidecar,
+    then the legacy ``.background.png`` files.
+    """
+    from PIL import Image
+    import base64
+    import io
+
+    bg = _load_state(vpath).get('background')
+    if not bg:
+        bg = _read_json(vpath.parent / f"{vpath.name}.preproc.json").get('background')
+    if isinstance(bg, dict):
+        bg = bg.get('image_b64')
+    try:
+        if isinstance(bg, str) and bg.startswith('data:'):
+            raw = base64.b64decode(bg[bg.find('base64,') + 7:])
+            return Image.open(io.BytesIO(raw)).convert('RGB')
+        for p in (_background_path_for(vpath), vpath.with_suffix('.background.png')):
+            if p.is_file():
+                return Image.open(str(p)).convert('RGB')
+    except Exception as e:
+        _log.warning("preproc: could not load background for %s: %s", vpath, e)
+    return None
+
+
 # -----------------------------
 # Pydantic models (optional)
 # -----------------------------
@@ -1145,7 +1177,8 @@ def api_preproc_segment_simple():
     """Segment a frame with background using cheesepie.segment.simple.
 
     Accepts JSON with either data URLs or file paths:
-      - image: data URL for current frame or 'path'
+      - image: data URL for current frame, 'path', or 'video' + 'time'
+        (seconds; decoded server-side, no upload needed)
       - background: data URL for background or 'background_path'
 
     Returns
@@ -1154,11 +1187,12 @@ def api_preproc_segment_simple():
     payload = request.json or {}
     image_data = payload.get('image')
     image_path = payload.get('path')
+    video_path = payload.get('video')
     bg_data = payload.get('background')
     bg_path = payload.get('background_path')
     params = payload.get('params') or {}
-    if not (image_data or image_path):
-        return jsonify({'error': 'Provide image (data URL) or path'}), 400
+    if not (image_data or image_path or video_path):
+        return jsonify({'error': 'Provide image (data URL), path or video'}), 400
     try:
         from PIL import Image
         import base64
@@ -1188,8 +1222,22 @@ def api_preproc_segment_simple():
         except Exception as e:
             raise ValueError(f'Failed to open {label}: {e}')
 
+    def _from_video(raw_path: Any, raw_time: Any) -> Image.Image:
+        from .frames import read_frame
+        path = assert_within_allowed_roots(str(raw_path or '').strip())
+        try:
+            t = float(raw_time or 0.0)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid time')
+        decoded = read_frame(path, t=t)
+        if decoded is None:
+            raise ValueError(f'Failed to decode frame at {t:.3f}s')
+        return Image.fromarray(decoded[0])
+
     try:
-        if image_data and not image_path:
+        if video_path and not (image_data or image_path):
+            img = _from_video(video_path, payload.get('time'))
+        elif image_data and not image_path:
             img = _from_dataurl(str(image_data))
         else:
             img = _from_guarded_path(image_path, 'image')
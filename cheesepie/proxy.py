@@ -0,0 +1,270 @@
+"""Low-resolution H.264 scrubbing proxies (task kind ``media.proxy``).
+
+Day files are copy-mode concatenations with long GOPs at full resolution;
+a proxy is a downscaled, short-GOP re-encode that seeks cheaply over a slow
+link.  Proxies live in ``working/proxies/`` keyed by the source path and
+are regenerated when the source's size or mtime changes.  The proxy file's
+mtime doubles as its last-use time: serving one touches it, and once the
+directory exceeds ``cfg_media_proxy_quota_bytes()`` the least recently used
+proxies are deleted.  A transcode occupies the task worker for as long as
+the file plays, so proxies are only generated on an explicit
+``POST /api/media/proxy``; playback never queues one.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Blueprint, jsonify, request
+
+from .config import cfg_media_proxy_height, cfg_media_proxy_quota_bytes
+from .media import probe_media
+from .pathguard import assert_within_allowed_roots
+from .tasks import TaskContext, enqueue_task, list_tasks, register_task_resumer, update_task
+
+bp = Blueprint('proxy_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_PROXY_VERSION = 1
+_PROXY_DIR = Path(__file__).resolve().parent.parent / 'working' / 'proxies'
+# Keyframe every _PROXY_GOP frames so any seek decodes at most that many
+_PROXY_GOP = 12
+_PROXY_CRF = 28
+# Don't rewrite a proxy's mtime on every range request
+_TOUCH_INTERVAL = 60.0
+_pending: Dict[str, str] = {}  # source path -> task id
+_pending_lock = threading.Lock()
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [int(st.st_mtime_ns), int(st.st_size)]
+
+
+def _proxy_paths(video: Path) -> Tuple[Path, Path]:
+    digest = hashlib.sha1(str(video).encode('utf-8')).hexdigest()
+    return _PROXY_DIR / f'{digest}.mp4', _PROXY_DIR / f'{digest}.json'
+
+
+def current_proxy(video: Path) -> Optional[Tuple[Path, str]]:
+    """Return (proxy, version) for *video* if a proxy exists for its current contents.
+
+    The version changes whenever the proxy is regenerated, so URLs carrying
+    it always address the same bytes.
+    """
+    proxy, header_path = _proxy_paths(video)
+    try:
+        header = json.loads(header_path.read_text(encoding='utf-8'))
+        if (
+            int(header.get('version') or 0) != _PROXY_VERSION
+            or header.get('key') != _stat_key(video)
+            or int(header.get('height') or 0) != cfg_media_proxy_height()
+        ):
+            return None
+        mtime = proxy.stat().st_mtime
+    except Exception:
+        return None
+    if time.time() - mtime > _TOUCH_INTERVAL:
+        try:
+            os.utime(proxy)
+        except OSError:
+            pass
+    return proxy, f"{int(header.get('created') or 0):x}"
+
+
+def proxy_for(video: Path) -> Optional[Path]:
+    """Return the proxy for *video* if one exists for its current contents."""
+    current = current_proxy(video)
+    return current[0] if current is not None else None
+
+
+def _enforce_quota(keep: Optional[Path] = None) -> int:
+    """Delete least recently used proxies until the directory fits the quota."""
+    quota = cfg_media_proxy_quota_bytes()
+    entries = []
+    for p in _PROXY_DIR.glob('*.mp4'):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _m, size, _p in entries)
+    removed = 0
+    for _mtime, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= quota:
+            break
+        if keep is not None and p == keep:
+            continue
+        try:
+            p.unlink()
+            p.with_suffix('.json').unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        except OSError as e:
+            _log.warning("proxy: could not evict %s: %s", p, e)
+    return removed
+
+
+def _transcode(ctx: TaskContext, video: Path, out_path: Path, duration: Optional[float]) -> Tuple[bool, str]:
+    height = cfg_media_proxy_height()
+    cmd = [
+        'ffmpeg', '-hide_banner', '-v', 'error', '-nostdin', '-y',
+        '-i', str(video), '-an',
+        '-vf', f'scale=-2:{height}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(_PROXY_CRF),
+        '-g', str(_PROXY_GOP), '-keyint_min', str(_PROXY_GOP), '-sc_threshold', '0',
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+        '-progress', 'pipe:1',
+        str(out_path),
+    ]
+    try:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except Exception as e:
+        return False, str(e)
+    err_buf: List[str] = []
+
+    def _drain_stderr() -> None:
+        try:
+            for line in p.stderr:  # type: ignore[union-attr]
+                err_buf.append(line)
+        except Exception:
+            pass
+
+    threading.Thread(target=_drain_stderr, daemon=True).start()
+    try:
+        for line in p.stdout:  # type: ignore[union-attr]
+            if ctx.cancelled():
+                p.terminate()
+                break
+            key, _, value = line.strip().partition('=')
+            if key == 'out_time_us' and duration:
+                try:
+                    ctx.set_progress(min(1000, int(int(value) / 1e6 / duration * 1000)))
+                except ValueError:
+                    pass
+        rc = p.wait()
+    except Exception as e:
+        p.kill()
+        return False, str(e)
+    if ctx.cancelled():
+        return False, 'cancelled'
+    if rc != 0:
+        return False, ''.join(err_buf[-5:]).strip() or f'ffmpeg exited with {rc}'
+    return True, ''
+
+
+def _run_proxy(ctx: TaskContext, payload: Dict[str, Any]) -> None:
+    video = Path(str(payload.get('path') or ''))
+    try:
+        if proxy_for(video) is not None:
+            update_task(ctx.task_id, status='DONE', message='Proxy already up to date')
+            return
+        if shutil.which('ffmpeg') is None:
+            update_task(ctx.task_id, status='FAILED', message='ffmpeg not available')
+            return
+        key = _stat_key(video)
+        if key is None:
+            update_task(ctx.task_id, status='FAILED', message=f'File not found: {video}')
+            return
+        duration = probe_media(video).get('duration')
+        duration = float(duration) if isinstance(duration, (int, float)) and duration > 0 else None
+        ctx.set_progress(0, total=1000)
+        proxy, header_path = _proxy_paths(video)
+        _PROXY_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = proxy.with_name(proxy.stem + '.tmp.mp4')
+        ok, err = _transcode(ctx, video, tmp, duration)
+        if not ok:
+            tmp.unlink(missing_ok=True)
+            update_task(
+                ctx.task_id,
+                status='CANCELLED' if ctx.cancelled() else 'FAILED',
+                message=err or 'Proxy transcode failed',
+            )
+            return
+        os.replace(tmp, proxy)
+        header = {
+            'version': _PROXY_VERSION,
+            'source': str(video),
+            'key': key,
+            'height': cfg_media_proxy_height(),
+            'gop': _PROXY_GOP,
+            'created': time.time_ns(),
+        }
+        header_path.write_text(json.dumps(header), encoding='utf-8')
+        evicted = _enforce_quota(keep=proxy)
+        update_task(
+            ctx.task_id,
+            status='DONE',
+            progress=1000,
+            message=f'Proxy ready ({proxy.stat().st_size / 1e6:.1f} MB)'
+                    + (f', evicted {evicted}' if evicted else ''),
+            meta={'proxy': str(proxy)},
+        )
+    finally:
+        with _pending_lock:
+            _pending.pop(str(video), None)
+
+
+def _resumed_task(video: Path) -> Optional[str]:
+    """Return the id of an active ``media.proxy`` task for *video* resumed after a restart."""
+    for task in list_tasks(active_only=True, limit=0):
+        if task.get('kind') == 'media.proxy' and (task.get('payload') or {}).get('path') == str(video):
+            return task.get('id')
+    return None
+
+
+def start_proxy(video: Path) -> Dict[str, Any]:
+    """Queue proxy generation for *video* unless it is already queued."""
+    with _pending_lock:
+        task_id = _pending.get(str(video)) or _resumed_task(video)
+        if task_id is not None:
+            _pending[str(video)] = task_id
+            return {'id': task_id, 'queued': False}
+        payload = {'path': str(video)}
+        task = enqueue_task(
+            title=f'Proxy {video.name}',
+            kind='media.proxy',
+            runner=lambda ctx, p=payload: _run_proxy(ctx, p),
+            meta={'path': str(video)},
+            payload=payload,
+        )
+        _pending[str(video)] = task['id']
+    return {'id': task['id'], 'queued': True}
+
+
+@bp.route('/api/media/proxy', methods=['GET', 'POST'])
+def api_media_proxy():
+    """GET reports whether a proxy is ready; POST queues one."""
+    raw = (request.json or {}).get('path') if request.method == 'POST' else request.args.get('path')
+    video = assert_within_allowed_roots(str(raw or ''))
+    if not video.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    proxy = proxy_for(video)
+    if proxy is not None:
+        return jsonify({'ok': True, 'ready': True, 'size': proxy.stat().st_size})
+    if request.method == 'POST':
+        if shutil.which('ffmpeg') is None:
+            return jsonify({'error': 'ffmpeg not available'}), 503
+        task = start_proxy(video)
+        return jsonify({'ok': True, 'ready': False, 'task_id': task['id']})
+    with _pending_lock:
+        task_id = _pending.get(str(video)) or _resumed_task(video)
+    return jsonify({'ok': True, 'ready': False, 'task_id': task_id})
+
+
+register_task_resumer('media.proxy', _run_proxy)
+
+
+__all__ = ['bp', 'current_proxy', 'proxy_for', 'start_proxy']
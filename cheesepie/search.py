@@ -0,0 +1,311 @@
+"""Facility-wide filename search.
+
+Every facility ``output_dir`` is mirrored into a SQLite table of entries
+(name, size, mtime, sidecar flags) under ``working/search_index.sqlite3``
+with an FTS5 trigram index over the names, so substring queries across a
+whole facility take milliseconds.  A background thread refreshes the index
+every ``cfg_search_refresh_seconds()``; refreshes are incremental, because
+only directories whose mtime changed since the last pass are rescanned.
+Without FTS5 trigram support (SQLite < 3.34) names are matched with LIKE.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Blueprint, jsonify, request
+
+from .browser import _scan_dir
+from .config import (
+    cfg_browser_required_filename_regex,
+    cfg_browser_visible_extensions,
+    cfg_importer_facilities,
+    cfg_search_refresh_seconds,
+)
+
+bp = Blueprint('search_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_SEARCH_DB_FILE = Path(__file__).resolve().parent.parent / 'working' / 'search_index.sqlite3'
+_SEARCH_LIMIT_DEFAULT = 200
+_SEARCH_LIMIT_MAX = 2000
+# A search wakes the indexer when the last pass is older than this
+_SEARCH_STALE_SECONDS = 30.0
+# Directories rescanned per write transaction
+_SEARCH_COMMIT_EVERY = 200
+
+_FIELDS = ('name', 'path', 'dir', 'is_dir', 'size', 'modified', 'ext', 'has_preproc', 'has_annotations')
+
+_fts: Optional[bool] = None
+_write_lock = threading.Lock()
+_wake = threading.Event()
+_indexer_started = False
+_indexer_guard = threading.Lock()
+_state: Dict[str, Any] = {'refreshing': False, 'indexed_at': {}}
+_state_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _fts
+    _SEARCH_DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(_SEARCH_DB_FILE), timeout=10.0)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS files ('
+        ' id INTEGER PRIMARY KEY, facility TEXT, dir TEXT, name TEXT, path TEXT,'
+        ' is_dir INTEGER, size INTEGER, modified REAL, ext TEXT,'
+        ' has_preproc INTEGER, has_annotations INTEGER)'
+    )
+    db.execute('CREATE INDEX IF NOT EXISTS files_dir ON files (dir)')
+    db.execute('CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, facility TEXT, mtime_ns INTEGER)')
+    if _fts is None:
+        try:
+            db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(name, tokenize='trigram')")
+            _fts = True
+        except sqlite3.OperationalError as e:
+            _log.info("search: FTS5 trigram unavailable, using LIKE matching: %s", e)
+            _fts = False
+    db.commit()
+    return db
+
+
+def _drop_dirs(db: sqlite3.Connection, dirs: List[str]) -> None:
+    for d in dirs:
+        if _fts:
+            db.execute('DELETE FROM names WHERE rowid IN (SELECT id FROM files WHERE dir = ?)', (d,))
+        db.execute('DELETE FROM files WHERE dir = ?', (d,))
+        db.execute('DELETE FROM dirs WHERE path = ?', (d,))
+
+
+def _store_dir(db: sqlite3.Connection, facility: str, directory: str, mtime_ns: int, entries) -> None:
+    _drop_dirs(db, [directory])
+    db.executemany(
+        'INSERT INTO files (facility, dir, name, path, is_dir, size, modified, ext, has_preproc, has_annotations)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [
+            (
+                facility, directory, e['name'], e['path'], int(e['is_dir']), e['size'], e['modified'],
+                e['ext'], int(bool(e.get('has_preproc'))), int(bool(e.get('has_annotations'))),
+            )
+            for e in entries
+        ],
+    )
+    if _fts:
+        db.execute('INSERT INTO names (rowid, name) SELECT id, name FROM files WHERE dir = ?', (directory,))
+    db.execute(
+        'INSERT OR REPLACE INTO dirs (path, facility, mtime_ns) VALUES (?, ?, ?)',
+        (directory, facility, mtime_ns),
+    )
+
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _refresh_facility(db: sqlite3.Connection, facility: str, root: Path) -> Dict[str, int]:
+    """Walk *root*, rescanning directories whose mtime changed; returns counters."""
+    known = dict(db.execute('SELECT path, mtime_ns FROM dirs WHERE facility = ?', (facility,)))
+    root_s = str(root)
+    seen: set[str] = set()
+    stack = [root_s]
+    scanned = pending = 0
+    while stack:
+        d = stack.pop()
+        if d in seen:
+            continue
+        try:
+            mtime_ns = os.stat(d).st_mtime_ns
+        except OSError:
+            continue
+        seen.add(d)
+        if known.get(d) == mtime_ns:
+            subdirs = [r[0] for r in db.execute('SELECT path FROM files WHERE dir = ? AND is_dir = 1', (d,))]
+        else:
+            try:
+                listing = _scan_dir(Path(d), mtime_ns)
+            except OSError as e:
+                _log.warning("search: could not scan %s: %s", d, e)
+                seen.discard(d)
+                continue
+            _store_dir(db, facility, d, mtime_ns, listing.entries)
+            subdirs = [e['path'] for e in listing.entries if e['is_dir']]
+            scanned += 1
+            pending += 1
+            if pending >= _SEARCH_COMMIT_EVERY:
+                db.commit()
+                pending = 0
+        # Symlinks resolve to their targets; stay inside the facility
+        stack.extend(s for s in subdirs if _within(s, root_s) and s not in seen)
+    gone = [d for d in known if d not in seen]
+    _drop_dirs(db, gone)
+    db.commit()
+    return {'dirs': len(seen), 'scanned': scanned, 'removed': len(gone)}
+
+
+def refresh_index(facility: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """Bring the index up to date for one facility (or all); returns per-facility counters."""
+    facs = cfg_importer_facilities()
+    names = [facility] if facility else list(facs)
+    out: Dict[str, Dict[str, int]] = {}
+    with _write_lock:
+        with _state_lock:
+            _state['refreshing'] = True
+        db = None
+        try:
+            db = _connect()
+            if not facility:
+                # Facilities removed from the config
+                stale = [
+                    r[0] for r in db.execute('SELECT DISTINCT facility FROM dirs')
+                    if r[0] not in facs
+                ]
+                for fac in stale:
+                    _drop_dirs(db, [r[0] for r in db.execute('SELECT path FROM dirs WHERE facility = ?', (fac,))])
+                db.commit()
+            for fac in names:
+                cfg = facs.get(fac)
+                if not cfg or not cfg.get('output_dir'):
+                    continue
+                root = Path(cfg['output_dir']).expanduser().resolve()
+                if not root.is_dir():
+                    continue
+                t0 = time.monotonic()
+                out[fac] = _refresh_facility(db, fac, root)
+                with _state_lock:
+                    _state['indexed_at'][fac] = time.time()
+                _log.debug("search: %s refreshed in %.2fs: %s", fac, time.monotonic() - t0, out[fac])
+        except Exception as e:
+            _log.warning("search: index refresh failed: %s", e)
+        finally:
+            if db is not None:
+                db.close()
+            with _state_lock:
+                _state['refreshing'] = False
+    return out
+
+
+def _indexer_loop() -> None:
+    while True:
+        refresh_index()
+        interval = cfg_search_refresh_seconds()
+        _wake.wait(interval if interval > 0 else None)
+        _wake.clear()
+
+
+def start_search_indexer() -> None:
+    """Start the background refresh thread (once per process)."""
+    global _indexer_started
+    with _indexer_guard:
+        if _indexer_started:
+            return
+        _indexer_started = True
+    threading.Thread(target=_indexer_loop, daemon=True, name='search-indexer').start()
+
+
+def _like_escape(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_files(
+    facility: str, query: str, within: Optional[str] = None, limit: int = _SEARCH_LIMIT_DEFAULT,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Entries of *facility* whose names contain every whitespace-separated term.
+
+    Files are restricted to the browser's visible extensions and filename
+    pattern, like directory listings.  Returns (items, truncated).
+    """
+    terms = [t for t in query.lower().split() if t]
+    if not terms:
+        return [], False
+    sql = ['SELECT ' + ', '.join(_FIELDS) + ' FROM files WHERE facility = ?']
+    args: List[Any] = [facility]
+    db = _connect()
+    try:
+        fts_terms = [t for t in terms if len(t) >= 3] if _fts else []
+        if fts_terms:
+            sql.append('AND id IN (SELECT rowid FROM names WHERE names MATCH ?)')
+            args.append(' AND '.join('"' + t.replace('"', '""') + '"' for t in fts_terms))
+        for t in terms:
+            if t not in fts_terms:
+                sql.append("AND name LIKE ? ESCAPE '\\'")
+                args.append(f'%{_like_escape(t)}%')
+        if within:
+            sql.append("AND (dir = ? OR dir LIKE ? ESCAPE '\\')")
+            args.extend([within, _like_escape(within.rstrip(os.sep) + os.sep) + '%'])
+        sql.append('ORDER BY is_dir DESC, name')
+        allowed_exts = set(cfg_browser_visible_extensions())
+        name_re = cfg_browser_required_filename_regex()
+        items: List[Dict[str, Any]] = []
+        for row in db.execute(' '.join(sql), args):
+            item = dict(zip(_FIELDS, row))
+            item['is_dir'] = bool(item['is_dir'])
+            if item['is_dir']:
+                del item['has_preproc'], item['has_annotations']
+            else:
+                if item['ext'] not in allowed_exts:
+                    continue
+                if name_re is not None and not name_re.match(item['name']):
+                    continue
+                item['has_preproc'] = bool(item['has_preproc'])
+                item['has_annotations'] = bool(item['has_annotations'])
+            if len(items) >= limit:
+                return items, True
+            items.append(item)
+        return items, False
+    finally:
+        db.close()
+
+
+@bp.route('/api/search')
+def api_search():
+    """Filename search across a facility's output_dir (optionally under ``dir``)."""
+    facility = (request.args.get('facility') or '').strip().lower()
+    facs = cfg_importer_facilities()
+    if not facility or facility not in facs:
+        return jsonify({'items': [], 'error': 'Invalid or missing facility'}), 400
+    base = Path(facs[facility].get('output_dir') or '').expanduser().resolve()
+    within = None
+    directory = (request.args.get('dir') or '').strip()
+    if directory:
+        within_path = Path(directory).expanduser().resolve()
+        try:
+            within_path.relative_to(base)
+        except Exception:
+            return jsonify({'items': [], 'error': 'Path outside facility scope'}), 403
+        within = str(within_path)
+    try:
+        limit = max(1, min(_SEARCH_LIMIT_MAX, int(request.args.get('limit') or _SEARCH_LIMIT_DEFAULT)))
+    except ValueError:
+        return jsonify({'items': [], 'error': 'Invalid limit'}), 400
+
+    with _state_lock:
+        indexed_at = _state['indexed_at'].get(facility)
+        refreshing = bool(_state['refreshing'])
+    if not refreshing and (indexed_at is None or time.time() - indexed_at > _SEARCH_STALE_SECONDS):
+        start_search_indexer()
+        _wake.set()
+        refreshing = True
+
+    t0 = time.monotonic()
+    try:
+        items, truncated = search_files(facility, request.args.get('q') or '', within, limit)
+    except Exception as e:
+        _log.warning("search: query failed: %s", e)
+        return jsonify({'items': [], 'error': 'Search index unavailable'}), 503
+    return jsonify({
+        'items': items,
+        'count': len(items),
+        'truncated': truncated,
+        'indexed_at': indexed_at,
+        'refreshing': refreshing,
+        'elapsed_ms': round((time.monotonic() - t0) * 1000, 2),
+    })
+
+
+__all__ = ['bp', 'refresh_index', 'search_files', 'start_search_indexer']
@@ -7,7 +7,7 @@ from typing import Optional, Tuple
 import numpy as np
 from PIL import Image
 from skimage.measure import label
-from skimage.morphology import remove_small_objects, dilation, square, disk, closing
+from skimage.morphology import dilation, square, disk, closing
 from skimage.segmentation import find_boundaries
 
 
@@ -22,35 +22,46 @@ class Options:
     outline_thickness: int = 2
     outline_pattern: str = "solid"  # "solid" or "striped"
     outline_alpha: float = 0.8  # transparency of overlay (0=transparent, 1=opaque)
+    backend: str = "auto"  # "auto" (OpenCV when installed), "opencv" or "skimage"
 
 
-def simple_segment(
-    frame: Image.Image,
-    bkg: Image.Image,
-    opt: Optional[Options] = None,
-):
-    """
-    Segment moving objects by thresholding the luminance of (frame - background).
-    Returns:
-        labels_img: uint8 label image
-        overlay_img: original-size frame with blob outlines
+def _cv2():
+    try:
+        import cv2  # type: ignore
+        return cv2
+    except Exception:
+        return None
+
+
+def _disk(radius: int) -> np.ndarray:
+    """Same footprint as skimage.morphology.disk, as a uint8 OpenCV kernel."""
+    r = np.arange(-radius, radius + 1)
+    return ((r[:, None] ** 2 + r[None, :] ** 2) <= radius ** 2).astype(np.uint8)
+
+
+def _upscale_nearest(mask: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Nearest-neighbour resize sampling pixel centres, as skimage's order=0 resize does.
+
+    cv2.INTER_NEAREST(_EXACT) rounds differently at some scales, so the
+    source rows/columns are picked with index arrays instead.
     """
-    opt = opt or Options()
-    orig_size = frame.size
+    h, w = mask.shape
+    rows = np.minimum(((np.arange(height) + 0.5) * (h / height)).astype(np.intp), h - 1)
+    cols = np.minimum(((np.arange(width) + 0.5) * (w / width)).astype(np.intp), w - 1)
+    return mask[rows[:, None], cols]
 
-    # Resize for segmentation
-    frame_small = frame.resize((opt.width, opt.height), Image.BICUBIC)
-    bkg_small = bkg.resize((opt.width, opt.height), Image.BICUBIC)
 
-    frame_rgb = np.array(frame_small.convert("RGB"), dtype=np.uint8)
-    framed = frame_rgb.astype(np.float64)
-    bkgd = np.array(bkg_small.convert("RGB"), dtype=np.float64)
+def _too_small(sizes: np.ndarray, min_pixels: int) -> np.ndarray:
+    """Mask of the components (by area) removed as noise: fewer than *min_pixels* pixels.
+
+    Components of exactly *min_pixels* are kept.  Both backends use this rule
+    rather than remove_small_objects, whose boundary changed in
+    scikit-image 0.26 (it now also drops objects of exactly ``min_size``).
+    """
+    return np.asarray(sizes) < int(min_pixels)
 
-    lum = np.max(framed - bkgd, axis=2)
-    meanBkg, stdBkg = float(np.mean(lum)), float(np.std(lum))
-    if stdBkg == 0 or not np.isfinite(stdBkg):
-        return Image.fromarray(np.zeros(lum.shape, dtype=np.uint8)), frame.copy()
 
+def _labels_skimage(lum: np.ndarray, meanBkg: float, stdBkg: float, opt: Options) -> np.ndarray:
     # Binary search threshold
     lower, upper = 1, int(opt.noiseThresh)
     prev_thresh = (upper + lower) // 2
@@ -70,20 +81,129 @@ def simple_segment(
     thresh = prev_thresh
     bw = lum > (meanBkg + thresh * stdBkg)
     labeled = label(bw, connectivity=2)
-    filtered = remove_small_objects(labeled, min_size=int(opt.minNumPixels))
-    # filtered = closing(filtered, disk(5))
-    # Image.fromarray(filtered).save("/tmp/qqq2.png", format="PNG")
-    
+    small = _too_small(np.bincount(labeled.ravel()), opt.minNumPixels)
+    small[0] = False
+    labeled[small[labeled]] = 0
+    return labeled
+
+
+def _labels_opencv(cv2, lum: np.ndarray, meanBkg: float, stdBkg: float, opt: Options) -> np.ndarray:
+    """_labels_skimage with cv2 connected components; label ids match skimage's raster order."""
+    lower, upper = 1, int(opt.noiseThresh)
+    prev_thresh = (upper + lower) // 2
+    for _ in range(32):
+        if lower > upper:
+            break
+        thresh = (upper + lower) // 2
+        bw = (lum > (meanBkg + thresh * stdBkg)).view(np.uint8)
+        num_objects = int(cv2.connectedComponents(bw, connectivity=8)[0]) - 1
+        if num_objects < opt.maxNumObjects:
+            upper = thresh - 1
+            prev_thresh = thresh
+        else:
+            lower = thresh + 1
+
+    bw = (lum > (meanBkg + prev_thresh * stdBkg)).view(np.uint8)
+    n, labeled, stats, _centroids = cv2.connectedComponentsWithStats(bw, connectivity=8, ltype=cv2.CV_32S)
+    if n <= 1:
+        return np.zeros(lum.shape, dtype=np.int32)
+    # OpenCV numbers components in its own scan order; renumber by first pixel
+    flat = labeled.ravel()
+    fg = np.flatnonzero(flat)
+    ids, first = np.unique(flat[fg], return_index=True)
+    lut = np.zeros(n, dtype=np.int32)
+    lut[ids[np.argsort(first, kind='stable')]] = np.arange(1, len(ids) + 1, dtype=np.int32)
+    # Component areas come with the labels; drop small ones in the LUT
+    lut[_too_small(stats[:, cv2.CC_STAT_AREA], opt.minNumPixels)] = 0
+    lut[0] = 0
+    return lut[labeled]
+
+
+def _outline_skimage(filtered: np.ndarray, orig_size: Tuple[int, int], opt: Options) -> np.ndarray:
     # === Resize labels to original frame size for boundary detection on full-res ===
     from skimage.transform import resize as _resize
     filtered_large = _resize(filtered, (orig_size[1], orig_size[0]), order=0, preserve_range=True, anti_aliasing=False,).astype(filtered.dtype)
     filtered_large = (filtered_large > 0).astype(filtered.dtype)
-    
+
     # Boundary mask on full-resolution labels
     boundaries = find_boundaries(filtered_large, connectivity=2, mode="outer")
     if opt.outline_thickness > 1:
         boundaries = dilation(boundaries, disk(opt.outline_thickness))
-    
+    return boundaries
+
+
+def _outline_opencv(cv2, filtered: np.ndarray, orig_size: Tuple[int, int], opt: Options) -> np.ndarray:
+    fg = _upscale_nearest(filtered > 0, orig_size[1], orig_size[0]).view(np.uint8)
+    # Outer boundary: background pixels 8-adjacent to the foreground
+    boundaries = cv2.dilate(fg, np.ones((3, 3), np.uint8)) & (fg ^ 1)
+    if opt.outline_thickness > 1:
+        boundaries = cv2.dilate(boundaries, _disk(int(opt.outline_thickness)))
+    return boundaries.astype(bool)
+
+
+def segment_labels(
+    frame: Image.Image,
+    bkg: Image.Image,
+    opt: Optional[Options] = None,
+) -> Optional[np.ndarray]:
+    """
+    Label map of moving objects at the segmentation size (opt.height, opt.width).
+    Returns None when frame and background do not differ at all.
+    A background already resized to the segmentation size is used as-is.
+    """
+    opt = opt or Options()
+
+    # Resize for segmentation
+    frame_small = frame.resize((opt.width, opt.height), Image.BICUBIC)
+    bkg_small = bkg.resize((opt.width, opt.height), Image.BICUBIC)
+
+    cv2 = _cv2() if opt.backend in ("auto", "opencv") else None
+    if opt.backend == "opencv" and cv2 is None:
+        raise RuntimeError("segment backend 'opencv' requires opencv-python")
+
+    frame_rgb = np.array(frame_small.convert("RGB"), dtype=np.uint8)
+    if cv2 is not None:
+        # Differences of uint8 images fit int16 exactly; same values as float64
+        lum = np.max(frame_rgb.astype(np.int16) - np.array(bkg_small.convert("RGB"), dtype=np.int16), axis=2)
+    else:
+        framed = frame_rgb.astype(np.float64)
+        bkgd = np.array(bkg_small.convert("RGB"), dtype=np.float64)
+        lum = np.max(framed - bkgd, axis=2)
+    # Statistics in float64 either way, so thresholds are bit-identical
+    lum_f = lum if lum.dtype == np.float64 else lum.astype(np.float64)
+    meanBkg, stdBkg = float(np.mean(lum_f)), float(np.std(lum_f))
+    if stdBkg == 0 or not np.isfinite(stdBkg):
+        return None
+
+    if cv2 is not None:
+        return _labels_opencv(cv2, lum, meanBkg, stdBkg, opt)
+    return _labels_skimage(lum, meanBkg, stdBkg, opt)
+
+
+def simple_segment(
+    frame: Image.Image,
+    bkg: Image.Image,
+    opt: Optional[Options] = None,
+):
+    """
+    Segment moving objects by thresholding the luminance of (frame - background).
+    Returns:
+        labels_img: uint8 label image
+        overlay_img: original-size frame with blob outlines
+    """
+    opt = opt or Options()
+    orig_size = frame.size
+
+    filtered = segment_labels(frame, bkg, opt)
+    if filtered is None:
+        return Image.fromarray(np.zeros((opt.height, opt.width), dtype=np.uint8)), frame.copy()
+
+    cv2 = _cv2() if opt.backend in ("auto", "opencv") else None
+    if cv2 is not None:
+        boundaries = _outline_opencv(cv2, filtered, orig_size, opt)
+    else:
+        boundaries = _outline_skimage(filtered, orig_size, opt)
+
     # Apply stripe pattern (optional)
     # if opt.outline_pattern == "striped":
     #     pattern = (np.indices(boundaries.shape).sum(axis=0) % 4 == 0)
@@ -124,6 +244,7 @@ def parse_args():
     p.add_argument("--outlineThickness", type=int, default=1)
     p.add_argument("--outlinePattern", type=str, default="solid", choices=["solid", "striped"])
     p.add_argument("--outlineAlpha", type=float, default=0.8, help="Transparency of overlay (0–1, default 0.8)")
+    p.add_argument("--backend", type=str, default="auto", choices=["auto", "opencv", "skimage"])
     return p.parse_args()
 
 
@@ -151,6 +272,7 @@ def main():
         outline_thickness=args.outlineThickness,
         outline_pattern=args.outlinePattern,
         outline_alpha=args.outlineAlpha,
+        backend=args.backend,
     )
 
     frame = Image.open(args.frame)
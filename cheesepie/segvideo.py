@@ -0,0 +1,509 @@
+"""Whole-video segmentation (task kind ``preproc.segment_video``).
+
+Every Nth frame of a video (optionally within a time window) is segmented
+with ``segment.segment_labels`` against the background saved from the
+Preproc page.  Decoding, segmentation and writing run as a pipeline: one
+thread decodes with OpenCV, a thread pool segments (the OpenCV backend
+releases the GIL for its heavy steps), and a writer thread stores results.
+
+Results live in ``working/segments/<sha1 of the video path>/`` as
+``shard_NNNNN.npz`` files of ``_SHARD_FRAMES`` sampled frames each.  Every
+frame's uint16 label map is its own compressed member (``labels_<i>``), so
+one frame can be read without inflating the whole shard, next to per-blob
+stats (label, area, centroid at the segmentation size).  ``header.json``
+lists the completed shards; a resumed task continues after the last one.
+A read failure short of the end of the video fails the task (keeping the
+stored shards, so it can be resumed) rather than truncating the store.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request
+
+from .frameindex import load_index
+from .pathguard import assert_within_allowed_roots
+from .preproc import _background_image_for
+from .tasks import TaskContext, enqueue_task, register_task_resumer, update_task
+
+bp = Blueprint('segvideo_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_SEG_VERSION = 1
+_SEG_DIR = Path(__file__).resolve().parent.parent / 'working' / 'segments'
+_SHARD_FRAMES = 256
+_SEG_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Gaps between sampled frames larger than this are seeked rather than grabbed
+_SEEK_GAP = 90
+# Without a frame index, container frame counts may overshoot by this many
+# seconds; reads failing within it count as the end of the video
+_EOF_SLACK_SECONDS = 2.0
+_OPTION_KEYS = ('width', 'height', 'noiseThresh', 'maxNumObjects', 'minNumPixels')
+
+_pending: Dict[str, str] = {}  # video path -> task id
+_pending_lock = threading.Lock()
+_END = object()
+
+
+def _cv2():
+    try:
+        import cv2  # type: ignore
+        return cv2
+    except Exception:
+        return None
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [int(st.st_mtime_ns), int(st.st_size)]
+
+
+def _store_dir(video: Path) -> Path:
+    return _SEG_DIR / hashlib.sha1(str(video).encode('utf-8')).hexdigest()
+
+
+def _read_header(video: Path) -> Optional[Dict[str, Any]]:
+    try:
+        header = json.loads((_store_dir(video) / 'header.json').read_text(encoding='utf-8'))
+    except Exception:
+        return None
+    if int(header.get('version') or 0) != _SEG_VERSION or header.get('key') != _stat_key(video):
+        return None
+    return header
+
+
+def _write_header(store: Path, header: Dict[str, Any]) -> None:
+    tmp = store / 'header.json.tmp'
+    tmp.write_text(json.dumps(header), encoding='utf-8')
+    os.replace(tmp, store / 'header.json')
+
+
+def _segment_options(params: Dict[str, Any]):
+    from .segment import Options
+
+    opt = Options()
+    for key in _OPTION_KEYS:
+        if params.get(key) is not None:
+            setattr(opt, key, int(params[key]))
+    return opt
+
+
+def _frame_range(
+    cv2: Any, video: Path, start: Optional[float], end: Optional[float],
+) -> Tuple[int, int, float, int, bool]:
+    """(first, last, fps, frame count, count is exact) of the requested window, in frame numbers.
+
+    The count is exact when it comes from the frame index; the container's
+    count is an estimate.
+    """
+    cap = cv2.VideoCapture(str(video))
+    try:
+        fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+    fidx = load_index(video)
+    exact = fidx is not None and bool(fidx.frames)
+    if exact:
+        count = fidx.frames
+        to_frame = fidx.frame_at
+    else:
+        to_frame = lambda t: int(round(t * fps)) if fps > 0 else 0
+    first = max(0, to_frame(start)) if start else 0
+    last = count - 1
+    if end is not None:
+        last = min(last, to_frame(end))
+    return first, last, fps, count, exact
+
+
+_grid_cache: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _blob_stats(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(label, area, cx, cy) per blob of a label map."""
+    h, w = labels.shape
+    grid = _grid_cache.get((h, w))
+    if grid is None:
+        grid = _grid_cache.setdefault((h, w), (
+            np.tile(np.arange(w, dtype=np.float64), h),
+            np.repeat(np.arange(h, dtype=np.float64), w),
+        ))
+    flat = labels.ravel()
+    n = int(flat.max()) + 1 if flat.size else 1
+    area = np.bincount(flat, minlength=n)
+    ids = np.flatnonzero(area[1:]) + 1
+    if not len(ids):
+        empty = np.zeros(0, dtype=np.float32)
+        return ids.astype(np.uint16), ids.astype(np.int32), empty, empty
+    cx = np.bincount(flat, weights=grid[0], minlength=n)[ids] / area[ids]
+    cy = np.bincount(flat, weights=grid[1], minlength=n)[ids] / area[ids]
+    return ids.astype(np.uint16), area[ids].astype(np.int32), cx.astype(np.float32), cy.astype(np.float32)
+
+
+def _write_shard(store: Path, number: int, frames: List[int], labels: List[np.ndarray]) -> Dict[str, Any]:
+    arrays: Dict[str, np.ndarray] = {'frames': np.asarray(frames, dtype=np.int64)}
+    counts: List[int] = []
+    blob_frame, blob_label, blob_area, blob_cx, blob_cy = [], [], [], [], []
+    for i, lab in enumerate(labels):
+        arrays[f'labels_{i}'] = lab
+        ids, area, cx, cy = _blob_stats(lab)
+        counts.append(len(ids))
+        blob_frame.append(np.full(len(ids), i, dtype=np.int32))
+        blob_label.append(ids)
+        blob_area.append(area)
+        blob_cx.append(cx)
+        blob_cy.append(cy)
+    arrays['count'] = np.asarray(counts, dtype=np.int32)
+    arrays['blob_frame'] = np.concatenate(blob_frame)
+    arrays['blob_label'] = np.concatenate(blob_label)
+    arrays['blob_area'] = np.concatenate(blob_area)
+    arrays['blob_cx'] = np.concatenate(blob_cx)
+    arrays['blob_cy'] = np.concatenate(blob_cy)
+    name = f'shard_{number:05d}.npz'
+    tmp = store / (name + '.tmp')
+    with tmp.open('wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, store / name)
+    return {'file': name, 'first': int(frames[0]), 'last': int(frames[-1]), 'count': len(frames)}
+
+
+def _decode(
+    cv2: Any, video: Path, targets: List[int], out: 'queue.Queue', stop: threading.Event,
+    result: Dict[str, Any],
+) -> None:
+    """Decoder stage: put (frame number, RGB) for each target, then _END.
+
+    When a frame cannot be read (after one retry from a fresh capture),
+    ``result['stopped_at']`` is set to its number; an exception sets
+    ``result['error']``.
+    """
+    cap = cv2.VideoCapture(str(video))
+    try:
+        pos = None
+        for n in targets:
+            if stop.is_set():
+                break
+            if pos is None or n < pos or n - pos > _SEEK_GAP:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, n)
+                pos = n
+            while pos < n and cap.grab():
+                pos += 1
+            ok, bgr = cap.read()
+            if not ok or bgr is None:
+                # Network storage can fail transiently; retry once from a fresh capture
+                cap.release()
+                cap = cv2.VideoCapture(str(video))
+                cap.set(cv2.CAP_PROP_POS_FRAMES, n)
+                ok, bgr = cap.read()
+            if not ok or bgr is None:
+                result['stopped_at'] = n
+                break
+            pos = n + 1
+            out.put((n, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)))
+    except Exception as e:
+        _log.warning("segvideo: decoding %s failed: %s", video, e)
+        result['error'] = str(e)
+    finally:
+        cap.release()
+        out.put(_END)
+
+
+def _run_segment_video(ctx: TaskContext, payload: Dict[str, Any]) -> None:
+    video = Path(str(payload.get('video') or ''))
+    try:
+        _segment_video(ctx, video, payload)
+    finally:
+        with _pending_lock:
+            _pending.pop(str(video), None)
+
+
+def _segment_video(ctx: TaskContext, video: Path, payload: Dict[str, Any]) -> None:
+    from PIL import Image
+    from .segment import segment_labels
+
+    cv2 = _cv2()
+    if cv2 is None:
+        update_task(ctx.task_id, status='FAILED', message='OpenCV (cv2) not available')
+        return
+    key = _stat_key(video)
+    if key is None:
+        update_task(ctx.task_id, status='FAILED', message=f'File not found: {video}')
+        return
+    bkg = _background_image_for(video)
+    if bkg is None:
+        update_task(ctx.task_id, status='FAILED', message='No background saved for this video')
+        return
+    every = max(1, int(payload.get('every') or 1))
+    opt = _segment_options(payload.get('params') or {})
+    first, last, fps, count, exact = _frame_range(cv2, video, payload.get('start'), payload.get('end'))
+    # The store is keyed on the request alone: the resolved frame range can
+    # shift once a frame index appears, and must not discard stored shards
+    params = {
+        'every': every, 'start': payload.get('start'), 'end': payload.get('end'),
+        **{k: int(getattr(opt, k)) for k in _OPTION_KEYS},
+    }
+
+    store = _store_dir(video)
+    header = _read_header(video)
+    if header is not None and header.get('params') == params and header.get('done'):
+        update_task(ctx.task_id, status='DONE', message='Segmentation already complete')
+        return
+    if header is None or header.get('params') != params:
+        shutil.rmtree(store, ignore_errors=True)
+        header = {
+            'version': _SEG_VERSION, 'video': str(video), 'key': key, 'params': params,
+            'first': first, 'last': last, 'fps': fps,
+            'frames': len(range(first, last + 1, every)), 'shards': [], 'done': False,
+        }
+    else:
+        # Resume over the range the first run resolved
+        first, last, fps = int(header['first']), int(header['last']), float(header.get('fps') or fps)
+    targets = list(range(first, last + 1, every))
+    store.mkdir(parents=True, exist_ok=True)
+    _write_header(store, header)
+    done_frames = sum(int(s['count']) for s in header['shards'])
+    todo = targets[done_frames:]
+    ctx.set_progress(done_frames, total=len(targets))
+
+    # Frame sizes must match for the difference image, as in /segment_simple
+    bkg_small = None
+    stop = threading.Event()
+    frames_q: 'queue.Queue' = queue.Queue(maxsize=_SEG_WORKERS * 2)
+    shards_q: 'queue.Queue' = queue.Queue(maxsize=2)
+    errors: List[str] = []
+    decode_result: Dict[str, Any] = {}
+
+    def _writer() -> None:
+        while True:
+            item = shards_q.get()
+            if item is _END:
+                return
+            if errors:
+                continue
+            number, frames, labels = item
+            try:
+                header['shards'].append(_write_shard(store, number, frames, labels))
+                _write_header(store, header)
+                ctx.set_progress(sum(int(s['count']) for s in header['shards']))
+            except Exception as e:
+                errors.append(f'write failed: {e}')
+                stop.set()
+
+    def _segment(rgb: np.ndarray) -> np.ndarray:
+        frame = Image.fromarray(rgb)
+        labels = segment_labels(frame, bkg_small, opt)
+        if labels is None:
+            return np.zeros((opt.height, opt.width), dtype=np.uint16)
+        return np.asarray(labels, dtype=np.uint16)
+
+    decoder = threading.Thread(
+        target=_decode, args=(cv2, video, todo, frames_q, stop, decode_result),
+        daemon=True, name='segvideo-decode',
+    )
+    writer = threading.Thread(target=_writer, daemon=True, name='segvideo-write')
+    decoder.start()
+    writer.start()
+    shard_no = len(header['shards'])
+    buf_frames: List[int] = []
+    buf_labels: List[np.ndarray] = []
+    pending: 'deque[Tuple[int, Any]]' = deque()
+    decoded = 0
+
+    def _collect(block: bool) -> None:
+        nonlocal shard_no, buf_frames, buf_labels
+        while pending and (block or pending[0][1].done() or len(pending) >= _SEG_WORKERS * 2):
+            n, fut = pending.popleft()
+            buf_frames.append(n)
+            buf_labels.append(fut.result())
+            if len(buf_frames) >= _SHARD_FRAMES:
+                shards_q.put((shard_no, buf_frames, buf_labels))
+                shard_no += 1
+                buf_frames, buf_labels = [], []
+
+    try:
+        with ThreadPoolExecutor(max_workers=_SEG_WORKERS, thread_name_prefix='segvideo') as pool:
+            while True:
+                if ctx.cancelled() or errors:
+                    stop.set()
+                    break
+                item = frames_q.get()
+                if item is _END:
+                    break
+                n, rgb = item
+                if bkg_small is None:
+                    if bkg.size != (rgb.shape[1], rgb.shape[0]):
+                        bkg_full = bkg.resize((rgb.shape[1], rgb.shape[0]), Image.BILINEAR)
+                    else:
+                        bkg_full = bkg
+                    bkg_small = bkg_full.resize((opt.width, opt.height), Image.BICUBIC)
+                decoded += 1
+                pending.append((n, pool.submit(_segment, rgb)))
+                _collect(block=False)
+            if not stop.is_set():
+                _collect(block=True)
+                if buf_frames:
+                    shards_q.put((shard_no, buf_frames, buf_labels))
+            else:
+                for _n, fut in pending:
+                    fut.cancel()
+    finally:
+        stop.set()
+        # Unblock the decoder if it is waiting on a full queue
+        while decoder.is_alive():
+            try:
+                frames_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        shards_q.put(_END)
+        writer.join()
+
+    stored = sum(int(s['count']) for s in header['shards'])
+    stopped_at = decode_result.get('stopped_at')
+    if stopped_at is not None and not ctx.cancelled() and not errors:
+        if exact:
+            slack = 0
+        else:
+            slack = int(round(_EOF_SLACK_SECONDS * fps)) if fps > 0 else 60
+        if stopped_at < count - slack:
+            errors.append(f'could not read frame {stopped_at} of {count}')
+    if decode_result.get('error') and not errors:
+        errors.append(f"decoding failed: {decode_result['error']}")
+    if errors:
+        update_task(
+            ctx.task_id, status='FAILED',
+            message=f'{errors[0]}; {stored}/{len(targets)} frames stored, resumable',
+        )
+    elif ctx.cancelled():
+        update_task(ctx.task_id, status='CANCELLED', message=f'{stored}/{len(targets)} frames stored; resumable')
+    else:
+        # Only a container frame count that overshoots ends decoding early here
+        header['frames'] = stored
+        header['done'] = True
+        _write_header(store, header)
+        update_task(
+            ctx.task_id, status='DONE', progress=stored, total=stored,
+            message=f'{stored} frames segmented', meta={'store': str(store)},
+        )
+
+
+def start_segment_video(video: Path, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Queue whole-video segmentation unless it is already queued for *video*."""
+    with _pending_lock:
+        task_id = _pending.get(str(video))
+        if task_id is not None:
+            return {'id': task_id, 'queued': False}
+        payload = {**payload, 'video': str(video)}
+        task = enqueue_task(
+            title=f'Segment {video.name}',
+            kind='preproc.segment_video',
+            runner=lambda ctx, p=payload: _run_segment_video(ctx, p),
+            meta={'video': str(video)},
+            payload=payload,
+        )
+        _pending[str(video)] = task['id']
+    return {'id': task['id'], 'queued': True}
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    if value in (None, ''):
+        return None
+    return float(value)
+
+
+@bp.route('/api/preproc/segment_video', methods=['GET', 'POST'])
+def api_segment_video():
+    """POST queues segmentation ``{video, every, start, end, params}``; GET reports the store."""
+    raw = (request.json or {}) if request.method == 'POST' else request.args
+    video = assert_within_allowed_roots(str(raw.get('video') or ''))
+    if not video.is_file():
+        return jsonify({'error': 'Video file not found'}), 404
+    if request.method == 'GET':
+        header = _read_header(video)
+        with _pending_lock:
+            task_id = _pending.get(str(video))
+        if header is None:
+            return jsonify({'ok': True, 'exists': False, 'task_id': task_id})
+        return jsonify({
+            'ok': True, 'exists': True, 'task_id': task_id,
+            'done': bool(header.get('done')),
+            'frames': header.get('frames'),
+            'stored': sum(int(s['count']) for s in header['shards']),
+            'fps': header.get('fps'),
+            'params': header.get('params'),
+        })
+    try:
+        params = raw.get('params') or {}
+        payload = {
+            'every': max(1, int(raw.get('every') or 1)),
+            'start': _optional_float(raw.get('start')),
+            'end': _optional_float(raw.get('end')),
+            'params': {k: int(params[k]) for k in _OPTION_KEYS if params.get(k) is not None},
+        }
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid every/start/end/params'}), 400
+    if _background_image_for(video) is None:
+        return jsonify({'error': 'No background saved for this video'}), 400
+    task = start_segment_video(video, payload)
+    return jsonify({'ok': True, 'task_id': task['id'], 'queued': task['queued']})
+
+
+@bp.route('/api/preproc/segment_video/frame')
+def api_segment_video_frame():
+    """Stored labels of one sampled frame: blob stats as JSON, or ``format=png`` (16-bit)."""
+    video = assert_within_allowed_roots(request.args.get('video') or '')
+    header = _read_header(video)
+    if header is None:
+        return jsonify({'error': 'No segmentation stored for this video'}), 404
+    try:
+        frame = int(request.args.get('frame', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid frame'}), 400
+    shard = next((s for s in header['shards'] if s['first'] <= frame <= s['last']), None)
+    if shard is None:
+        return jsonify({'error': 'Frame not segmented'}), 404
+    with np.load(str(_store_dir(video) / shard['file'])) as data:
+        hits = np.flatnonzero(data['frames'] == frame)
+        if not len(hits):
+            return jsonify({'error': 'Frame not sampled', 'every': header['params']['every']}), 404
+        i = int(hits[0])
+        if (request.args.get('format') or '').lower() == 'png':
+            from PIL import Image
+            buf = io.BytesIO()
+            Image.fromarray(data[f'labels_{i}'], mode='I;16').save(buf, format='PNG')
+            return Response(buf.getvalue(), mimetype='image/png')
+        sel = data['blob_frame'] == i
+        blobs = [
+            {'label': int(lab), 'area': int(area), 'cx': round(float(cx), 2), 'cy': round(float(cy), 2)}
+            for lab, area, cx, cy in zip(
+                data['blob_label'][sel], data['blob_area'][sel], data['blob_cx'][sel], data['blob_cy'][sel],
+            )
+        ]
+    fps = header.get('fps') or 0
+    return jsonify({
+        'ok': True, 'frame': frame,
+        'time': frame / fps if fps else None,
+        'size': [header['params']['width'], header['params']['height']],
+        'count': len(blobs), 'blobs': blobs,
+    })
+
+
+register_task_resumer('preproc.segment_video', _run_segment_video)
+
+
+__all__ = ['bp', 'start_segment_video']
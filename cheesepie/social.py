@@ -0,0 +1,360 @@
+"""Pairwise social-proximity analysis: contact, approach and chase events.
+
+Inter-mouse distances and relative velocities are broadcast over
+``(mice, mice, frames)`` for one fixed-size frame block at a time; event runs
+are carried across block boundaries.  The event table is stored next to the
+track as ``.track.social.npy`` (structured array) plus a ``.track.social.json``
+header holding the cache key, thresholds and per-pair summary.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+from .analyze import _open_track, _sidecar_base, _track_load_lock, _track_path_for_video
+from .metrics import (
+    _TrackBlocks,
+    _preproc_path_for,
+    _read_json,
+    _run_lengths,
+    _stat_key,
+    _video_format,
+    arena_geometry,
+)
+from .pathguard import assert_within_allowed_roots
+
+bp = Blueprint('social_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_SOCIAL_VERSION = 1
+_SOCIAL_BLOCK_FRAMES = 1 << 16
+_SOCIAL_EVENTS_LIMIT = 5000
+
+EVENT_KINDS = ('contact', 'approach', 'chase')
+EVENT_DTYPE = np.dtype([
+    ('kind', 'u1'),
+    ('a', 'u1'),
+    ('b', 'u1'),
+    ('start', '<i8'),
+    ('end', '<i8'),
+])
+
+# Pixels per cm assumed for thresholds when the arena has no cm calibration
+_PX_PER_CM_FALLBACK = 10.0
+
+
+@dataclass
+class SocialParams:
+    """Event thresholds in cm (or cm-equivalent px) and seconds."""
+    contact_dist: float = 4.0
+    contact_min_s: float = 0.2
+    approach_dist: float = 20.0
+    approach_speed: float = 5.0
+    approach_min_s: float = 0.4
+    chase_dist: float = 15.0
+    chase_speed: float = 10.0
+    chase_min_s: float = 0.4
+    velocity_window_s: float = 0.2
+
+
+def _social_paths(mat_path: Path) -> Tuple[Path, Path]:
+    base = _sidecar_base(mat_path)
+    return mat_path.with_name(base + '.track.social.npy'), mat_path.with_name(base + '.track.social.json')
+
+
+class _RunTracker:
+    """Collect runs of True per series, carrying open runs across blocks."""
+
+    def __init__(self, series: int, min_frames: int):
+        self.min_frames = max(1, int(min_frames))
+        self.open_start = np.full(series, -1, dtype=np.int64)
+        self.runs: List[Tuple[int, int, int]] = []
+
+    def _emit(self, s: int, start: int, end: int) -> None:
+        if end - start >= self.min_frames:
+            self.runs.append((s, start, end))
+
+    def feed(self, mask: np.ndarray, offset: int) -> None:
+        n = mask.shape[1]
+        if n == 0:
+            return
+        for s in range(mask.shape[0]):
+            starts, lengths = _run_lengths(mask[s])
+            starts = starts + offset
+            ends = starts + lengths
+            carried = self.open_start[s]
+            if carried >= 0:
+                if starts.size and starts[0] == offset:
+                    starts[0] = carried
+                else:
+                    self._emit(s, int(carried), offset)
+            self.open_start[s] = -1
+            if starts.size and mask[s, -1]:
+                self.open_start[s] = starts[-1]
+                starts, ends = starts[:-1], ends[:-1]
+            for a, b in zip(starts.tolist(), ends.tolist()):
+                self._emit(s, a, b)
+
+    def finish(self, end: int) -> None:
+        for s in np.flatnonzero(self.open_start >= 0).tolist():
+            self._emit(s, int(self.open_start[s]), end)
+        self.open_start[:] = -1
+
+
+def compute_social(video: Path, params: Optional[SocialParams] = None) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+    """Detect pairwise events for *video*; returns (events, summary) or None."""
+    params = params or SocialParams()
+    mat = _track_path_for_video(video)
+    src = _open_track(mat)
+    if src is None:
+        return None
+    preproc = _read_json(_preproc_path_for(video))
+    geom = arena_geometry(preproc)
+    fps, vid_w, vid_h = _video_format(video, preproc)
+    mice, frames = int(src.mice), int(src.frames)
+
+    # Thresholds are in cm; without calibration they are applied in pixels
+    if geom is not None and geom.cm_per_px:
+        units, unit_scale, thr = 'cm', float(geom.cm_per_px), 1.0
+    else:
+        units, unit_scale, thr = 'px', 1.0, _PX_PER_CM_FALLBACK
+
+    lag = max(1, int(round(params.velocity_window_s * fps)))
+    min_frames = {k: max(1, int(round(getattr(params, k + '_min_s') * fps))) for k in EVENT_KINDS}
+    iu, ju = np.triu_indices(mice, k=1)
+    off = ~np.eye(mice, dtype=bool)
+    oi, oj = np.nonzero(off)
+    trackers = {
+        'contact': _RunTracker(iu.size, min_frames['contact']),
+        'approach': _RunTracker(oi.size, min_frames['approach']),
+        'chase': _RunTracker(oi.size, min_frames['chase']),
+    }
+    pair_frames = np.zeros(iu.size, dtype=np.int64)
+    pair_dist_sum = np.zeros(iu.size, dtype=np.float64)
+    contact_frames = np.zeros(iu.size, dtype=np.int64)
+    tail_x = np.full((mice, lag), np.nan)
+    tail_y = np.full((mice, lag), np.nan)
+
+    blocks = _TrackBlocks(src, vid_w, vid_h, _SOCIAL_BLOCK_FRAMES)
+    for start, x, y in blocks:
+        x = x * unit_scale
+        y = y * unit_scale
+        # Velocity over `lag` frames, using the previous block's tail
+        full_x = np.concatenate((tail_x, x), axis=1)
+        full_y = np.concatenate((tail_y, y), axis=1)
+        vx = (full_x[:, lag:] - full_x[:, :-lag]) * (fps / lag)
+        vy = (full_y[:, lag:] - full_y[:, :-lag]) * (fps / lag)
+        tail_x = full_x[:, -lag:]
+        tail_y = full_y[:, -lag:]
+
+        # rel[i, j] points from mouse i to mouse j
+        rel_x = x[None, :, :] - x[:, None, :]
+        rel_y = y[None, :, :] - y[:, None, :]
+        dist = np.hypot(rel_x, rel_y)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            toward = (vx[:, None, :] * rel_x + vy[:, None, :] * rel_y) / dist
+            away = (vx[None, :, :] * rel_x + vy[None, :, :] * rel_y) / dist
+            close = dist <= params.contact_dist * thr
+            approach = (dist <= params.approach_dist * thr) & (toward >= params.approach_speed * thr)
+            chase = (
+                (dist <= params.chase_dist * thr)
+                & (toward >= params.chase_speed * thr)
+                & (away >= params.chase_speed * thr)
+            )
+
+        pair_d = dist[iu, ju]
+        pair_ok = np.isfinite(pair_d)
+        pair_frames += pair_ok.sum(axis=1)
+        pair_dist_sum += np.where(pair_ok, pair_d, 0.0).sum(axis=1)
+        contact_frames += close[iu, ju].sum(axis=1)
+
+        trackers['contact'].feed(close[iu, ju], start)
+        trackers['approach'].feed(approach[oi, oj], start)
+        trackers['chase'].feed(chase[oi, oj], start)
+
+    rows: List[Tuple[int, int, int, int, int]] = []
+    for kind_idx, kind in enumerate(EVENT_KINDS):
+        tracker = trackers[kind]
+        tracker.finish(frames)
+        ai, bi = (iu, ju) if kind == 'contact' else (oi, oj)
+        for s, a, b in tracker.runs:
+            rows.append((kind_idx, int(ai[s]), int(bi[s]), a, b))
+    events = np.array(rows, dtype=EVENT_DTYPE)
+    events.sort(order=('start', 'kind', 'a', 'b'))
+
+    colors = list(getattr(src, 'colors', None) or [])
+    counts = {k: 0 for k in EVENT_KINDS}
+    for k in events['kind'].tolist():
+        counts[EVENT_KINDS[k]] += 1
+    pairs = []
+    for p in range(iu.size):
+        pairs.append({
+            'a': int(iu[p]),
+            'b': int(ju[p]),
+            'valid_frames': int(pair_frames[p]),
+            'mean_distance': float(pair_dist_sum[p] / pair_frames[p]) if pair_frames[p] else None,
+            'contact_s': float(contact_frames[p] / fps),
+        })
+    summary = {
+        'version': _SOCIAL_VERSION,
+        'video': str(video),
+        'track': str(mat),
+        'frames': frames,
+        'fps': fps,
+        'mice': mice,
+        'colors': colors,
+        'units': units,
+        'normalized': bool(blocks.normalized),
+        'kinds': list(EVENT_KINDS),
+        'params': asdict(params),
+        'counts': counts,
+        'pairs': pairs,
+    }
+    return events, summary
+
+
+def _cache_key(video: Path, mat: Path, params: SocialParams) -> Dict[str, Any]:
+    return {
+        'version': _SOCIAL_VERSION,
+        'track': _stat_key(mat),
+        'preproc': _stat_key(_preproc_path_for(video)),
+        'params': asdict(params),
+    }
+
+
+def _load_social(mat: Path, key: Dict[str, Any]) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+    npy_path, header_path = _social_paths(mat)
+    header = _read_json(header_path)
+    if header.get('key') != key or not npy_path.is_file():
+        return None
+    try:
+        events = np.load(str(npy_path), mmap_mode='r')
+    except Exception:
+        return None
+    if events.dtype != EVENT_DTYPE:
+        return None
+    return events, header.get('summary') or {}
+
+
+def _store_social(mat: Path, key: Dict[str, Any], events: np.ndarray, summary: Dict[str, Any]) -> None:
+    npy_path, header_path = _social_paths(mat)
+    tmp_npy = npy_path.with_name(npy_path.name + '.tmp')
+    tmp_header = header_path.with_name(header_path.name + '.tmp')
+    try:
+        with tmp_npy.open('wb') as f:
+            np.save(f, events)
+        os.replace(tmp_npy, npy_path)
+        tmp_header.write_text(json.dumps({'key': key, 'summary': summary}, indent=2), encoding='utf-8')
+        os.replace(tmp_header, header_path)
+    except Exception as e:
+        _log.warning("social: could not write event sidecar for %s: %s", mat, e)
+        for tmp in (tmp_npy, tmp_header):
+            try:
+                tmp.unlink(missing_ok=True)
+            except Exception:
+                pass
+
+
+def social_for_video(
+    video: Path, params: Optional[SocialParams] = None, refresh: bool = False,
+) -> Tuple[Optional[Tuple[np.ndarray, Dict[str, Any]]], bool]:
+    """Return ((events, summary), cached) for *video*, computing on a miss."""
+    params = params or SocialParams()
+    mat = _track_path_for_video(video)
+    key = _cache_key(video, mat, params)
+    if key['track'] is None:
+        return None, False
+    if not refresh:
+        hit = _load_social(mat, key)
+        if hit is not None:
+            return hit, True
+    with _track_load_lock(mat, 'social'):
+        if not refresh:
+            hit = _load_social(mat, key)
+            if hit is not None:
+                return hit, True
+        result = compute_social(video, params)
+        if result is not None:
+            _store_social(mat, key, *result)
+    return result, False
+
+
+def _params_from_request() -> SocialParams:
+    params = SocialParams()
+    for f in fields(SocialParams):
+        raw = request.args.get(f.name)
+        if raw not in (None, ''):
+            setattr(params, f.name, max(0.0, float(raw)))
+    return params
+
+
+def _int_arg(name: str, default: int) -> int:
+    try:
+        return int(request.args.get(name, default))
+    except Exception:
+        return default
+
+
+@bp.route('/api/analyze/social')
+def api_analyze_social():
+    video = assert_within_allowed_roots((request.args.get('video') or '').strip())
+    mat = _track_path_for_video(video)
+    if not mat.exists():
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_file'})
+    try:
+        params = _params_from_request()
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'invalid parameters'}), 400
+    refresh = (request.args.get('refresh') or '').strip().lower() in ('1', 'true', 'yes')
+    result, cached = social_for_video(video, params, refresh=refresh)
+    if result is None:
+        return jsonify({'ok': False, 'track': str(mat), 'reason': 'missing_data'})
+    events, summary = result
+
+    mask = np.ones(events.shape[0], dtype=bool)
+    kind = (request.args.get('kind') or '').strip().lower()
+    if kind:
+        if kind not in EVENT_KINDS:
+            return jsonify({'ok': False, 'error': f'unknown kind: {kind}'}), 400
+        mask &= events['kind'] == EVENT_KINDS.index(kind)
+    mouse = request.args.get('mouse')
+    if mouse not in (None, ''):
+        try:
+            m = int(mouse)
+        except ValueError:
+            return jsonify({'ok': False, 'error': 'invalid mouse'}), 400
+        mask &= (events['a'] == m) | (events['b'] == m)
+    selected = np.flatnonzero(mask)
+    offset = max(0, _int_arg('offset', 0))
+    limit = max(0, min(_SOCIAL_EVENTS_LIMIT, _int_arg('limit', _SOCIAL_EVENTS_LIMIT)))
+    page = events[selected[offset:offset + limit]]
+    fps = float(summary.get('fps') or 0) or 1.0
+    return jsonify({
+        'ok': True,
+        'cached': cached,
+        **summary,
+        'total': int(selected.size),
+        'offset': offset,
+        'events': [
+            {
+                'kind': EVENT_KINDS[int(e['kind'])],
+                'a': int(e['a']),
+                'b': int(e['b']),
+                'start': int(e['start']),
+                'end': int(e['end']),
+                'duration_s': (int(e['end']) - int(e['start'])) / fps,
+            }
+            for e in page
+        ],
+    })
+
+
+__all__ = ['bp', 'EVENT_KINDS', 'EVENT_DTYPE', 'SocialParams', 'compute_social', 'social_for_video']
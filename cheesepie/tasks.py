@@ -42,6 +42,10 @@ TASK_TIMEOUTS: Dict[str, float] = {
     'import.encode': 12 * 3600,
     'import.concat': 12 * 3600,
     'track':         24 * 3600,
+    'analyze.batch': 12 * 3600,
+    'media.probe_warm': 4 * 3600,
+    'media.proxy': 12 * 3600,
+    'preproc.segment_video': 24 * 3600,
 }
 _DEFAULT_TASK_TIMEOUT = 4.0 * 3600  # fallback for unregistered kinds
 
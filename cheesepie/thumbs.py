@@ -0,0 +1,282 @@
+"""Server-side preview thumbnails as one sprite sheet per video.
+
+Frames are grabbed with ffmpeg input seeking restricted to keyframes, so a
+day-long recording costs one short decode per thumbnail rather than a
+browser seek.  The sprite (JPEG) and its index (JSON) live under
+``working/thumbs/`` keyed by the video path and are regenerated when the
+video's size or mtime changes.  Listing a directory queues the first
+visible videos without a current sprite on a small pool of background
+threads of its own, so thumbnailing never waits behind (or delays) imports
+on the task worker; the most recently listed videos are served first.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from flask import Blueprint, jsonify, request, send_file
+
+from .config import cfg_browser_visible_extensions, cfg_preview_thumbnails
+from .media import probe_media
+from .pathguard import assert_within_allowed_roots
+
+bp = Blueprint('thumbs_api', __name__)
+_log = logging.getLogger(__name__)
+
+
+_THUMB_VERSION = 1
+_THUMB_DIR = Path(__file__).resolve().parent.parent / 'working' / 'thumbs'
+_THUMB_WIDTH = 240
+_THUMB_MAX_COLUMNS = 6
+_THUMB_FRAME_TIMEOUT = 30.0
+_THUMB_JPEG_QUALITY = 80
+# Background generation: worker threads, queued videos, videos one listing may queue
+_THUMB_WORKERS = 2
+_THUMB_QUEUE_MAX = 1000
+_THUMB_SCHEDULE_MAX = 100
+# Background ffmpeg runs under nice(1) where available
+_THUMB_NICE = 10
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+# Videos queued for background generation, most recently listed last
+_pending: 'OrderedDict[str, None]' = OrderedDict()
+_pending_cond = threading.Condition()
+_workers_started = 0
+
+
+def _ffmpeg_exists() -> bool:
+    return shutil.which('ffmpeg') is not None
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [int(st.st_mtime_ns), int(st.st_size)]
+
+
+def _thumb_paths(video: Path) -> Tuple[Path, Path]:
+    digest = hashlib.sha1(str(video).encode('utf-8')).hexdigest()
+    base = _THUMB_DIR / digest[:2] / digest
+    return base.with_suffix('.jpg'), base.with_suffix('.json')
+
+
+def _path_lock(video: Path) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(str(video), threading.Lock())
+
+
+def _thumb_times(duration: float, count: int) -> List[float]:
+    return [duration * (i + 1) / (count + 1) for i in range(count)]
+
+
+def _grab_frame(video: Path, t: float, background: bool = False):
+    """Decode the keyframe at or before *t*, scaled to the thumbnail width."""
+    from PIL import Image  # type: ignore
+
+    nice = ['nice', '-n', str(_THUMB_NICE)] if background and shutil.which('nice') else []
+    cmd = [
+        *nice, 'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-skip_frame', 'nokey', '-noaccurate_seek', '-ss', f'{max(0.0, t):.3f}',
+        '-i', str(video),
+        '-frames:v', '1', '-vf', f'scale={_THUMB_WIDTH}:-2',
+        '-f', 'image2pipe', '-c:v', 'png', '-',
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, timeout=_THUMB_FRAME_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        _log.warning("thumbs: ffmpeg timed out at %.1fs in %s", t, video)
+        return None
+    if proc.returncode != 0 or not proc.stdout:
+        return None
+    try:
+        img = Image.open(io.BytesIO(proc.stdout))
+        img.load()
+        return img.convert('RGB')
+    except Exception:
+        return None
+
+
+def _read_index(video: Path) -> Optional[Dict[str, Any]]:
+    sprite, index = _thumb_paths(video)
+    try:
+        data = json.loads(index.read_text(encoding='utf-8'))
+    except Exception:
+        return None
+    if (
+        int(data.get('version') or 0) != _THUMB_VERSION
+        or data.get('key') != _stat_key(video)
+        or int(data.get('count') or 0) != cfg_preview_thumbnails()
+        or not sprite.is_file()
+    ):
+        return None
+    return data
+
+
+def build_thumbnails(video: Path, background: bool = False) -> Optional[Dict[str, Any]]:
+    """Return the sprite index for *video*, generating the sprite if stale."""
+    index = _read_index(video)
+    if index is not None:
+        return index
+    with _path_lock(video):
+        index = _read_index(video)
+        if index is not None:
+            return index
+        return _generate(video, background)
+
+
+def _generate(video: Path, background: bool = False) -> Optional[Dict[str, Any]]:
+    from PIL import Image  # type: ignore
+
+    count = cfg_preview_thumbnails()
+    key = _stat_key(video)
+    if count <= 0 or key is None or not _ffmpeg_exists():
+        return None
+    meta = probe_media(video)
+    duration = meta.get('duration')
+    if not isinstance(duration, (int, float)) or duration <= 0:
+        return None
+    times = _thumb_times(float(duration), count)
+    frames = [(t, _grab_frame(video, t, background)) for t in times]
+    frames = [(t, img) for t, img in frames if img is not None]
+    if not frames:
+        _log.warning("thumbs: no frames could be extracted from %s", video)
+        return None
+
+    tile_w, tile_h = frames[0][1].size
+    columns = min(_THUMB_MAX_COLUMNS, len(frames))
+    rows = int(math.ceil(len(frames) / columns))
+    sheet = Image.new('RGB', (columns * tile_w, rows * tile_h))
+    tiles = []
+    for i, (t, img) in enumerate(frames):
+        x, y = (i % columns) * tile_w, (i // columns) * tile_h
+        if img.size != (tile_w, tile_h):
+            img = img.resize((tile_w, tile_h))
+        sheet.paste(img, (x, y))
+        tiles.append({'t': round(t, 3), 'x': x, 'y': y})
+
+    sprite_path, index_path = _thumb_paths(video)
+    index = {
+        'version': _THUMB_VERSION,
+        'video': str(video),
+        'key': key,
+        'count': count,
+        'duration': float(duration),
+        'tile': [tile_w, tile_h],
+        'columns': columns,
+        'rows': rows,
+        'thumbs': tiles,
+    }
+    tmp_sprite = sprite_path.with_name(sprite_path.name + '.tmp')
+    tmp_index = index_path.with_name(index_path.name + '.tmp')
+    try:
+        sprite_path.parent.mkdir(parents=True, exist_ok=True)
+        sheet.save(tmp_sprite, format='JPEG', quality=_THUMB_JPEG_QUALITY)
+        os.replace(tmp_sprite, sprite_path)
+        tmp_index.write_text(json.dumps(index), encoding='utf-8')
+        os.replace(tmp_index, index_path)
+    except Exception as e:
+        _log.warning("thumbs: could not write sprite for %s: %s", video, e)
+        for tmp in (tmp_sprite, tmp_index):
+            try:
+                tmp.unlink(missing_ok=True)
+            except Exception:
+                pass
+        return None
+    return index
+
+
+def _thumbs_worker() -> None:
+    while True:
+        with _pending_cond:
+            while not _pending:
+                _pending_cond.wait()
+            path, _ = _pending.popitem(last=True)
+        video = Path(path)
+        try:
+            if build_thumbnails(video, background=True) is None:
+                _log.debug("thumbs: no sprite for %s", video)
+        except Exception as e:
+            _log.warning("thumbs: generation failed for %s: %s", video, e)
+
+
+def _ensure_workers() -> None:
+    global _workers_started
+    with _pending_cond:
+        start = _THUMB_WORKERS - _workers_started
+        _workers_started = _THUMB_WORKERS
+    for i in range(start):
+        threading.Thread(target=_thumbs_worker, daemon=True, name=f'thumbs-{i}').start()
+
+
+def schedule_thumbnails(paths: Iterable[Path]) -> int:
+    """Queue background sprites for the first videos in *paths* lacking one.
+
+    At most ``_THUMB_SCHEDULE_MAX`` videos are considered per call; the rest
+    are picked up when they are listed again (e.g. on the next page).  When
+    the queue is full the longest-waiting videos are dropped.  Returns the
+    number of videos queued.
+    """
+    if cfg_preview_thumbnails() <= 0 or not _ffmpeg_exists():
+        return 0
+    exts = set(cfg_browser_visible_extensions())
+    videos = (p for p in paths if p.suffix.lower() in exts)
+    todo = [str(p) for p in islice(videos, _THUMB_SCHEDULE_MAX) if _read_index(p) is None]
+    if not todo:
+        return 0
+    with _pending_cond:
+        # Queue in reverse so the first listed video is generated first
+        for path in reversed(todo):
+            _pending[path] = None
+            _pending.move_to_end(path)
+        while len(_pending) > _THUMB_QUEUE_MAX:
+            _pending.popitem(last=False)
+        _pending_cond.notify_all()
+    _ensure_workers()
+    return len(todo)
+
+
+@bp.route('/api/media/thumbs')
+def api_media_thumbs():
+    video = assert_within_allowed_roots(request.args.get('path', ''))
+    if not video.is_file():
+        return jsonify({'ok': False, 'error': 'File not found'}), 404
+    if cfg_preview_thumbnails() <= 0:
+        return jsonify({'ok': False, 'reason': 'disabled'})
+    if not _ffmpeg_exists():
+        return jsonify({'ok': False, 'reason': 'ffmpeg_missing'})
+    with _pending_cond:
+        _pending.pop(str(video), None)
+    index = build_thumbnails(video)
+    if index is None:
+        return jsonify({'ok': False, 'reason': 'no_frames'})
+    out = {k: v for k, v in index.items() if k not in ('version', 'key')}
+    out['sprite'] = f"/api/media/thumbs/sprite?path={quote(str(video))}&v={index['key'][0]}"
+    return jsonify({'ok': True, **out})
+
+
+@bp.route('/api/media/thumbs/sprite')
+def api_media_thumbs_sprite():
+    video = assert_within_allowed_roots(request.args.get('path', ''))
+    if _read_index(video) is None:
+        return jsonify({'error': 'Sprite not available'}), 404
+    sprite, _index = _thumb_paths(video)
+    # URLs carry the video's mtime, so a cached sprite never goes stale
+    return send_file(str(sprite), mimetype='image/jpeg', conditional=True, max_age=7 * 86400)
+
+
+__all__ = ['bp', 'build_thumbnails', 'schedule_thumbnails']
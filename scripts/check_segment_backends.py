@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Check that segment.simple_segment gives identical results on both backends.
+
+Covers the minNumPixels boundary (a blob of exactly minNumPixels pixels is
+kept, one pixel fewer is dropped) and random frame/background pairs.
+Exits non-zero on the first mismatch.  Needs opencv-python installed.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cheesepie.segment import Options, _cv2, simple_segment  # noqa: E402
+
+
+def run(frame: Image.Image, bkg: Image.Image, opt: Options):
+    out = {}
+    for backend in ('skimage', 'opencv'):
+        opt.backend = backend
+        labels, overlay = simple_segment(frame, bkg, opt=opt)
+        out[backend] = (np.array(labels), np.array(overlay))
+    return out
+
+
+def same(out) -> bool:
+    (la, oa), (lb, ob) = out['skimage'], out['opencv']
+    return np.array_equal(la, lb) and np.array_equal(oa, ob)
+
+
+def check_boundary() -> bool:
+    h, w, n = 120, 160, 25
+    rng = np.random.default_rng(0)
+    bkg = rng.integers(40, 60, size=(h, w, 3), dtype=np.uint8)
+    frame = bkg.copy()
+    frame[10:15, 10:15] = 255            # exactly n pixels: kept
+    frame[40:44, 40:46] = 255            # n - 1 pixels: dropped
+    frame[40, 46] = 0
+    frame[80:100, 100:120] = 255         # large blob: kept
+    opt = Options(height=h, width=w, minNumPixels=n, maxNumObjects=20)
+    out = run(Image.fromarray(frame), Image.fromarray(bkg), opt)
+    ok = same(out)
+    for backend, (labels, _overlay) in out.items():
+        kept = labels[12, 12] != 0 and labels[90, 110] != 0
+        dropped = labels[42, 42] == 0
+        if not (kept and dropped):
+            print(f"boundary: {backend} kept={kept} dropped={dropped}")
+            ok = False
+    print(f"boundary: {'ok' if ok else 'MISMATCH'}")
+    return ok
+
+
+def check_random(count: int, seed: int) -> bool:
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        h, w = 120, 160
+        bkg = rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+        frame = bkg.copy()
+        for _ in range(int(rng.integers(1, 12))):
+            y, x = int(rng.integers(0, h - 8)), int(rng.integers(0, w - 8))
+            bh, bw = int(rng.integers(2, 20)), int(rng.integers(2, 20))
+            frame[y:y + bh, x:x + bw] = rng.integers(0, 256, size=3, dtype=np.uint8)
+        opt = Options(
+            height=h, width=w,
+            minNumPixels=int(rng.integers(1, 60)),
+            maxNumObjects=int(rng.integers(2, 30)),
+            outline_thickness=int(rng.integers(1, 4)),
+        )
+        if not same(run(Image.fromarray(frame), Image.fromarray(bkg), opt)):
+            print(f"random: pair {i} (seed {seed}) differs")
+            return False
+    print(f"random: {count} pairs ok")
+    return True
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description='Compare the skimage and OpenCV segmentation backends.')
+    ap.add_argument('--random', type=int, default=90, help='Random frame/background pairs to compare')
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+    if _cv2() is None:
+        print("opencv-python is not installed; nothing to compare")
+        return 0
+    ok = check_boundary()
+    ok = check_random(args.random, args.seed) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Vendor a pinned hls.js build into static/vendor/.
+
+Downloads the npm tarball of HLSJS_VERSION, checks it against the sha512
+integrity the registry publishes for that (immutable) version, and writes
+``dist/hls.min.js`` and the licence next to each other.  The preview only
+loads hls.js from ``/static/vendor/hls.min.js``; without it, browsers
+lacking native HLS stay on plain ``/media``.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import urllib.request
+
+HLSJS_VERSION = '1.5.17'
+REGISTRY = 'https://registry.npmjs.org/hls.js/'
+VENDOR_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static', 'vendor'))
+MEMBERS = {'package/dist/hls.min.js': 'hls.min.js', 'package/LICENSE': 'hls.js.LICENSE'}
+
+
+def fetch(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=60) as r:
+        return r.read()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description='Download and verify the pinned hls.js build.')
+    ap.add_argument('--version', default=HLSJS_VERSION, help='Exact hls.js version')
+    args = ap.parse_args()
+
+    dist = json.loads(fetch(REGISTRY + args.version))['dist']
+    algo, _, expected = str(dist.get('integrity') or '').partition('-')
+    if algo != 'sha512' or not expected:
+        print(f"no sha512 integrity published for hls.js {args.version}")
+        return 1
+    tarball = fetch(dist['tarball'])
+    if base64.b64encode(hashlib.sha512(tarball).digest()).decode('ascii') != expected:
+        print(f"integrity mismatch for {dist['tarball']}")
+        return 1
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(tarball), mode='r:gz') as tar:
+        for member, name in MEMBERS.items():
+            data = tar.extractfile(member).read()  # type: ignore[union-attr]
+            out = os.path.join(VENDOR_DIR, name)
+            with open(out + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(out + '.tmp', out)
+            print(f"wrote {out} ({len(data)} bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
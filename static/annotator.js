@@ -130,6 +130,7 @@
   const state = {
     video: videoPath,
     fps: defaultFps,
+    frameTimes: null, // Float64Array of frame start times from /api/media/index
     duration: 0,
     types: [], // {id, name, color, key, mode}
     events: [], // {id, typeId, start, end|null, animals:[], note:''}
@@ -170,7 +171,18 @@
   };
   const debounce = (fn, ms=250) => { let to; return (...a)=>{ clearTimeout(to); to=setTimeout(()=>fn(...a), ms); }; };
   const isPairMode = (mode) => (mode === 'mutual' || mode === 'directed');
+  // Index of the frame shown at time t (last frame starting at or before it)
+  function frameAt(t) {
+    const ft = state.frameTimes;
+    let lo = 0, hi = ft.length - 1;
+    while (lo < hi) {
+      const mid = (lo + hi + 1) >> 1;
+      if (ft[mid] <= t + 1e-6) lo = mid; else hi = mid - 1;
+    }
+    return lo;
+  }
   function snapTime(t) {
+    if (state.frameTimes && state.frameTimes.length) return state.frameTimes[frameAt(t)];
     if (!(state.fps > 0)) return t;
     return Math.round(t * state.fps) / state.fps;
   }
@@ -235,6 +247,36 @@
     resizeCanvas();
   }).catch(()=>{});
 
+  // Exact frame times; the server scans the video in the background on first use
+  function retryFrameIndex(r, attempt){
+    const wait = Math.max(1, parseInt(r.headers.get('Retry-After') || '5', 10));
+    if (attempt < 360) setTimeout(() => loadFrameIndex(attempt + 1), wait * 1000);
+  }
+  function expandTiming(d){
+    // Constant-rate runs of [ticks, count]: frame i starts after the first i durations
+    const tb = (Number(d.time_base[0]) || 0) / (Number(d.time_base[1]) || 1);
+    const ft = new Float64Array(d.frames);
+    let i = 1, ticks = 0;
+    for (const [dur, count] of d.timing.runs) {
+      for (let k = 0; k < count && i < ft.length; k++) { ticks += dur; ft[i++] = ticks * tb; }
+    }
+    return ft;
+  }
+  function loadFrameIndex(attempt = 0){
+    const q = encodeURIComponent(videoPath);
+    fetch(`/api/media/index?path=${q}`).then(async r => {
+      if (r.status === 202) return retryFrameIndex(r, attempt);
+      const d = await r.json();
+      if (!d || !d.ok || !(d.frames > 0)) return;
+      if (d.timing) { state.frameTimes = expandTiming(d); return; }
+      // Variable frame rate: fetch the full table as raw float64
+      const t = await fetch(`/api/media/index/times?path=${q}`);
+      if (t.status === 202) return retryFrameIndex(t, attempt);
+      if (t.ok) state.frameTimes = new Float64Array(await t.arrayBuffer());
+    }).catch(()=>{});
+  }
+  loadFrameIndex();
+
   videoEl.addEventListener('loadedmetadata', () => {
     if (!state.duration || !isFinite(state.duration)) state.duration = videoEl.duration || 0;
     // Restore context
@@ -452,6 +494,14 @@
   function step(by){
     const dt = 1/Math.max(1, state.fps);
     videoEl.pause();
+    const ft = state.frameTimes;
+    if (ft && ft.length) {
+      const i = Math.max(0, Math.min(ft.length - 1, frameAt(videoEl.currentTime || 0) + by));
+      // Aim at the middle of the frame so the browser doesn't show its predecessor
+      const next = i + 1 < ft.length ? ft[i + 1] : ft[i] + dt;
+      try { videoEl.currentTime = (ft[i] + next) / 2; } catch {}
+      return;
+    }
     try { videoEl.currentTime = Math.max(0, Math.min((state.duration||videoEl.duration||0), (videoEl.currentTime + by*dt))); }
     catch {}
   }
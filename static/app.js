@@ -556,6 +556,8 @@
   const LS_KEY = "cheesepie.lastDir";
   let browserFacilityBound = false;
   let desiredSelectPath = null;
+  // Bumped per loadList() so a slower, superseded listing stream is dropped
+  let listLoadToken = 0;
   let browserSortBy = 'name';
   let browserSortOrder = 'asc';
 
@@ -730,6 +732,12 @@
       return;
     }
     listEl.innerHTML = "";
+    appendRows(items);
+  }
+
+  function appendRows(items) {
+    if (!listEl) return;
+    const frag = document.createDocumentFragment();
     items.forEach((item) => {
       const row = document.createElement("div");
       row.className = "file-item";
@@ -746,23 +754,37 @@
       meta.textContent = `${size} · ${fmtTime(item.modified)}`;
       row.appendChild(icon);
       row.appendChild(name);
-      if (!item.is_dir && (item.has_preproc || item.has_annotations)) {
+      if (!item.is_dir && (item.has_preproc || item.has_annotations || item.has_track)) {
         const badges = document.createElement("div");
         badges.className = "file-badges";
+        const artifacts = item.artifacts || {};
+        // artifacts: {kind: [size, mtime]} from the directory manifest
+        const badgeTitle = (label, kind) => {
+          const a = artifacts[kind];
+          return a ? `${label} · ${humanSize(a[0])} · ${fmtTime(a[1])}` : label;
+        };
         if (item.has_preproc) {
           const b = document.createElement("span");
           b.className = "file-badge badge-preproc";
-          b.title = "Preprocessing done";
+          b.title = badgeTitle("Preprocessing done", "preproc");
           b.textContent = "P";
           badges.appendChild(b);
         }
         if (item.has_annotations) {
           const b = document.createElement("span");
           b.className = "file-badge badge-annot";
-          b.title = "Annotations exist";
+          b.title = badgeTitle("Annotations exist", "annotations");
           b.textContent = "A";
           badges.appendChild(b);
         }
+        if (item.has_track) {
+          const b = document.createElement("span");
+          b.className = "file-badge badge-track";
+          b.title = badgeTitle("Tracking done", "track");
+          if (artifacts.log) b.title += `\nLog updated ${fmtTime(artifacts.log[1])}`;
+          b.textContent = "T";
+          badges.appendChild(b);
+        }
         row.appendChild(badges);
       }
       row.appendChild(meta);
@@ -785,8 +807,10 @@
           navigateToDir(row.dataset.path);
         }
       });
-      listEl.appendChild(row);
+      frag.appendChild(row);
     });
+    if (listMoreEl && listMoreEl.parentNode === listEl) listEl.insertBefore(frag, listMoreEl);
+    else listEl.appendChild(frag);
     if (desiredSelectPath) {
       const target = Array.from(listEl.children).find(
         (r) => r.dataset && r.dataset.path === desiredSelectPath
@@ -795,8 +819,8 @@
         selectRow(target, false);
         target.scrollIntoView({ block: "nearest" });
         updateSelectionDetails();
+        desiredSelectPath = null;
       }
-      desiredSelectPath = null;
     }
   }
 
@@ -868,6 +892,7 @@
   }
 
   function renderDetails(info) {
+    stopPreviewHls();
     if (!info || info.error) {
       detailsEl.innerHTML = `<div class="muted">${info?.error || "No details."
         }</div>`;
@@ -900,6 +925,7 @@
         <div class="key">Frame rate</div><div id="meta-fps">—</div>
         <div class="key">Bitrate</div><div id="meta-bitrate">—</div>
       </div>
+      <div class="thumb-strip" id="thumb-strip"></div>
     `
       : "";
     updateActionsPanel(info);
@@ -1214,6 +1240,74 @@
       });
   }
 
+  // Large recordings switch to HLS once the server has indexed them, so a
+  // seek fetches one keyframe-aligned segment instead of ranges of the file
+  const HLS_MIN_BYTES = 1024 ** 3;
+  // Pinned build vendored by scripts/vendor_hlsjs.py; never loaded from a CDN
+  const HLS_JS_URL = "/static/vendor/hls.min.js";
+  let hlsJsPromise = null;
+  let previewHls = null;
+  let hlsJobId = 0;
+  function loadHlsJs() {
+    if (window.Hls) return Promise.resolve(window.Hls);
+    if (!hlsJsPromise) {
+      hlsJsPromise = new Promise((resolve, reject) => {
+        const s = document.createElement("script");
+        s.src = HLS_JS_URL;
+        s.onload = () => resolve(window.Hls);
+        s.onerror = () => { hlsJsPromise = null; reject(new Error("hls.js unavailable")); };
+        document.head.appendChild(s);
+      });
+    }
+    return hlsJsPromise;
+  }
+
+  function stopPreviewHls() {
+    hlsJobId++;
+    if (previewHls) { try { previewHls.destroy(); } catch {} previewHls = null; }
+  }
+
+  function upgradeToHls(video, info) {
+    stopPreviewHls();
+    const jobId = hlsJobId;
+    if (!info || !(info.size >= HLS_MIN_BYTES)) return;
+    const url = `/media/hls/index.m3u8?path=${encodeURIComponent(info.path)}`;
+    const native = !!video.canPlayType("application/vnd.apple.mpegurl");
+    const attach = () => {
+      const t = video.currentTime || 0;
+      const paused = video.paused;
+      video.addEventListener("loadedmetadata", () => {
+        try { video.currentTime = t; } catch {}
+        if (!paused) video.play().catch(() => {});
+      }, { once: true });
+      if (native) {
+        video.src = url;
+        return Promise.resolve();
+      }
+      return loadHlsJs().then((Hls) => {
+        if (jobId !== hlsJobId || !Hls || !Hls.isSupported()) return;
+        previewHls = new Hls();
+        previewHls.loadSource(url);
+        previewHls.attachMedia(video);
+      });
+    };
+    const poll = (attempt) => {
+      fetch(url)
+        .then((r) => {
+          if (jobId !== hlsJobId || !video.isConnected) return;
+          if (r.status === 202) {
+            const wait = Math.max(1, parseInt(r.headers.get("Retry-After") || "5", 10));
+            if (attempt < 360) setTimeout(() => poll(attempt + 1), wait * 1000);
+            return;
+          }
+          // Without HLS the progressive /media source keeps playing
+          if (r.ok) return attach();
+        })
+        .catch(() => {});
+    };
+    poll(0);
+  }
+
   let thumbJobId = 0;
   function setupVideoEnhancements(info) {
     const video = document.getElementById("preview-video");
@@ -1229,12 +1323,15 @@
       if (video.videoWidth && video.videoHeight) {
         resEl.textContent = `${video.videoWidth} × ${video.videoHeight}`;
       }
-      // Thumbnails disabled by request; no generation.
     };
     if (video.readyState >= 1) {
       onMeta();
     }
     video.addEventListener("loadedmetadata", onMeta, { once: true });
+    upgradeToHls(video, info);
+
+    const strip = document.getElementById("thumb-strip");
+    if (strip) generateThumbnails(info, strip);
 
     // Try server-side metadata via ffprobe
     fetch(`/api/media_meta?path=${encodeURIComponent(info.path)}`)
@@ -1269,116 +1366,48 @@
     return `${mbps.toFixed(2)} Mb/s`;
   }
 
-  function generateThumbnails(info, strip, duration, vWidth, vHeight) {
+  // Thumbnails come from one server-rendered sprite sheet (ffmpeg keyframe seeks)
+  function generateThumbnails(info, strip) {
     const jobId = ++thumbJobId;
     strip.innerHTML =
       '<div class="placeholder muted">Generating thumbnails…</div>';
-    const CFG = window.CHEESEPIE || {};
-    const THUMBS = (CFG.browser && CFG.browser.preview_thumbnails) || 8;
-    const N = Math.max(0, Math.min(24, Number(THUMBS) || 8));
-    if (!isFinite(duration) || duration <= 0) {
-      strip.innerHTML =
-        '<div class="placeholder muted">No timeline available.</div>';
-      return;
-    }
-    const times = Array.from(
-      { length: N },
-      (_, i) => (duration * (i + 1)) / (N + 1)
-    );
-    // Hidden video clone to avoid disturbing preview playback
-    const hv = document.createElement("video");
-    hv.muted = true;
-    hv.preload = "auto";
-    hv.playsInline = true;
-    hv.crossOrigin = "anonymous";
-    hv.style.position = "fixed";
-    hv.style.left = "-9999px";
-    hv.style.top = "0";
-    hv.style.width = "160px";
-    hv.style.visibility = "hidden";
-    const src = document.createElement("source");
-    src.src = `/media?path=${encodeURIComponent(info.path)}`;
-    src.type = info.mime || "";
-    hv.appendChild(src);
-    document.body.appendChild(hv);
-
-    const canvas = document.createElement("canvas");
-    const targetW = 240; // capture larger then scale in CSS for crisper thumbs
-    const aspect = vWidth && vHeight ? vWidth / vHeight : 16 / 9;
-    canvas.width = targetW;
-    canvas.height = Math.round(targetW / aspect);
-    const ctx = canvas.getContext("2d");
-
-    const thumbs = [];
     const preview = document.getElementById("preview-video");
-
-    const next = (i) => {
-      if (jobId !== thumbJobId) return cleanup();
-      if (i >= times.length) {
-        if (thumbs.length === 0) {
-          strip.innerHTML =
-            '<div class="placeholder muted">No thumbnails.</div>';
-        } else {
+    fetch(`/api/media/thumbs?path=${encodeURIComponent(info.path)}`)
+      .then((r) => r.json())
+      .then((idx) => {
+        if (jobId !== thumbJobId) return;
+        if (!idx || !idx.ok || !Array.isArray(idx.thumbs) || !idx.thumbs.length) {
           strip.innerHTML = "";
-          thumbs.forEach(({ dataUrl, t }) => {
-            const w = document.createElement("div");
-            w.className = "thumb";
-            w.title = formatDuration(t);
-            const img = document.createElement("img");
-            img.src = dataUrl;
-            w.appendChild(img);
-            const tag = document.createElement("div");
-            tag.className = "time";
-            tag.textContent = formatDuration(t);
-            w.appendChild(tag);
-            w.addEventListener("click", () => {
-              if (preview) {
-                preview.currentTime = t;
-                preview.play();
-              }
-            });
-            strip.appendChild(w);
-          });
-        }
-        return cleanup();
-      }
-      const t = times[i];
-      const onSeeked = () => {
-        if (jobId !== thumbJobId) {
-          hv.removeEventListener("seeked", onSeeked);
-          return cleanup();
+          return;
         }
-        try {
-          ctx.drawImage(hv, 0, 0, canvas.width, canvas.height);
-          const dataUrl = canvas.toDataURL("image/jpeg", 0.7);
-          thumbs.push({ dataUrl, t });
-        } catch (e) { }
-        hv.removeEventListener("seeked", onSeeked);
-        next(i + 1);
-      };
-      hv.addEventListener("seeked", onSeeked);
-      try {
-        hv.currentTime = Math.min(
-          Math.max(0.1, t),
-          Math.max(0.1, duration - 0.1)
-        );
-      } catch (e) {
-        hv.removeEventListener("seeked", onSeeked);
-        next(i + 1);
-      }
-    };
-
-    const onLoaded = () => {
-      next(0);
-    };
-    hv.addEventListener("loadedmetadata", onLoaded, { once: true });
-    hv.load();
-
-    function cleanup() {
-      try {
-        document.body.removeChild(hv);
-      } catch { }
-    }
+        const [tileW, tileH] = idx.tile || [240, 135];
+        // .thumb boxes are 120px wide; scale the sprite to match
+        const scale = 120 / tileW;
+        strip.innerHTML = "";
+        idx.thumbs.forEach(({ t, x, y }) => {
+          const w = document.createElement("div");
+          w.className = "thumb";
+          w.title = formatDuration(t);
+          w.style.backgroundImage = `url("${idx.sprite}")`;
+          w.style.backgroundSize = `${idx.columns * tileW * scale}px ${idx.rows * tileH * scale}px`;
+          w.style.backgroundPosition = `${-x * scale}px ${-y * scale}px`;
+          w.style.height = `${Math.round(tileH * scale)}px`;
+          const tag = document.createElement("div");
+          tag.className = "time";
+          tag.textContent = formatDuration(t);
+          w.appendChild(tag);
+          w.addEventListener("click", () => {
+            if (preview) {
+              preview.currentTime = t;
+              preview.play();
+            }
+          });
+          strip.appendChild(w);
+        });
+      })
+      .catch(() => {
+        if (jobId === thumbJobId) strip.innerHTML = "";
+      });
   }
 
   function describeFsPath(path) {
@@ -1471,10 +1500,19 @@
     });
   }
 
+  // Folders load one page at a time; the next page is requested when the
+  // "Loading more…" row at the end of the list scrolls into view
+  const LIST_PAGE = 500;
+  let listNextCursor = null;
+  let listPageLoading = false;
+  let listMoreEl = null;
+  let listMoreObserver = null;
+
   function loadList() {
     if (!listEl) return;
     renderBreadcrumb(currentDir);
-    const q = searchInput ? (searchInput.value || "") : "";
+    listNextCursor = null;
+    updateListMore();
     if (!currentDir) {
       listEl.innerHTML =
         '<div class="placeholder muted">Select a facility to load files.</div>';
@@ -1482,28 +1520,155 @@
       return;
     }
     listEl.innerHTML = '<div class="placeholder muted">Loading…</div>';
+    loadListPage(++listLoadToken, null);
+  }
+
+  function updateListMore(message) {
+    if (!listEl) return;
+    if (!listNextCursor && !message) {
+      if (listMoreEl) listMoreEl.remove();
+      return;
+    }
+    if (!listMoreEl) {
+      listMoreEl = document.createElement("div");
+      listMoreEl.className = "placeholder muted list-more";
+      listMoreEl.addEventListener("click", () => {
+        if (listMoreEl.dataset.reload) loadList();
+      });
+    }
+    listMoreEl.textContent = message || "Loading more…";
+    if (message) listMoreEl.dataset.reload = "1";
+    else delete listMoreEl.dataset.reload;
+    listEl.appendChild(listMoreEl);
+    if (!listMoreObserver && window.IntersectionObserver) {
+      listMoreObserver = new IntersectionObserver((entries) => {
+        if (entries.some((e) => e.isIntersecting)) loadMoreRows();
+      }, { root: listEl, rootMargin: "400px" });
+    }
+    if (listMoreObserver) {
+      listMoreObserver.disconnect();
+      listMoreObserver.observe(listMoreEl);
+    }
+  }
+
+  function loadMoreRows() {
+    if (!listNextCursor || listPageLoading) return;
+    loadListPage(listLoadToken, listNextCursor);
+  }
+
+  // NDJSON: a header line with counts, then items, then {done, next_cursor}.
+  // An uncached folder is streamed in scan order while the server reads it
+  // ({resort: true} at the end); the first sorted page then replaces it.
+  function loadListPage(token, cursor) {
+    const q = searchInput ? (searchInput.value || "") : "";
     const fac = String(currentFacility || "");
-    fetch(
-      `/api/list?dir=${encodeURIComponent(currentDir)}&q=${encodeURIComponent(q)}&facility=${encodeURIComponent(fac)}&sort=${encodeURIComponent(browserSortBy)}&order=${encodeURIComponent(browserSortOrder)}`
-    )
-      .then((r) => r.json())
-      .then((data) => {
-        renderList(data.items);
-        updateBrowserCount(data.items);
+    let url = `/api/list?dir=${encodeURIComponent(currentDir)}&q=${encodeURIComponent(q)}&facility=${encodeURIComponent(fac)}&sort=${encodeURIComponent(browserSortBy)}&order=${encodeURIComponent(browserSortOrder)}&format=ndjson&limit=${LIST_PAGE}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    let started = !!cursor;
+    let pendingRows = [];
+    const onLine = (obj) => {
+      if (token !== listLoadToken) return;
+      if (obj.done) {
+        flushRows();
+        if (obj.resort) {
+          updateBrowserCount(obj);
+          loadListPage(token, null);
+          return;
+        }
+        if (!started) renderList([]);
+        listNextCursor = obj.next_cursor || null;
+        updateListMore();
+        if (!listNextCursor) desiredSelectPath = null;
+        return;
+      }
+      if (obj.scanning) return;
+      if (obj.scanned !== undefined) {
+        const el = document.getElementById("browser-item-count");
+        if (el) el.textContent = `Scanning… ${obj.scanned} entries`;
+        return;
+      }
+      if (obj.total !== undefined && obj.name === undefined) {
+        updateBrowserCount(obj);
+        return;
+      }
+      pendingRows.push(obj);
+    };
+    const flushRows = () => {
+      if (token !== listLoadToken || !pendingRows.length) return;
+      if (!started) {
+        started = true;
+        renderList(pendingRows);
+      } else {
+        appendRows(pendingRows);
+      }
+      pendingRows = [];
+    };
+    listPageLoading = true;
+    fetch(url)
+      .then(async (r) => {
+        if (!r.ok) {
+          const data = await r.json();
+          if (token !== listLoadToken) return;
+          if (cursor) {
+            // The folder changed since the first page; its cursor is no longer valid
+            listNextCursor = null;
+            updateListMore(r.status === 409 ? "Folder changed — click to reload" : "Failed to load more — click to reload");
+            return;
+          }
+          renderList(data.items);
+          updateBrowserCount(null);
+          return;
+        }
+        let buf = "";
+        const handle = (text, final) => {
+          buf += text;
+          const lines = buf.split("\n");
+          buf = final ? "" : lines.pop();
+          lines.forEach((line) => {
+            if (line.trim()) onLine(JSON.parse(line));
+          });
+          flushRows();
+        };
+        if (!r.body || !r.body.getReader) {
+          handle(await r.text(), true);
+          return;
+        }
+        const reader = r.body.getReader();
+        const decoder = new TextDecoder();
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (token !== listLoadToken) {
+            reader.cancel();
+            return;
+          }
+          if (done) {
+            handle(decoder.decode(), true);
+            return;
+          }
+          handle(decoder.decode(value, { stream: true }), false);
+        }
       })
       .catch(() => {
+        if (token !== listLoadToken) return;
+        if (cursor) {
+          updateListMore("Failed to load more — click to reload");
+          return;
+        }
         listEl.innerHTML =
           '<div class="placeholder muted">Failed to load folder.</div>';
         updateBrowserCount(null);
+      })
+      .finally(() => {
+        if (token === listLoadToken) listPageLoading = false;
       });
   }
 
-  function updateBrowserCount(items) {
+  function updateBrowserCount(counts) {
     const el = document.getElementById('browser-item-count');
     if (!el) return;
-    if (!items) { el.textContent = ''; return; }
-    const dirs = items.filter(x => x.is_dir).length;
-    const files = items.length - dirs;
+    if (!counts) { el.textContent = ''; return; }
+    const dirs = counts.dirs || 0;
+    const files = (counts.total || 0) - dirs;
     const parts = [];
     if (dirs) parts.push(`${dirs} folder${dirs === 1 ? '' : 's'}`);
     if (files) parts.push(`${files} file${files === 1 ? '' : 's'}`);
@@ -60,7 +60,7 @@
     const setIndicator = (t)=>{ if (indicatorEl) indicatorEl.textContent = t||''; };
     const timeKey = ()=>{ try{ return (v.currentTime||0).toFixed(3);}catch(e){ return '0.000'; } };
     const markColor = (code)=>({R:'#ff4f4f',G:'#33cc66',B:'#4f8cff',Y:'#ffd166',BG:'#ffffff'}[code]||'#ffffff');
-    const snapshotDataURL = ()=>{ if(!v||!v.videoWidth) return {frame:null,width:0,height:0}; const bg=document.getElementById('bg-canvas'); const tw=(bg&&bg.width)||v.videoWidth; const th=(bg&&bg.height)||v.videoHeight; const c=document.createElement('canvas'); c.width=tw; c.height=th; const ctx=c.getContext('2d'); try{ ctx.drawImage(v,0,0,tw,th);}catch(e){} return { frame:c.toDataURL('image/png'), width:tw, height:th}; };
+    const snapshotDataURL = (w, h)=>{ if(!v||!v.videoWidth) return {frame:null,width:0,height:0}; const bg=document.getElementById('bg-canvas'); const tw=w||(bg&&bg.width)||v.videoWidth; const th=h||(bg&&bg.height)||v.videoHeight; const c=document.createElement('canvas'); c.width=tw; c.height=th; const ctx=c.getContext('2d'); try{ ctx.drawImage(v,0,0,tw,th);}catch(e){} return { frame:c.toDataURL('image/png'), width:tw, height:th}; };
     const fitRect = (sw,sh,dw,dh)=>{ if(!sw||!sh||!dw||!dh) return {dx:0,dy:0,dw:dw,dh:dh}; const s=Math.min(dw/sw, dh/sh); const rw=Math.round(sw*s), rh=Math.round(sh*s); return { dx:Math.floor((dw-rw)/2), dy:Math.floor((dh-rh)/2), dw:rw, dh:rh } };
 
     function renderMouseSelection(){
@@ -187,6 +187,8 @@
               // Use drop location as the anchor point (so the marker stays where dropped)
               const cx = lx, cy = ly;
               const t = timeKey(); if (!marks[t]) marks[t]=[]; marks[t] = marks[t].filter(m=> m.segment_label !== lab);
+              // The saved frame needs its image; grab it while this frame is on screen
+              if (cached.time === t && !cached.image) cached.image = snapshotDataURL(W, H).frame;
               marks[t].push({ mouse: d.id, segment_label: lab, centroid: { x: cx, y: cy } });
               drawMarks(); updateIndicator();
               cleanup(true);
@@ -453,12 +455,17 @@
     }
 
     async function run(){
-      const snap=snapshotDataURL(); const dataUrl=snap.frame; if(!dataUrl){ setStatus('Video not ready'); return; }
+      if(!v||!v.videoWidth){ setStatus('Video not ready'); return; }
       setStatus('Segmenting…');
       try{
         await ensureSavedFrames();
         let background=null; try{ const bg=document.getElementById('bg-canvas'); if(bg&&bg.width&&bg.height) background=bg.toDataURL('image/png'); }catch(e){}
-        const resp=await fetch('/api/preproc/segment_simple',{ method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ image:dataUrl, background })});
+        const segment=(frame)=>fetch('/api/preproc/segment_simple',{ method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ ...frame, background })});
+        // The server decodes the frame itself; upload a snapshot only if it cannot
+        const videoPath=(window.Preproc&&window.Preproc.State&&window.Preproc.State.videoPath)||'';
+        let resp=videoPath ? await segment({ video: videoPath, time: v.currentTime||0 }) : null;
+        let dataUrl=null;
+        if(!resp||!resp.ok){ dataUrl=snapshotDataURL().frame; if(!dataUrl){ setStatus('Video not ready'); return; } resp=await segment({ image: dataUrl }); }
         const data=await resp.json(); if(!resp.ok||!data||!data.ok){ setStatus('Error: '+(data&&data.error||resp.statusText)); return; }
         if(data.stats&&typeof data.stats.nonzero==='number'){
           // keep status reserved but do not persist a message here; seg count is shown separately
@@ -36,26 +36,82 @@ function initPreview() {
     else dropTarget.classList.remove('drag-active');
   }
 
+  async function readError(resp) {
+    try {
+      const err = await resp.json();
+      return err && err.error ? err.error : '';
+    } catch (_) {
+      try { return await resp.text(); } catch (_) { return ''; }
+    }
+  }
+
+  // Chunked, resumable upload: init -> PUT chunks at offsets -> finalize.
+  // The upload id is remembered per file so a reload or dropped connection resumes.
+  async function uploadChunked(file) {
+    const key = `cheesepie.preview.upload:${file.name}:${file.size}:${file.lastModified}`;
+    let uploadId = '';
+    let offset = 0;
+    let chunkSize = 8 * 1024 * 1024;
+    try { uploadId = localStorage.getItem(key) || ''; } catch (_) { }
+    if (uploadId) {
+      try {
+        const st = await fetch(`/api/preview_upload/${uploadId}`);
+        if (st.ok) offset = Number((await st.json()).offset) || 0;
+        else uploadId = '';
+      } catch (_) { uploadId = ''; }
+    }
+    if (!uploadId) {
+      const init = await fetch('/api/preview_upload/init', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ name: file.name, size: file.size }),
+      });
+      if (!init.ok) throw new Error(await readError(init));
+      const info = await init.json();
+      uploadId = info.upload_id;
+      chunkSize = Number(info.chunk_size) || chunkSize;
+      try { localStorage.setItem(key, uploadId); } catch (_) { }
+    }
+    let retries = 0;
+    while (offset < file.size) {
+      const end = Math.min(file.size, offset + chunkSize);
+      let resp = null;
+      try {
+        resp = await fetch(`/api/preview_upload/${uploadId}?offset=${offset}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/octet-stream' },
+          body: file.slice(offset, end),
+        });
+      } catch (_) { resp = null; }
+      if (resp && resp.ok) {
+        offset = Number((await resp.json()).offset) || end;
+        retries = 0;
+      } else {
+        if (resp && resp.status !== 409 && resp.status < 500) throw new Error(await readError(resp));
+        if (++retries > 8) throw new Error('connection lost');
+        await new Promise((r) => setTimeout(r, Math.min(30000, 500 * 2 ** retries)));
+        // Ask the server how much actually arrived before retrying
+        try {
+          const st = await fetch(`/api/preview_upload/${uploadId}`);
+          if (st.ok) offset = Number((await st.json()).offset) || 0;
+        } catch (_) { }
+      }
+      if (msgEl) msgEl.textContent = `Uploading ${file.name}... ${Math.floor((offset / file.size) * 100)}%`;
+    }
+    const fin = await fetch(`/api/preview_upload/${uploadId}/finalize`, { method: 'POST' });
+    if (!fin.ok) throw new Error(await readError(fin));
+    try { localStorage.removeItem(key); } catch (_) { }
+    return fin;
+  }
+
   async function uploadDropFile(file) {
     if (!file) return;
     if (msgEl) msgEl.textContent = `Uploading ${file.name}...`;
-    const body = new FormData();
-    body.append('file', file);
     let resp = null;
     try {
-      resp = await fetch('/api/preview_upload', { method: 'POST', body });
+      resp = await uploadChunked(file);
     } catch (e) {
-      if (msgEl) msgEl.textContent = 'Upload failed. Check connection.';
-      return;
-    }
-    if (!resp || !resp.ok) {
-      let errMsg = '';
-      try {
-        const err = await resp.json();
-        errMsg = err && err.error ? err.error : '';
-      } catch (_) {
-        try { errMsg = await resp.text(); } catch (_) { }
-      }
+      const errMsg = e && e.message ? e.message : '';
       if (msgEl) msgEl.textContent = `Upload failed${errMsg ? `: ${errMsg}` : ''}.`;
       return;
     }
@@ -255,14 +311,69 @@ function initPreview() {
   // simple streaming draw example
   function fetchAndDraw(start) {
     if (!hasTracking) return;
-    const url = '/api/analyze/positions?video=' + encodeURIComponent(videoPath) + '&start=' + start + '&count=' + chunkSize + (fac ? ('&facility=' + encodeURIComponent(fac)) : '');
-    fetch(url).then(r => r.ok ? r.json() : null).then(d => {
-      if (!d || !d.ok || !Array.isArray(d.x) || !Array.isArray(d.y)) return;
+    const url = '/api/analyze/positions?video=' + encodeURIComponent(videoPath) + '&start=' + start + '&count=' + chunkSize + '&format=f32' + (fac ? ('&facility=' + encodeURIComponent(fac)) : '');
+    fetch(url).then(r => r.ok ? r.arrayBuffer().then(buf => unpackPositions(r, buf, start)) : null).then(d => {
+      if (!d) return;
       const normalized = detectNormalized(d.x, d.y);
-      currentChunk = { start: d.start || start, x: d.x, y: d.y, normalized };
+      currentChunk = { start: d.start, x: d.x, y: d.y, normalized };
       drawFrame(Math.floor((v.currentTime || 0) * (fps || 0)));
     }).catch(() => { });
   }
+  // Binary positions: float32 (2, mice, count) with NaN for missing samples
+  function unpackPositions(resp, buf, fallbackStart) {
+    const mice = parseInt(resp.headers.get('X-Track-Mice') || '0', 10);
+    const count = parseInt(resp.headers.get('X-Track-Count') || '0', 10);
+    const startHdr = parseInt(resp.headers.get('X-Track-Start') || '', 10);
+    return splitPositions(new Float32Array(buf), mice, count, isFinite(startHdr) ? startHdr : fallbackStart);
+  }
+  function splitPositions(data, mice, count, start) {
+    if (!mice || data.length < 2 * mice * count) return null;
+    const x = [], y = [];
+    for (let m = 0; m < mice; m++) {
+      x.push(data.subarray(m * count, (m + 1) * count));
+      y.push(data.subarray((mice + m) * count, (mice + m + 1) * count));
+    }
+    return { start, x, y };
+  }
+  // While playing, windows are pushed by /api/analyze/positions/stream ahead
+  // of the playhead; seeking or changing speed reopens the stream.
+  let stream = null;
+  let streamChunks = [];
+  function closeStream() {
+    if (stream) { try { stream.close(); } catch (e) { } stream = null; }
+    streamChunks = [];
+    lastChunkStart = -1;
+  }
+  function openStream(frame) {
+    closeStream();
+    if (!hasTracking || !fps || typeof EventSource === 'undefined') return;
+    const rate = fps * (v.playbackRate || 1);
+    const url = '/api/analyze/positions/stream?video=' + encodeURIComponent(videoPath) + '&start=' + Math.max(0, frame) + '&rate=' + rate + '&window=' + chunkSize + '&format=f32' + (fac ? ('&facility=' + encodeURIComponent(fac)) : '');
+    const es = new EventSource(url);
+    stream = es;
+    es.addEventListener('window', (ev) => {
+      if (stream !== es) return;
+      try {
+        const d = JSON.parse(ev.data);
+        const bin = atob(d.f32 || '');
+        const bytes = new Uint8Array(bin.length);
+        for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+        const chunk = splitPositions(new Float32Array(bytes.buffer), d.mice, d.count, d.start);
+        if (!chunk) return;
+        chunk.normalized = detectNormalized(chunk.x, chunk.y);
+        streamChunks.push(chunk);
+        if (streamChunks.length > 32) streamChunks.shift();
+      } catch (e) { }
+    });
+    es.addEventListener('end', () => { if (stream === es) { es.close(); stream = null; } });
+  }
+  function streamChunkFor(frame) {
+    for (let i = streamChunks.length - 1; i >= 0; i--) {
+      const ch = streamChunks[i];
+      if (frame >= ch.start && frame < ch.start + (ch.x[0] ? ch.x[0].length : 0)) return ch;
+    }
+    return null;
+  }
   function detectNormalized(xs, ys) {
     let maxAbs = 0;
     for (let i = 0; i < xs.length; i++) {
@@ -313,14 +424,19 @@ function initPreview() {
   v.addEventListener('timeupdate', () => {
     updateTimeLabel();
     if (!hasTracking || !fps) return; const frame = Math.floor((v.currentTime || 0) * fps);
+    const streamed = streamChunkFor(frame);
+    if (streamed) { currentChunk = streamed; drawFrame(frame); return; }
     const chunkStart = Math.floor(frame / chunkSize) * chunkSize;
     if (!currentChunk || frame < (currentChunk.start || 0) || frame >= (currentChunk.start || 0) + chunkSize) { currentChunk = null; }
     if (chunkStart !== lastChunkStart) { lastChunkStart = chunkStart; fetchAndDraw(chunkStart); }
     drawFrame(frame);
   });
-  v.addEventListener('seeking', () => { currentChunk = null; });
-  v.addEventListener('play', () => { if (hasTracking && fps) fetchAndDraw(Math.floor((v.currentTime || 0) * fps / chunkSize) * chunkSize); });
-  v.addEventListener('pause', () => { updateTimeLabel(); drawFrame(Math.floor((v.currentTime || 0) * (fps || 0))); });
+  v.addEventListener('seeking', () => { currentChunk = null; closeStream(); });
+  v.addEventListener('seeked', () => { if (!v.paused) openStream(Math.floor((v.currentTime || 0) * (fps || 0))); });
+  v.addEventListener('ratechange', () => { if (!v.paused) openStream(Math.floor((v.currentTime || 0) * (fps || 0))); });
+  v.addEventListener('play', () => { if (hasTracking && fps) { fetchAndDraw(Math.floor((v.currentTime || 0) * fps / chunkSize) * chunkSize); openStream(Math.floor((v.currentTime || 0) * fps)); } });
+  v.addEventListener('pause', () => { closeStream(); updateTimeLabel(); drawFrame(Math.floor((v.currentTime || 0) * (fps || 0))); });
+  signal.addEventListener('abort', closeStream);
   // ensure first draw when ready
   v.addEventListener('canplay', () => { updateVideoDims(); updateTimeLabel(); if (fps) drawFrame(Math.floor((v.currentTime || 0) * fps)); });
   if (v.readyState >= 2) { updateVideoDims(); updateTimeLabel(); if (fps) drawFrame(Math.floor((v.currentTime || 0) * fps)); }